@@ -1,23 +1,17 @@
-import os
 from flask import Flask, render_template
 from flask_cors import CORS
 from app.extensions import db, login_manager, migrate
 from .models import User, Task, TaskCategory
 
-def create_app():
+def create_app(config_object=None):
     app = Flask(__name__, instance_path=None)
     
-    # Configuration
-    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
-    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///./todo.db')
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    # Optional: Load from config.py if needed
-    # app.config.from_object("config.Config")
+    # Configuration: config.Config is the single source of the settings, their defaults and environment overrides
+    app.config.from_object("config.Config")
     
-    # Security configurations
-    app.config['SESSION_COOKIE_SECURE'] = os.environ.get('FLASK_ENV') == 'production'
-    app.config['SESSION_COOKIE_HTTPONLY'] = True
-    app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+    # Explicit configuration (e.g. config.TestingConfig) overrides the environment
+    if config_object is not None:
+        app.config.from_object(config_object)
     
     # Initialize extensions
     db.init_app(app)
@@ -53,6 +47,32 @@ def create_app():
     # Error handlers
     register_error_handlers(app)
     
+    # Match both status/priority encodings until every table holds integer codes
+    from app.enum_migration import init_enum_compat
+    init_enum_compat(app)
+    
+    # Write fence for users whose data is moving between shards
+    from app.sharding import init_sharding
+    init_sharding(app)
+    
+    # Request profiling
+    from app.profiling import init_profiling
+    init_profiling(app)
+    
+    # Write-behind buffer for last_login
+    from app.write_behind import init_write_behind
+    init_write_behind(app)
+    
+    # Compressed responses and fingerprinted static assets
+    from app.compression import init_compression
+    from app.assets import init_assets
+    init_compression(app)
+    init_assets(app)
+    
+    # CLI commands
+    from app.commands import register_commands
+    register_commands(app)
+    
     return app
 
 def register_error_handlers(app):
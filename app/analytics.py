@@ -0,0 +1,151 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from sqlalchemy import delete, exists, func, select, union_all, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.extensions import db
+from app.models import Task, TaskArchive, TaskDailyStats
+
+
+def completion_state(task):
+    """(day, priority, seconds) of a completed task as counted in the rollups, else None"""
+    if task.status != 'completed' or task.completed_at is None:
+        return None
+    started = task.created_at or task.completed_at
+    return task.completed_at.date(), task.priority, max((task.completed_at - started).total_seconds(), 0)
+
+
+def record_completion_change(user_id, before, after):
+    """Apply a task's move between two completion states to the daily rollups
+
+    ``before`` and ``after`` come from completion_state(). Un-completing
+    a task takes its completion back out; completing it adds one. Issues
+    at most one statement and does not commit.
+    """
+    if before == after:
+        return
+    deltas = defaultdict(lambda: [0, 0.0])
+    for state, sign in ((before, -1), (after, 1)):
+        if state is not None:
+            day, priority, seconds = state
+            deltas[(day, priority)][0] += sign
+            deltas[(day, priority)][1] += sign * seconds
+    _add_to_rollups([
+        {'user_id': user_id, 'day': day, 'priority': priority, 'completed_count': count, 'completion_seconds': seconds}
+        for (day, priority), (count, seconds) in deltas.items()
+    ])
+
+
+def _add_to_rollups(rows):
+    if not rows:
+        return
+    table = TaskDailyStats.__table__
+    dialect = db.session.get_bind(mapper=TaskDailyStats).dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        # Single-statement increment-or-insert
+        dialect_insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        statement = dialect_insert(table).values(rows)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.day, table.c.priority],
+            set_={
+                'completed_count': table.c.completed_count + statement.excluded.completed_count,
+                'completion_seconds': table.c.completion_seconds + statement.excluded.completion_seconds,
+            },
+        ))
+        return
+    for row in rows:
+        key = [table.c.user_id == row['user_id'], table.c.day == row['day'], table.c.priority == row['priority']]
+        result = db.session.execute(update(table).where(*key).values(
+            completed_count=table.c.completed_count + row['completed_count'],
+            completion_seconds=table.c.completion_seconds + row['completion_seconds'],
+        ))
+        if result.rowcount == 0:
+            db.session.execute(table.insert().values(row))
+
+
+def _seconds_between(start, end):
+    if db.session.get_bind(mapper=TaskDailyStats).dialect.name == 'postgresql':
+        return func.extract('epoch', end - start)
+    return (func.julianday(end) - func.julianday(start)) * 86400
+
+
+def rebuild_rollups(user_id=None, since=None):
+    """Add the completions of live and archived tasks missing from the rollups of the current shard
+
+    Limited to one user and/or to days from ``since`` on. Deleting a task
+    does not take its completion out of the rollups, and a deleted task
+    cannot be counted again, so a rollup row is only replaced when the
+    task history holds more completions for it; rows with no surviving
+    tasks are left alone. Rebuilding therefore never undoes what the
+    incremental updates recorded. Does not commit.
+    """
+    completed = []
+    for model in (Task, TaskArchive):
+        criteria = [model.status == 'completed', model.completed_at.is_not(None)]
+        if user_id is not None:
+            criteria.append(model.user_id == user_id)
+        if since is not None:
+            criteria.append(model.completed_at >= since)
+        completed.append(select(
+            model.user_id,
+            func.date(model.completed_at).label('day'),
+            model.priority,
+            _seconds_between(model.created_at, model.completed_at).label('seconds'),
+        ).where(*criteria))
+    rows = union_all(*completed).subquery()
+    fresh = (
+        select(rows.c.user_id, rows.c.day, rows.c.priority, func.count().label('completed_count'),
+               func.coalesce(func.sum(rows.c.seconds), 0).label('completion_seconds'))
+        .group_by(rows.c.user_id, rows.c.day, rows.c.priority)
+        .subquery()
+    )
+    table = TaskDailyStats.__table__
+    same_row = [fresh.c.user_id == table.c.user_id, fresh.c.day == table.c.day, fresh.c.priority == table.c.priority]
+
+    db.session.execute(
+        delete(table).where(exists().where(*same_row, fresh.c.completed_count > table.c.completed_count)),
+        bind_arguments={'mapper': TaskDailyStats},
+    )
+    db.session.execute(table.insert().from_select(
+        ['user_id', 'day', 'priority', 'completed_count', 'completion_seconds'],
+        select(fresh).where(~exists().where(*same_row)),
+    ), bind_arguments={'mapper': TaskDailyStats})
+
+
+def completion_report(user_id, start_day, end_day, bucket_days):
+    """Completions per bucket, average completion time and throughput by priority
+
+    Reads only the rollup table: at most one row per day and priority.
+    """
+    rows = db.session.execute(
+        select(TaskDailyStats.day, TaskDailyStats.priority, TaskDailyStats.completed_count,
+               TaskDailyStats.completion_seconds)
+        .where(TaskDailyStats.user_id == user_id, TaskDailyStats.day >= start_day, TaskDailyStats.day < end_day)
+    ).all()
+
+    buckets = {}
+    day = start_day
+    while day < end_day:
+        buckets[day] = 0
+        day += timedelta(days=bucket_days)
+    by_priority = {priority: [0, 0.0] for priority in Task.PRIORITY_CHOICES}
+    for day, priority, count, seconds in rows:
+        buckets[start_day + timedelta(days=(day - start_day).days // bucket_days * bucket_days)] += count
+        by_priority[priority][0] += count
+        by_priority[priority][1] += seconds
+
+    def average_hours(count, seconds):
+        return round(seconds / count / 3600, 2) if count else None
+
+    total_count = sum(count for count, _ in by_priority.values())
+    total_seconds = sum(seconds for _, seconds in by_priority.values())
+    return {
+        'completed': [{'start': day.isoformat(), 'count': count} for day, count in buckets.items()],
+        'total_completed': total_count,
+        'average_completion_hours': average_hours(total_count, total_seconds),
+        'by_priority': {
+            priority: {'completed': count, 'average_completion_hours': average_hours(count, seconds)}
+            for priority, (count, seconds) in by_priority.items()
+        },
+    }
@@ -0,0 +1,136 @@
+import json
+from collections import defaultdict
+from datetime import timedelta
+
+from sqlalchemy import Boolean, case, delete, exists, insert, literal, null, select, union_all
+
+from app.deletion import detach_deleted_tasks
+from app.extensions import db
+from app.hierarchy import add_subtask
+from app.tags import set_task_tags
+from app.timeutils import utcnow
+from app.models import (Tag, Task, TaskArchive, TaskClosure, TaskOccurrence, TaskRecurrence, TaskTag,
+                        serialize_task, task_order_by)
+
+
+def archive_completed_tasks(older_than_days, batch_size=500, user_id=None):
+    """Move completed tasks older than the cutoff into task_archive
+
+    Works in batches of ``batch_size`` rows with one commit per batch, so
+    the write lock is only held briefly. Returns the number of archived tasks.
+    """
+    cutoff = utcnow() - timedelta(days=older_than_days)
+    archived = 0
+
+    while True:
+        query = select(Task.id).where(
+            Task.status == 'completed',
+            Task.completed_at < cutoff,
+            # Templates and stored occurrences of recurring tasks stay live, their series depends on them
+            ~exists().where(TaskRecurrence.task_id == Task.id),
+            ~exists().where(TaskOccurrence.task_id == Task.id),
+        )
+        if user_id is not None:
+            query = query.where(Task.user_id == user_id)
+        ids = db.session.execute(query.order_by(Task.id).limit(batch_size)).scalars().all()
+        if not ids:
+            break
+
+        archive_tasks(ids)
+        db.session.commit()
+        archived += len(ids)
+
+    return archived
+
+
+def archive_tasks(ids):
+    """Copy the given tasks into task_archive and delete them, without committing
+
+    Each archived row keeps the task's direct parent and tag names, so
+    restore_task can put them back.
+    """
+    tag_names = defaultdict(list)
+    for task_id, name in db.session.execute(
+        select(TaskTag.task_id, Tag.name).join(Tag, Tag.id == TaskTag.tag_id)
+        .where(TaskTag.task_id.in_(ids)).order_by(Tag.name)
+    ):
+        tag_names[task_id].append(name)
+
+    columns = TaskArchive.TASK_COLUMNS
+    parent_id = (
+        select(TaskClosure.ancestor_id)
+        .where(TaskClosure.descendant_id == Task.id, TaskClosure.depth == 1)
+        .scalar_subquery()
+    )
+    tags = case({task_id: json.dumps(names) for task_id, names in tag_names.items()}, value=Task.id) \
+        if tag_names else null()
+    rows = select(
+        *[Task.__table__.c[name] for name in columns], parent_id, tags, literal(utcnow())
+    ).where(Task.id.in_(ids))
+    db.session.execute(insert(TaskArchive).from_select(
+        [TaskArchive.task_column(name) for name in columns]
+        + [TaskArchive.parent_id, TaskArchive.tag_names, TaskArchive.archived_at],
+        rows,
+    ))
+
+    detach_deleted_tasks(ids)
+    db.session.execute(delete(Task.__table__).where(Task.id.in_(ids)))
+
+
+def restore_task(user_id, task_id):
+    """Move an archived task back into the task table, without committing
+
+    The original id is kept unless a live task has taken it since; if
+    the id was archived more than once, the latest archived task comes
+    back. The tags come back, and the task goes back under its former parent if
+    that is still a live task; subtasks it had when it was archived
+    stay top-level. Returns the restored Task, or None if no such
+    archived task exists.
+    """
+    archived = (
+        TaskArchive.query.filter_by(original_id=task_id, user_id=user_id)
+        .order_by(TaskArchive.id.desc()).first()
+    )
+    if archived is None:
+        return None
+
+    values = {name: getattr(archived, TaskArchive.task_column(name).key) for name in TaskArchive.TASK_COLUMNS}
+    if db.session.get(Task, task_id) is not None:
+        del values['id']
+
+    task = Task(**values)
+    db.session.add(task)
+    db.session.delete(archived)
+    db.session.flush()
+
+    parent_id = archived.parent_id
+    if parent_id is not None and db.session.execute(
+        select(exists().where(Task.id == parent_id, Task.user_id == user_id))
+    ).scalar():
+        add_subtask(user_id, parent_id, task.id)
+    if archived.tag_names:
+        set_task_tags(user_id, task.id, json.loads(archived.tag_names))
+    return task
+
+
+def tasks_with_archive(user_id, sort='created_at', **filters):
+    """Live and archived tasks of a user as dicts, ordered by a TASK_SORTS key
+
+    Both tables are read with a single UNION ALL statement.
+    """
+    selects = []
+    for model, archived in ((Task, False), (TaskArchive, True)):
+        columns = [
+            TaskArchive.task_column(name).label(name) if archived else getattr(model, name)
+            for name in TaskArchive.TASK_COLUMNS
+        ]
+        selects.append(
+            select(*columns, literal(archived, Boolean).label('archived'))
+            .where(model.user_id == user_id)
+            .filter_by(**filters)
+        )
+    union = union_all(*selects)
+    statement = union.order_by(*task_order_by(sort, union.selected_columns))
+    # Compound selects carry no mapper, so name one for bind (shard) selection
+    rows = db.session.execute(statement, bind_arguments={'mapper': Task})
+    return [serialize_task(row, archived=row.archived) for row in rows]
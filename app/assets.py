@@ -0,0 +1,113 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+from flask import send_from_directory
+
+from app.compression import COMPRESSIBLE_MIMETYPES, brotli, choose_encoding
+
+# Build output inside the static folder, so the built files are served by the static route
+BUILD_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def _precompress(path, data):
+    """Write .br/.gz siblings at maximum level, where that makes the file smaller"""
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    for encoding, compressed in variants.items():
+        if len(compressed) < len(data):
+            with open(path + SUFFIXES[encoding], 'wb') as fh:
+                fh.write(compressed)
+
+
+def build_assets(static_folder):
+    """Copy every static file into dist/ under a content-hashed name and precompress it
+
+    Rebuilds dist/ from scratch and writes dist/manifest.json, which maps
+    each source path (e.g. css/style.css) to its hashed copy. Returns that
+    mapping.
+    """
+    output = os.path.join(static_folder, BUILD_DIR)
+    shutil.rmtree(output, ignore_errors=True)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != output)
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            relative = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as fh:
+                data = fh.read()
+
+            stem, ext = os.path.splitext(relative)
+            hashed = f'{BUILD_DIR}/{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+            target = os.path.join(static_folder, *hashed.split('/'))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as fh:
+                fh.write(data)
+            if mimetypes.guess_type(name)[0] in COMPRESSIBLE_MIMETYPES:
+                _precompress(target, data)
+            manifest[relative] = hashed
+
+    with open(os.path.join(output, MANIFEST_NAME), 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    return manifest
+
+
+def init_assets(app):
+    """Serve the built assets when a manifest exists
+
+    url_for('static', filename='css/style.css') then points at the hashed
+    copy, which is served with a far-future Cache-Control and, when the
+    client accepts it, from its precompressed sibling. Without a build
+    the source files are served as before.
+    """
+    manifest_path = os.path.join(app.static_folder, BUILD_DIR, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return
+    with open(manifest_path, encoding='utf-8') as fh:
+        manifest = json.load(fh)
+
+    # Encodings available on disk for every hashed file, best first
+    variants = {
+        hashed: tuple(
+            encoding for encoding in ('br', 'gzip')
+            if os.path.exists(os.path.join(app.static_folder, hashed + SUFFIXES[encoding]))
+        )
+        for hashed in manifest.values()
+    }
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = manifest[values['filename']]
+
+    serve_static = app.view_functions['static']
+
+    def static(filename):
+        if filename not in variants:
+            return serve_static(filename=filename)
+        encoding = choose_encoding(variants[filename])
+        response = send_from_directory(
+            app.static_folder,
+            filename + SUFFIXES[encoding] if encoding else filename,
+            mimetype=mimetypes.guess_type(filename)[0],
+            max_age=app.config['ASSETS_MAX_AGE'],
+        )
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if variants[filename]:
+            response.vary.add('Accept-Encoding')
+        # The name changes with the content, so the file itself never does
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions['static'] = static
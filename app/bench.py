@@ -0,0 +1,678 @@
+import http.cookiejar
+import itertools
+import math
+import platform
+import random
+import threading
+import time
+import urllib.parse
+import urllib.request
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional, Union
+
+from flask import current_app
+from sqlalchemy import insert, literal, select
+from werkzeug.security import generate_password_hash
+
+from app.analytics import rebuild_rollups
+from app.extensions import db
+from app.idempotency import request_fingerprint
+from app.instrumentation import QueryCounter
+from app.models import IdempotencyKey, Job, User, Tag, Task, TaskCategory, TaskRecurrence, TaskTag
+from app.sharding import reserve_ids, shard_for_user, use_shard
+from app.timeutils import utcnow
+
+BENCH_PASSWORD = 'benchmark'
+BENCH_BLUEPRINTS = ('api', 'tasks', 'auth')
+
+CATEGORY_COLORS = ['#dc3545', '#28a745', '#ffc107', '#17a2b8', '#6f42c1', '#007bff']
+
+
+# ---------------- SYNTHETIC DATA ----------------
+
+def _task_counts(users, total_tasks, distribution, rng):
+    """Split total_tasks across users following the requested distribution"""
+    if distribution == 'uniform':
+        weights = [1.0] * users
+    elif distribution == 'zipf':
+        # Power users: the n-th user owns roughly 1/n of the first user's tasks
+        weights = [1.0 / (rank + 1) for rank in range(users)]
+        rng.shuffle(weights)
+    else:
+        raise ValueError(f'Unknown distribution: {distribution}')
+
+    scale = total_tasks / sum(weights)
+    counts = [int(w * scale) for w in weights]
+    for i in range(total_tasks - sum(counts)):
+        counts[i % users] += 1
+    return counts
+
+
+def _task_rows(user_id, count, category_ids, completed_ratio, rng, now):
+    for n in range(count):
+        created_at = now - timedelta(seconds=rng.randint(0, 730 * 24 * 3600))
+        completed = rng.random() < completed_ratio
+        status = 'completed' if completed else rng.choice(['pending', 'pending', 'in_progress', 'cancelled'])
+        due_date = None
+        if rng.random() < 0.6:
+            due_date = now + timedelta(days=rng.randint(-60, 90), hours=rng.randint(0, 23))
+        yield {
+            'title': f'Benchmark task {n}',
+            'description': 'Synthetic task generated by seed-bench',
+            'status': status,
+            'priority': rng.choices(Task.PRIORITY_CHOICES, weights=[3, 5, 3, 1])[0],
+            'due_date': due_date,
+            'created_at': created_at,
+            'updated_at': created_at,
+            'completed_at': created_at + timedelta(hours=rng.randint(1, 24 * 30)) if completed else None,
+            'user_id': user_id,
+            'category_id': rng.choice(category_ids) if category_ids and rng.random() < 0.8 else None,
+        }
+
+
+def _tag_tasks(user_id, tag_ids):
+    # Tag n goes on every (n + 2)-th task, so tags range from common to rare
+    for n, tag_id in enumerate(tag_ids):
+        tasks = select(literal(user_id), literal(tag_id), Task.id).where(
+            Task.user_id == user_id, Task.id % (n + 2) == 0
+        )
+        db.session.execute(insert(TaskTag).from_select(['user_id', 'tag_id', 'task_id'], tasks))
+
+
+def seed_benchmark_data(users=10, tasks=1000, categories=5, distribution='uniform',
+                        completed_ratio=0.3, prefix='bench', seed=42, batch_size=5000, tags=5):
+    """Bulk-generate benchmark users with their categories, tasks and tags
+
+    Every generated user has the password ``BENCH_PASSWORD``. Tasks are
+    inserted with executemany batches so that a million rows is practical;
+    tags are attached with one INSERT ... SELECT per tag.
+    """
+    rng = random.Random(seed)
+    now = utcnow()
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    counts = _task_counts(users, tasks, distribution, rng)
+
+    existing = {name for (name,) in db.session.query(User.username).filter(User.username.like(f'{prefix}%'))}
+    summary = {'users': [], 'tasks': 0, 'categories': 0}
+
+    for index, task_count in enumerate(counts):
+        username = f'{prefix}{index:06d}'
+        if username in existing:
+            continue
+
+        user = User(
+            username=username,
+            email=f'{username}@bench.invalid',
+            password_hash=password_hash,
+            first_name='Bench',
+            last_name=str(index)
+        )
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+        with use_shard(shard_for_user(user_id)):
+            category_objs = [
+                TaskCategory(name=f'Category {n}', color=CATEGORY_COLORS[n % len(CATEGORY_COLORS)], user_id=user_id)
+                for n in range(categories)
+            ]
+            db.session.add_all(category_objs)
+            db.session.flush()
+            category_ids = [c.id for c in category_objs]
+
+            rows = _task_rows(user_id, task_count, category_ids, completed_ratio, rng, now)
+            while True:
+                batch = list(itertools.islice(rows, batch_size))
+                if not batch:
+                    break
+                if current_app.config['SHARD_KEYS']:
+                    # Bulk inserts skip the ORM hook that numbers rows across shards
+                    first = reserve_ids(Task.__tablename__, len(batch))
+                    for offset, row in enumerate(batch):
+                        row['id'] = first + offset
+                db.session.execute(insert(Task), batch)
+
+            tag_objs = [Tag(name=f'tag{n}', user_id=user_id) for n in range(tags)]
+            db.session.add_all(tag_objs)
+            db.session.flush()
+            _tag_tasks(user_id, [t.id for t in tag_objs])
+            rebuild_rollups(user_id)
+            db.session.commit()
+            db.session.expunge_all()
+
+        summary['users'].append(username)
+        summary['tasks'] += task_count
+        summary['categories'] += categories
+
+    return summary
+
+
+# ---------------- SCENARIOS ----------------
+
+class BenchFixture:
+    """Objects owned by the benchmark user, used to fill in scenario URLs"""
+
+    def __init__(self, user, password):
+        self.user_id = user.id
+        self.username = user.username
+        self.password = password
+        self._sequence = itertools.count()
+        self.shard = shard_for_user(user.id)
+
+        with use_shard(self.shard):
+            # A dedicated pending task, so scenarios such as clear-completed never remove it
+            self.task_id = self.make_task()
+            category = TaskCategory.query.filter_by(user_id=user.id).order_by(TaskCategory.id).first()
+            self.category_id = category.id if category else self.make_category()
+            self.recurrence_id = self.make_recurring_task()['recurrence_id']
+
+    def unique(self, label):
+        return f'{label}-{time.time_ns()}-{next(self._sequence)}'
+
+    def make_task(self, **fields):
+        fields.setdefault('title', self.unique('bench task'))
+        with use_shard(self.shard):
+            task = Task(user_id=self.user_id, **fields)
+            db.session.add(task)
+            db.session.commit()
+            return task.id
+
+    def make_archived_task(self):
+        """An archived subtask of the fixture task with one tag, so restoring it re-links and re-tags it"""
+        from app.archive import archive_tasks
+        from app.hierarchy import add_subtask
+        from app.tags import set_task_tags
+
+        with use_shard(self.shard):
+            task_id = self.make_task(status='completed', completed_at=utcnow())
+            add_subtask(self.user_id, self.task_id, task_id)
+            set_task_tags(self.user_id, task_id, [self.unique('bench tag')])
+            archive_tasks([task_id])
+            db.session.commit()
+            return task_id
+
+    def make_recurring_task(self, frequency='daily'):
+        """A task repeating from yesterday at midnight, so today has an occurrence"""
+        start = datetime.combine(utcnow().date() - timedelta(days=1), datetime.min.time())
+        task_id = self.make_task(title=self.unique('bench recurring task'), due_date=start)
+        with use_shard(self.shard):
+            rule = TaskRecurrence(task_id=task_id, user_id=self.user_id, frequency=frequency, starts_at=start)
+            db.session.add(rule)
+            db.session.commit()
+            return {'recurrence_id': rule.id, 'template_id': task_id}
+
+    def make_tag(self):
+        with use_shard(self.shard):
+            tag = Tag(user_id=self.user_id, name=self.unique('bench tag'))
+            db.session.add(tag)
+            db.session.commit()
+            return tag.id
+
+    def make_idempotency_key(self, method, path, body, status_code=201):
+        """Store a finished request under a new Idempotency-Key, as if a client were about to retry it"""
+        key = self.unique('bench key')
+        with use_shard(self.shard):
+            db.session.add(IdempotencyKey(
+                user_id=self.user_id, key=key, fingerprint=request_fingerprint(method, path, body),
+                status_code=status_code, response_body='{}'
+            ))
+            db.session.commit()
+        return {'idempotency_key': key}
+
+    def make_job(self):
+        job = Job(user_id=self.user_id, kind='clear_completed', payload='{}')
+        db.session.add(job)
+        db.session.commit()
+        return job.id
+
+    def make_category(self, **fields):
+        fields.setdefault('name', self.unique('bench category'))
+        with use_shard(self.shard):
+            category = TaskCategory(user_id=self.user_id, **fields)
+            db.session.add(category)
+            db.session.commit()
+            return category.id
+
+    def values(self):
+        return {
+            'task_id': self.task_id,
+            'category_id': self.category_id,
+            'recurrence_id': self.recurrence_id,
+            'window_start': utcnow().date().isoformat(),
+            'window_end': (utcnow().date() + timedelta(days=31)).isoformat(),
+            'history_start': (utcnow().date() - timedelta(days=90)).isoformat(),
+            'tomorrow': (utcnow().date() + timedelta(days=1)).isoformat(),
+            'username': self.username,
+            'password': self.password,
+        }
+
+
+@dataclass
+class Scenario:
+    """One request to drive during a benchmark or query-budget run
+
+    ``path``, ``json``, ``data`` and ``headers`` are filled in from the fixture
+    values plus whatever ``setup`` returns (``json`` and ``data`` may also be
+    callables taking those values); ``setup`` runs outside the measured
+    window. ``client`` is ``'user'`` for the shared logged-in client,
+    ``'anonymous'`` for a fresh client and ``'fresh'`` for a newly
+    logged-in client (for requests that end the session).
+    """
+    endpoint: str
+    method: str
+    path: str
+    json: Optional[Union[dict, Callable]] = None
+    data: Optional[Union[dict, Callable]] = None
+    headers: Optional[dict] = None
+    setup: Optional[Callable] = None
+    client: str = 'user'
+    read_only: bool = False
+    expected_status: tuple = field(default=(200, 201, 302))
+
+    def build(self, fixture):
+        values = fixture.values()
+        if self.setup is not None:
+            values.update(self.setup(fixture) or {})
+        return {
+            'path': self.path.format(**values),
+            'json': _fill(self.json, values),
+            'data': _fill(self.data, values),
+            'headers': _fill(self.headers, values),
+        }
+
+
+def _fill(payload, values):
+    if payload is None:
+        return None
+    if callable(payload):
+        return payload(values)
+    return {key: value.format(**values) if isinstance(value, str) else value for key, value in payload.items()}
+
+
+SCENARIOS = [
+    # Auth
+    Scenario('auth.login', 'GET', '/auth/login', client='anonymous', read_only=True),
+    Scenario('auth.login', 'POST', '/auth/login', data={'username': '{username}', 'password': '{password}'},
+             client='anonymous'),
+    Scenario('auth.register', 'GET', '/auth/register', client='anonymous', read_only=True),
+    Scenario('auth.register', 'POST', '/auth/register',
+             data={'username': '{new_username}', 'email': '{new_username}@bench.invalid',
+                   'password': 'benchmark', 'confirm_password': 'benchmark'},
+             setup=lambda f: {'new_username': f.unique('bench-register')}, client='anonymous'),
+    Scenario('auth.logout', 'GET', '/auth/logout', client='fresh'),
+    Scenario('auth.profile', 'GET', '/auth/profile', read_only=True),
+    Scenario('auth.change_password', 'GET', '/auth/change-password', read_only=True),
+    Scenario('auth.change_password', 'POST', '/auth/change-password',
+             data={'current_password': '{password}', 'new_password': '{password}', 'confirm_password': '{password}'}),
+
+    # Tasks (HTML)
+    Scenario('tasks.dashboard', 'GET', '/tasks/dashboard', read_only=True),
+    Scenario('tasks.add_task', 'POST', '/tasks/add',
+             data={'title': 'Bench task', 'priority': 'high', 'category_id': '{category_id}'}),
+    Scenario('tasks.edit_task', 'GET', '/tasks/edit/{task_id}', read_only=True),
+    Scenario('tasks.edit_task', 'POST', '/tasks/edit/{task_id}',
+             data={'title': 'Bench task (edited)', 'priority': 'medium'}),
+    Scenario('tasks.delete_task', 'POST', '/tasks/delete/{victim_id}',
+             setup=lambda f: {'victim_id': f.make_task()}),
+    Scenario('tasks.toggle_task', 'POST', '/tasks/toggle/{victim_id}',
+             setup=lambda f: {'victim_id': f.make_task(status='in_progress')}),
+    Scenario('tasks.clear_completed', 'POST', '/tasks/clear-completed',
+             setup=lambda f: f.make_task(status='completed') and {}),
+    Scenario('tasks.add_category', 'POST', '/tasks/category/add',
+             data={'name': '{category_name}', 'color': '#6f42c1'},
+             setup=lambda f: {'category_name': f.unique('bench category')}),
+    Scenario('tasks.delete_category', 'POST', '/tasks/category/delete/{victim_id}',
+             setup=lambda f: {'victim_id': f.make_category()}),
+
+    # API
+    Scenario('api.get_tasks', 'GET', '/api/tasks', read_only=True),
+    Scenario('api.get_tasks', 'GET', '/api/tasks?include_archived=1', read_only=True),
+    Scenario('api.get_tasks', 'GET', '/api/tasks?sort=priority', read_only=True),
+    Scenario('api.get_tasks', 'GET', '/api/tasks?sort=due_date&status=pending', read_only=True),
+    Scenario('api.get_tasks', 'GET', '/api/tasks?tags=tag0,tag1&match=all', read_only=True),
+    Scenario('api.get_tasks', 'GET', '/api/tasks?tags=tag1,tag2&match=any', read_only=True),
+    Scenario('api.get_next_tasks', 'GET', '/api/tasks/next?limit=10', read_only=True),
+    Scenario('api.restore_archived_task', 'POST', '/api/tasks/{victim_id}/restore',
+             setup=lambda f: {'victim_id': f.make_archived_task()}),
+    Scenario('api.get_task', 'GET', '/api/tasks/{task_id}', read_only=True),
+    Scenario('api.create_task', 'POST', '/api/tasks',
+             json={'title': 'Bench API task', 'priority': 'urgent', 'due_date': '2030-01-01'}),
+    Scenario('api.create_task', 'POST', '/api/tasks', json=lambda v: {'title': 'Bench subtask', 'parent_id': v['task_id']}),
+    Scenario('api.create_task', 'POST', '/api/tasks', json=lambda v: {'title': 'Bench subtask', 'parent_id': v['task_id']},
+             headers={'Idempotency-Key': '{idempotency_key}'}, setup=lambda f: {'idempotency_key': f.unique('bench key')}),
+    Scenario('api.create_task', 'POST', '/api/tasks', json={'title': 'Bench API task'},
+             headers={'Idempotency-Key': '{idempotency_key}'},
+             setup=lambda f: f.make_idempotency_key('POST', '/api/tasks', {'title': 'Bench API task'})),
+    Scenario('api.get_task_subtree', 'GET', '/api/tasks/{task_id}/subtree', read_only=True),
+    Scenario('api.get_task_ancestors', 'GET', '/api/tasks/{task_id}/ancestors', read_only=True),
+    Scenario('api.get_task_progress', 'GET', '/api/tasks/{task_id}/progress', read_only=True),
+    Scenario('api.move_task', 'PUT', '/api/tasks/{victim_id}/parent', json=lambda v: {'parent_id': v['task_id']},
+             setup=lambda f: {'victim_id': f.make_task()}),
+    Scenario('api.update_task', 'PUT', '/api/tasks/{task_id}', json={'title': 'Bench API task (updated)'}),
+    Scenario('api.delete_task', 'DELETE', '/api/tasks/{victim_id}',
+             setup=lambda f: {'victim_id': f.make_task()}),
+    Scenario('api.toggle_task_status', 'POST', '/api/tasks/{victim_id}/toggle',
+             setup=lambda f: {'victim_id': f.make_task(status='in_progress')}),
+    Scenario('api.set_task_recurrence', 'PUT', '/api/tasks/{victim_id}/recurrence',
+             json={'frequency': 'weekly', 'interval': 2}, setup=lambda f: {'victim_id': f.make_task()}),
+    Scenario('api.delete_task_recurrence', 'DELETE', '/api/tasks/{template_id}/recurrence',
+             setup=lambda f: f.make_recurring_task()),
+    Scenario('api.get_occurrences', 'GET', '/api/occurrences?from={window_start}&to={window_end}', read_only=True),
+    Scenario('api.update_occurrence', 'PUT', '/api/recurrences/{recurrence_id}/occurrences/{window_start}',
+             json={'status': 'completed'}, setup=lambda f: f.make_recurring_task()),
+    Scenario('api.delete_occurrence', 'DELETE', '/api/recurrences/{recurrence_id}/occurrences/{window_start}',
+             setup=lambda f: f.make_recurring_task()),
+    Scenario('api.get_task_tags', 'GET', '/api/tasks/{task_id}/tags', read_only=True),
+    Scenario('api.set_tags', 'PUT', '/api/tasks/{task_id}/tags', json=lambda v: {'tags': ['tag0', v['new_tag']]},
+             setup=lambda f: {'new_tag': f.unique('bench tag')}),
+    Scenario('api.get_tags', 'GET', '/api/tags', read_only=True),
+    Scenario('api.get_calendar', 'GET', '/api/calendar?from={window_start}&to={window_end}',
+             read_only=True),
+    Scenario('api.get_calendar', 'GET', '/api/calendar?from={window_start}&to={window_end}&bucket=week',
+             read_only=True),
+    Scenario('api.get_calendar_tasks', 'GET', '/api/calendar/tasks?from={window_start}&to={window_end}&limit=20',
+             read_only=True),
+    Scenario('api.delete_tag', 'DELETE', '/api/tags/{victim_id}', setup=lambda f: {'victim_id': f.make_tag()}),
+    Scenario('api.get_categories', 'GET', '/api/categories', read_only=True),
+    Scenario('api.get_categories', 'GET', '/api/categories?with_counts=1', read_only=True),
+    Scenario('api.merge_category', 'POST', '/api/categories/{victim_id}/merge', json=lambda v: {'into': v['category_id']},
+             setup=lambda f: {'victim_id': f.make_category()}),
+    Scenario('api.reassign_category', 'POST', '/api/categories/reassign',
+             json=lambda v: {'task_ids': [v['task_id']], 'category_id': v['category_id']}),
+    Scenario('api.create_category', 'POST', '/api/categories', json={'name': '{category_name}'},
+             setup=lambda f: {'category_name': f.unique('bench category')}),
+    Scenario('api.create_category', 'POST', '/api/categories', json={'name': '{category_name}'},
+             headers={'Idempotency-Key': '{category_name}'}, setup=lambda f: {'category_name': f.unique('bench category')}),
+    Scenario('api.get_stats', 'GET', '/api/stats', read_only=True),
+    Scenario('api.clear_completed_tasks', 'POST', '/api/tasks/clear-completed',
+             setup=lambda f: f.make_task(status='completed') and {}),
+    Scenario('api.get_jobs', 'GET', '/api/jobs', read_only=True),
+    Scenario('api.get_job', 'GET', '/api/jobs/{job_id}', setup=lambda f: {'job_id': f.make_job()}),
+    Scenario('api.get_analytics', 'GET', '/api/analytics?from={history_start}&to={tomorrow}', read_only=True),
+    Scenario('api.get_analytics', 'GET', '/api/analytics?from={history_start}&to={tomorrow}&bucket=week',
+             read_only=True),
+]
+
+
+def uncovered_endpoints(app, scenarios=SCENARIOS):
+    """Blueprint endpoints that no scenario exercises"""
+    covered = {s.endpoint for s in scenarios}
+    return sorted(
+        rule.endpoint for rule in app.url_map.iter_rules()
+        if rule.endpoint.split('.')[0] in BENCH_BLUEPRINTS and rule.endpoint not in covered
+    )
+
+
+def run_isolated(func, *args, **kwargs):
+    """Call func in a new thread, outside any application context
+
+    The test client reuses an application context that is already pushed
+    (as it is in every CLI command), which would share ``g`` and the
+    logged-in user between requests. A clean thread gives each request
+    its own context, as in production.
+    """
+    outcome = {}
+
+    def target():
+        try:
+            outcome['value'] = func(*args, **kwargs)
+        except BaseException as exc:
+            outcome['error'] = exc
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['value']
+
+
+class ScenarioRunner:
+    """Drive scenarios through the Flask test client as the benchmark user
+
+    Must be used outside an application context; see ``run_isolated``.
+    """
+
+    def __init__(self, app, fixture):
+        self.app = app
+        self.fixture = fixture
+        self.user_client = self.login(app.test_client())
+
+    def login(self, client):
+        response = client.post('/auth/login', data={'username': self.fixture.username, 'password': self.fixture.password})
+        if response.status_code != 302 or '/auth/login' in response.headers.get('Location', ''):
+            raise RuntimeError(f'Could not log in as {self.fixture.username}')
+        return client
+
+    def client_for(self, scenario):
+        if scenario.client == 'anonymous':
+            return self.app.test_client()
+        if scenario.client == 'fresh':
+            return self.login(self.app.test_client())
+        return self.user_client
+
+    def prepare(self, scenario):
+        """Run the untimed part of a scenario and return a callable issuing the request"""
+        client = self.client_for(scenario)
+        with self.app.app_context():
+            request = scenario.build(self.fixture)
+
+        def issue():
+            return client.open(request['path'], method=scenario.method, json=request['json'], data=request['data'],
+                               headers=request['headers'])
+        return issue
+
+
+# ---------------- REPORTING ----------------
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies, elapsed, errors, queries=None):
+    latencies_ms = [value * 1000 for value in latencies]
+    summary = {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'mean': round(sum(latencies_ms) / len(latencies_ms), 3) if latencies_ms else None,
+            'p50': _round(percentile(latencies_ms, 50)),
+            'p95': _round(percentile(latencies_ms, 95)),
+            'p99': _round(percentile(latencies_ms, 99)),
+            'max': _round(max(latencies_ms) if latencies_ms else None),
+        },
+    }
+    if queries is not None:
+        summary['sql_queries'] = {
+            'mean': round(sum(queries) / len(queries), 2) if queries else None,
+            'max': max(queries) if queries else None,
+        }
+    return summary
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+
+def _report_meta(mode):
+    return {
+        'mode': mode,
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+
+# ---------------- TEST CLIENT BENCHMARK ----------------
+
+def run_client_benchmark(app, username, password=BENCH_PASSWORD, iterations=50, warmup=5, scenarios=SCENARIOS):
+    """Drive every scenario through the test client and collect latency and SQL counts"""
+    return run_isolated(_run_client_benchmark, app, username, password, iterations, warmup, scenarios)
+
+
+def _count_user_tasks(fixture):
+    with use_shard(fixture.shard):
+        return Task.query.filter_by(user_id=fixture.user_id).count()
+
+
+def _run_client_benchmark(app, username, password, iterations, warmup, scenarios):
+    with app.app_context():
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise RuntimeError(f'Benchmark user {username!r} does not exist; run `flask seed-bench` first')
+        fixture = BenchFixture(user, password)
+        engines = list(db.engines.values())
+
+    runner = ScenarioRunner(app, fixture)
+    results = []
+
+    for scenario in scenarios:
+        for _ in range(warmup):
+            runner.prepare(scenario)()
+
+        latencies, queries, errors = [], [], 0
+        started = time.perf_counter()
+        measured = 0.0
+        for _ in range(iterations):
+            issue = runner.prepare(scenario)
+            with QueryCounter(engines) as counter:
+                tick = time.perf_counter()
+                response = issue()
+                latency = time.perf_counter() - tick
+            measured += latency
+            latencies.append(latency)
+            queries.append(counter.count)
+            if response.status_code not in scenario.expected_status:
+                errors += 1
+
+        results.append({
+            'endpoint': scenario.endpoint,
+            'method': scenario.method,
+            'path': scenario.path,
+            'wall_time_s': round(time.perf_counter() - started, 3),
+            **summarize(latencies, measured, errors, queries),
+        })
+
+    with app.app_context():
+        meta = {
+            **_report_meta('client'),
+            'database': db.engine.url.render_as_string(hide_password=True),
+            'user': username,
+            'shard': fixture.shard,
+            'user_tasks': _count_user_tasks(fixture),
+            'iterations': iterations,
+            'warmup': warmup,
+        }
+
+    return {
+        'meta': meta,
+        'uncovered_endpoints': uncovered_endpoints(app, scenarios),
+        'results': results,
+    }
+
+
+# ---------------- HTTP LOAD GENERATOR ----------------
+
+def _http_login(base_url, username, password):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    body = urllib.parse.urlencode({'username': username, 'password': password}).encode()
+    opener.open(f'{base_url}/auth/login', data=body, timeout=30).read()
+    return opener
+
+
+def run_http_load(base_url, username, paths, password=BENCH_PASSWORD, concurrency=8, duration=10.0):
+    """Hammer read-only paths of a running server from ``concurrency`` threads"""
+    base_url = base_url.rstrip('/')
+    per_path = {path: {'latencies': [], 'errors': 0} for path in paths}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(offset):
+        opener = _http_login(base_url, username, password)
+        cycle = itertools.islice(itertools.cycle(paths), offset, None)
+        for path in cycle:
+            if time.perf_counter() >= deadline:
+                return
+            tick = time.perf_counter()
+            try:
+                with opener.open(f'{base_url}{path}', timeout=30) as response:
+                    response.read()
+                    failed = response.status >= 400
+            except Exception:
+                failed = True
+            latency = time.perf_counter() - tick
+            with lock:
+                per_path[path]['latencies'].append(latency)
+                per_path[path]['errors'] += int(failed)
+
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    results = [
+        {'path': path, **summarize(stats['latencies'], elapsed, stats['errors'])}
+        for path, stats in per_path.items()
+    ]
+    all_latencies = [value for stats in per_path.values() for value in stats['latencies']]
+    return {
+        'meta': {
+            **_report_meta('http'),
+            'base_url': base_url,
+            'user': username,
+            'concurrency': concurrency,
+            'duration_s': duration,
+        },
+        'total': summarize(all_latencies, elapsed, sum(stats['errors'] for stats in per_path.values())),
+        'results': results,
+    }
+
+
+def read_only_paths(fixture_values, scenarios=SCENARIOS):
+    return [s.path.format(**fixture_values) for s in scenarios if s.read_only and s.client == 'user']
+
+
+# ---------------- COMPARISON ----------------
+
+def compare_reports(baseline, current, threshold=0.10):
+    """Compare two benchmark reports endpoint by endpoint
+
+    A result regresses when its p95 latency or mean SQL count grows by
+    more than ``threshold`` (a fraction) over the baseline.
+    """
+    def key(result):
+        return (result.get('method'), result.get('endpoint') or result.get('path'), result.get('path'))
+
+    previous = {key(r): r for r in baseline.get('results', [])}
+    rows, regressions = [], []
+    for result in current.get('results', []):
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        row = {'endpoint': result.get('endpoint'), 'method': result.get('method'), 'path': result.get('path')}
+        for metric, old_value, new_value in (
+            ('p95_ms', old['latency_ms']['p95'], result['latency_ms']['p95']),
+            ('throughput_rps', old['throughput_rps'], result['throughput_rps']),
+            ('sql_mean', (old.get('sql_queries') or {}).get('mean'), (result.get('sql_queries') or {}).get('mean')),
+        ):
+            if old_value is None or new_value is None:
+                continue
+            change = (new_value - old_value) / old_value if old_value else 0.0
+            row[metric] = {'baseline': old_value, 'current': new_value, 'change': round(change, 4)}
+            # Higher is worse for latency and SQL counts, better for throughput
+            worse = change < -threshold if metric == 'throughput_rps' else change > threshold
+            if worse:
+                regressions.append({'endpoint': row['endpoint'], 'method': row['method'], 'path': row['path'],
+                                    'metric': metric, **row[metric]})
+        rows.append(row)
+    return {'threshold': threshold, 'results': rows, 'regressions': regressions}
@@ -0,0 +1,27 @@
+from app.models import Task, TaskArchive
+
+
+def reassign_tasks(user_id, category_id, task_ids=None, from_category_id=None, from_uncategorized=False):
+    """Point a user's tasks at category_id (None to uncategorize) without loading them
+
+    Selects tasks by ``task_ids``, by their current category
+    (``from_category_id``, or ``from_uncategorized``), or both. Each
+    table is changed with a single UPDATE scoped to the user; archived
+    tasks follow when a whole category is moved. Does not commit.
+    Returns the number of live tasks updated.
+    """
+    criteria = [Task.user_id == user_id]
+    archive_criteria = None
+    if task_ids is not None:
+        criteria.append(Task.id.in_(task_ids))
+    if from_category_id is not None:
+        criteria.append(Task.category_id == from_category_id)
+        if task_ids is None:
+            archive_criteria = [TaskArchive.user_id == user_id, TaskArchive.category_id == from_category_id]
+    elif from_uncategorized:
+        criteria.append(Task.category_id.is_(None))
+
+    updated = Task.query.filter(*criteria).update({'category_id': category_id}, synchronize_session=False)
+    if archive_criteria is not None:
+        TaskArchive.query.filter(*archive_criteria).update({'category_id': category_id}, synchronize_session=False)
+    return updated
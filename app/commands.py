@@ -0,0 +1,299 @@
+import json
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app.extensions import db
+
+
+def _require_enum_migration():
+    # For commands that copy raw status/priority values between tables
+    from app.enum_migration import unmigrated_tables
+
+    if unmigrated_tables():
+        raise click.ClickException('Run `flask migrate-enum-columns` first: status/priority are not converted yet')
+
+
+def _write_json(payload, output):
+    text = json.dumps(payload, indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as fh:
+            fh.write(text + '\n')
+        click.echo(f'Report written to {output}')
+    else:
+        click.echo(text)
+
+
+@click.command('seed-bench')
+@click.option('--users', default=10, show_default=True, help='Number of users to generate.')
+@click.option('--tasks', default=1000, show_default=True, help='Total number of tasks across all users.')
+@click.option('--categories', default=5, show_default=True, help='Categories per user.')
+@click.option('--tags', default=5, show_default=True, help='Tags per user; tag n is on every (n+2)-th task.')
+@click.option('--distribution', type=click.Choice(['uniform', 'zipf']), default='uniform', show_default=True,
+              help='How tasks are spread across users.')
+@click.option('--completed-ratio', default=0.3, show_default=True, help='Fraction of tasks that are completed.')
+@click.option('--prefix', default='bench', show_default=True, help='Username prefix for generated users.')
+@click.option('--seed', default=42, show_default=True, help='Random seed for reproducible datasets.')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows per INSERT batch.')
+@with_appcontext
+def seed_bench_command(users, tasks, categories, tags, distribution, completed_ratio, prefix, seed, batch_size):
+    """Bulk-generate synthetic users, categories and tasks for benchmarking"""
+    from app.bench import seed_benchmark_data, BENCH_PASSWORD
+    from app.sharding import create_shard_tables
+
+    db.create_all(bind_key=None)
+    create_shard_tables()
+    summary = seed_benchmark_data(
+        users=users, tasks=tasks, categories=categories, distribution=distribution,
+        completed_ratio=completed_ratio, prefix=prefix, seed=seed, batch_size=batch_size, tags=tags
+    )
+    click.echo(f"Created {len(summary['users'])} users, {summary['categories']} categories "
+               f"and {summary['tasks']} tasks (password: {BENCH_PASSWORD})")
+
+
+@click.command('bench')
+@click.option('--username', default='bench000000', show_default=True, help='Seeded user to benchmark as.')
+@click.option('--password', default=None, help='Password of the benchmark user.')
+@click.option('--iterations', default=50, show_default=True, help='Measured requests per scenario.')
+@click.option('--warmup', default=5, show_default=True, help='Unmeasured requests per scenario.')
+@click.option('--url', default=None, help='Base URL of a running server; switches to the HTTP load generator.')
+@click.option('--concurrency', default=8, show_default=True, help='HTTP load generator threads.')
+@click.option('--duration', default=10.0, show_default=True, help='HTTP load duration in seconds.')
+@click.option('--output', '-o', default=None, help='Write the JSON report to this file.')
+@click.option('--baseline', default=None, type=click.Path(exists=True), help='Compare against a previous report.')
+@with_appcontext
+def bench_command(username, password, iterations, warmup, url, concurrency, duration, output, baseline):
+    """Benchmark every auth, tasks and api route and report JSON"""
+    from app.bench import (BENCH_PASSWORD, BenchFixture, compare_reports, read_only_paths,
+                           run_client_benchmark, run_http_load)
+    from app.models import User
+
+    password = password or BENCH_PASSWORD
+    if url:
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.ClickException(f'Benchmark user {username!r} does not exist')
+        paths = read_only_paths(BenchFixture(user, password).values())
+        report = run_http_load(url, username, paths, password=password, concurrency=concurrency, duration=duration)
+    else:
+        try:
+            report = run_client_benchmark(current_app._get_current_object(), username, password=password,
+                                          iterations=iterations, warmup=warmup)
+        except RuntimeError as exc:
+            raise click.ClickException(str(exc))
+
+    if baseline:
+        with open(baseline, encoding='utf-8') as fh:
+            report['comparison'] = compare_reports(json.load(fh), report)
+    _write_json(report, output)
+
+
+@click.command('bench-compare')
+@click.argument('baseline', type=click.Path(exists=True))
+@click.argument('current', type=click.Path(exists=True))
+@click.option('--threshold', default=0.10, show_default=True, help='Allowed relative regression.')
+def bench_compare_command(baseline, current, threshold):
+    """Compare two benchmark reports; exits non-zero on regressions"""
+    from app.bench import compare_reports
+
+    with open(baseline, encoding='utf-8') as fh:
+        old = json.load(fh)
+    with open(current, encoding='utf-8') as fh:
+        new = json.load(fh)
+    comparison = compare_reports(old, new, threshold=threshold)
+    _write_json(comparison, None)
+    if comparison['regressions']:
+        raise SystemExit(1)
+
+
+@click.command('check-query-budgets')
+@click.option('--output', '-o', default=None, help='Write the JSON results to this file.')
+def check_query_budgets_command(output):
+    """Fail if any endpoint exceeds its declared SQL query budget"""
+    from app import create_app
+    from app.query_budget import check_query_budgets
+    from config import TestingConfig
+
+    results = check_query_budgets(create_app(TestingConfig))
+    failures = [r for r in results if r['problems']]
+    for result in results:
+        status = 'FAIL' if result['problems'] else 'ok'
+        counts = ', '.join(f'{size} tasks: {count}' for size, count in result['counts'].items())
+        click.echo(f"{status:4} {result['method'] or '-':6} {result['endpoint']:28} "
+                   f"budget={result['budget']} ({counts}) {'; '.join(result['problems'])}")
+    if output:
+        _write_json(results, output)
+    if failures:
+        raise click.ClickException(f'{len(failures)} endpoint(s) over budget')
+    click.echo(f'All {len(results)} endpoint checks within budget')
+
+
+@click.command('archive-tasks')
+@click.option('--older-than-days', type=int, default=None, help='Archive tasks completed before this many days ago.')
+@click.option('--batch-size', type=int, default=None, help='Tasks moved per transaction.')
+@with_appcontext
+def archive_tasks_command(older_than_days, batch_size):
+    """Move old completed tasks into the task_archive table"""
+    from app.archive import archive_completed_tasks
+    from app.sharding import each_shard
+
+    _require_enum_migration()
+    older_than_days = current_app.config['ARCHIVE_AFTER_DAYS'] if older_than_days is None else older_than_days
+    batch_size = batch_size or current_app.config['ARCHIVE_BATCH_SIZE']
+    archived = sum(archive_completed_tasks(older_than_days, batch_size=batch_size) for _ in each_shard())
+    click.echo(f'Archived {archived} tasks completed more than {older_than_days} days ago')
+
+
+@click.command('purge-idempotency-keys')
+@click.option('--batch-size', type=int, default=None, help='Keys deleted per transaction.')
+@with_appcontext
+def purge_idempotency_keys_command(batch_size):
+    """Delete idempotency keys older than IDEMPOTENCY_KEY_TTL_HOURS"""
+    from app.idempotency import purge_expired_keys
+    from app.sharding import each_shard
+
+    batch_size = batch_size or current_app.config['IDEMPOTENCY_PURGE_BATCH_SIZE']
+    purged = sum(purge_expired_keys(batch_size=batch_size) for _ in each_shard())
+    click.echo(f'Purged {purged} expired idempotency keys')
+
+
+@click.command('run-jobs')
+@click.option('--processes', type=int, default=None, help='Worker processes (default JOB_WORKERS).')
+@click.option('--once', is_flag=True, help='Exit once the queue is empty instead of polling.')
+@with_appcontext
+def run_jobs_command(processes, once):
+    """Run queued background jobs until stopped with SIGTERM or Ctrl+C"""
+    from app.jobs import run_workers
+
+    processes = processes or current_app.config['JOB_WORKERS']
+    click.echo(f'Running jobs in {processes} process(es)')
+    run_workers(processes, once=once)
+
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    """Fingerprint and precompress the static files into app/static/dist"""
+    from app.assets import BUILD_DIR, build_assets
+
+    manifest = build_assets(current_app.static_folder)
+    for source, hashed in sorted(manifest.items()):
+        click.echo(f'{source} -> {hashed}')
+    click.echo(f'Built {len(manifest)} assets into {BUILD_DIR}/; restart the app to serve them')
+
+
+@click.command('migrate-enum-columns')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows converted per transaction.')
+@with_appcontext
+def migrate_enum_columns_command(batch_size):
+    """Convert task status and priority from strings to integer codes"""
+    from app.enum_migration import migrate_enum_columns
+
+    for shard, converted in migrate_enum_columns(batch_size=batch_size).items():
+        click.echo(f'{shard:12} converted {converted} rows')
+
+
+@click.command('rollup-analytics')
+@click.option('--user', 'username', default=None, help='Only rebuild the rollups of this user.')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Only rebuild days from this date (YYYY-MM-DD) on.')
+@with_appcontext
+def rollup_analytics_command(username, since):
+    """Add completions missing from the daily rollups behind /api/analytics from task history"""
+    from app.analytics import rebuild_rollups
+    from app.models import User
+    from app.sharding import each_shard, shard_for_user, use_shard
+
+    _require_enum_migration()
+    since = since.date() if since is not None else None
+    if username is None:
+        for shard in each_shard():
+            rebuild_rollups(since=since)
+            click.echo(f'{shard:12} rebuilt')
+        return
+
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f'User {username!r} does not exist')
+    with use_shard(shard_for_user(user.id)):
+        rebuild_rollups(user_id=user.id, since=since)
+        db.session.commit()
+    click.echo(f'Rebuilt the rollups of {username}')
+
+
+@click.group('shards')
+def shards_group():
+    """Manage user-based database shards"""
+
+
+@shards_group.command('status')
+@with_appcontext
+def shards_status_command():
+    """Show how many users each shard holds"""
+    from app.models import UserShard
+
+    from app.sharding import all_shards
+
+    counts = dict(db.session.query(UserShard.shard, db.func.count()).group_by(UserShard.shard).all())
+    for shard in all_shards():
+        click.echo(f'{shard:12} {counts.get(shard, 0)} users')
+
+
+@shards_group.command('create-tables')
+@with_appcontext
+def shards_create_tables_command():
+    """Create per-user tables on every configured shard"""
+    from app.sharding import create_shard_tables
+
+    create_shard_tables()
+    click.echo(f"Created tables on {len(current_app.config['SHARD_KEYS'])} shards")
+
+
+@shards_group.command('pin-existing')
+@click.option('--shard', default='default', show_default=True, help='Shard that already holds their data.')
+@with_appcontext
+def shards_pin_existing_command(shard):
+    """Record users without a directory entry as living on one shard
+
+    Run once when enabling sharding, so existing accounts keep reading
+    their data from the default database until they are moved.
+    """
+    from app.sharding import pin_existing_users
+
+    click.echo(f'Pinned {pin_existing_users(shard)} users to {shard}')
+
+
+@shards_group.command('move')
+@click.argument('username')
+@click.argument('shard')
+@click.option('--settle', type=float, default=None,
+              help='Seconds to wait after fencing writes, for requests under way to finish.')
+@with_appcontext
+def shards_move_command(username, shard, settle):
+    """Move one user's data to another shard; their writes get 503 until it is done"""
+    from app.models import User
+    from app.sharding import MOVE_SETTLE_SECONDS, move_user
+
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f'User {username!r} does not exist')
+    try:
+        moved = move_user(user.id, shard, settle=MOVE_SETTLE_SECONDS if settle is None else settle)
+    except ValueError as exc:
+        raise click.ClickException(str(exc))
+    click.echo(f'Moved {moved} rows of {username} to {shard}')
+
+
+def register_commands(app):
+    app.cli.add_command(seed_bench_command)
+    app.cli.add_command(bench_command)
+    app.cli.add_command(bench_compare_command)
+    app.cli.add_command(check_query_budgets_command)
+    app.cli.add_command(archive_tasks_command)
+    app.cli.add_command(purge_idempotency_keys_command)
+    app.cli.add_command(build_assets_command)
+    app.cli.add_command(run_jobs_command)
+    app.cli.add_command(migrate_enum_columns_command)
+    app.cli.add_command(rollup_analytics_command)
+    app.cli.add_command(shards_group)
@@ -0,0 +1,68 @@
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # Optional: without it responses are only gzipped
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/javascript', 'application/json', 'image/svg+xml',
+    'text/css', 'text/csv', 'text/html', 'text/javascript', 'text/plain',
+}
+
+
+def available_encodings():
+    """Content codings this process can produce, best first"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(encodings):
+    """The encoding among ``encodings`` the client prefers (q-values, then order), or None for identity"""
+    best, best_quality = None, 0
+    for encoding in encodings:
+        quality = request.accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    # mtime=0 keeps the output (and any ETag derived from it) stable
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def init_compression(app):
+    """Compress dynamic responses above COMPRESSION_MIN_SIZE for clients that accept it
+
+    File responses (static assets) are passed through untouched; the
+    asset build precompresses those instead.
+    """
+    if not app.config['COMPRESSION_ENABLED']:
+        return
+
+    levels = {'br': app.config['COMPRESSION_BROTLI_QUALITY'], 'gzip': app.config['COMPRESSION_GZIP_LEVEL']}
+
+    @app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES or not 200 <= response.status_code < 300):
+            return response
+        data = response.get_data()
+        if len(data) < app.config['COMPRESSION_MIN_SIZE']:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(available_encodings())
+        if encoding is None:
+            return response
+        response.set_data(compress(data, encoding, levels[encoding]))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            # The compressed body is no longer byte-identical to what the tag described
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,14 @@
+from app.hierarchy import prune_hierarchy
+from app.recurrence import forget_tasks
+from app.tags import untag_tasks
+
+
+def detach_deleted_tasks(task_ids):
+    """Remove everything that points at tasks about to be deleted or archived; no commit
+
+    Their subtasks become top-level tasks, their tag postings go and
+    recurrences forget them. Call it before deleting the task rows.
+    """
+    prune_hierarchy(task_ids)
+    untag_tasks(task_ids)
+    forget_tasks(task_ids)
@@ -0,0 +1,129 @@
+import sqlalchemy as sa
+
+from app.models import Task
+from app.sharding import all_shards, engine_for
+
+# Columns converted from their string names to IntegerChoice indexes
+ENUM_COLUMNS = {
+    'status': Task.STATUS_CHOICES,
+    'priority': Task.PRIORITY_CHOICES,
+}
+ENUM_TABLES = ('task', 'task_archive')
+
+
+def _legacy_table(name):
+    # Untyped columns, so values are read and written exactly as stored
+    return sa.table(name, sa.column('id'), *[sa.column(column) for column in ENUM_COLUMNS])
+
+
+def _is_legacy(table):
+    return sa.or_(*[table.c[column].in_(choices) for column, choices in ENUM_COLUMNS.items()])
+
+
+def _encode(column, choices):
+    return sa.case(
+        *[(column == name, str(index)) for index, name in enumerate(choices)],
+        else_=column,
+    )
+
+
+def migrate_table(conn_factory, name, batch_size=1000):
+    """Rewrite string status/priority values of one table as integers, in batches
+
+    Every batch runs in its own short transaction. Returns the number
+    of converted rows.
+    """
+    table = _legacy_table(name)
+    legacy = _is_legacy(table)
+    converted = 0
+
+    while True:
+        with conn_factory() as conn:
+            ids = conn.execute(
+                sa.select(table.c.id).where(legacy).order_by(table.c.id).limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+            conn.execute(
+                table.update()
+                .where(table.c.id.in_(ids))
+                .values({column: _encode(table.c[column], choices) for column, choices in ENUM_COLUMNS.items()})
+            )
+        converted += len(ids)
+
+    return converted
+
+
+def alter_column_types(conn, name):
+    """Switch converted columns to SMALLINT where the database supports it in place
+
+    SQLite keeps the declared type of existing tables; the stored values
+    are integers after migrate_table either way.
+    """
+    if conn.dialect.name != 'postgresql':
+        return False
+    for column in ENUM_COLUMNS:
+        conn.execute(sa.text(
+            f'ALTER TABLE {name} ALTER COLUMN {column} TYPE SMALLINT USING {column}::smallint'
+        ))
+    return True
+
+
+def migrate_enum_columns(batch_size=1000):
+    """Convert task and task_archive on every shard; returns rows converted per shard"""
+    results = {}
+    for shard in all_shards():
+        engine = engine_for(shard)
+        inspector = sa.inspect(engine)
+        converted = 0
+        for name in ENUM_TABLES:
+            if not inspector.has_table(name):
+                continue
+            converted += migrate_table(engine.begin, name, batch_size=batch_size)
+            column_type = {c['name']: c['type'] for c in inspector.get_columns(name)}['status']
+            if not isinstance(column_type, sa.Integer):
+                with engine.begin() as conn:
+                    alter_column_types(conn, name)
+        results[shard] = converted
+    return results
+
+
+def unmigrated_tables():
+    """(shard, table) pairs that still need `flask migrate-enum-columns`
+
+    On PostgreSQL that is any table whose status column is not an integer
+    yet; elsewhere, any table still holding a string value.
+    """
+    pending = []
+    for shard in all_shards():
+        engine = engine_for(shard)
+        inspector = sa.inspect(engine)
+        for name in ENUM_TABLES:
+            if not inspector.has_table(name):
+                continue
+            column_type = {c['name']: c['type'] for c in inspector.get_columns(name)}['status']
+            if isinstance(column_type, sa.Integer):
+                continue
+            if engine.dialect.name != 'postgresql':
+                table = _legacy_table(name)
+                with engine.connect() as conn:
+                    if conn.execute(sa.select(table.c.id).where(_is_legacy(table)).limit(1)).first() is None:
+                        continue
+            pending.append((shard, name))
+    return pending
+
+
+def init_enum_compat(app):
+    """Make queries match both status/priority encodings while tables are not converted yet
+
+    Checked once at startup, since the check reflects every shard. Until
+    the app is restarted after `flask migrate-enum-columns`, comparisons
+    go through the text form of the columns (see IntegerChoice) and
+    cannot use their indexes.
+    """
+    with app.app_context():
+        pending = unmigrated_tables()
+    app.extensions['legacy_enum_values'] = bool(pending)
+    if pending:
+        app.logger.warning('Status/priority columns not converted yet in %s; run `flask migrate-enum-columns` '
+                           'and restart', ', '.join(f'{shard}.{name}' for shard, name in pending))
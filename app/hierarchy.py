@@ -0,0 +1,147 @@
+from sqlalchemy import and_, case, delete, exists, func, insert, literal, or_, select, true, union_all
+from sqlalchemy.orm import aliased
+
+from app.extensions import db
+from app.models import Task, TaskClosure
+
+
+class HierarchyError(ValueError):
+    """Raised when a move would make a task its own ancestor"""
+
+
+def _with_self(task_id, ids, depths):
+    # Self pairs are implicit in the closure table, so add the task itself at depth 0
+    return union_all(select(ids.label('id'), depths.label('depth')), select(literal(task_id), literal(0)))
+
+
+def _subtree(task_id):
+    """(id, depth) of a task and all of its descendants"""
+    rows = select(TaskClosure.descendant_id, TaskClosure.depth).where(TaskClosure.ancestor_id == task_id).subquery()
+    return _with_self(task_id, rows.c.descendant_id, rows.c.depth).subquery()
+
+
+def _ancestry(task_id):
+    """(id, depth) of a task and all of its ancestors"""
+    rows = select(TaskClosure.ancestor_id, TaskClosure.depth).where(TaskClosure.descendant_id == task_id).subquery()
+    return _with_self(task_id, rows.c.ancestor_id, rows.c.depth).subquery()
+
+
+def move_subtree(user_id, task_id, parent_id):
+    """Make ``parent_id`` (None for top level) the parent of a task and its subtasks
+
+    Two set-based statements whatever the size of the subtree: one cuts
+    the links to the old ancestors, one links every node of the subtree
+    to every ancestor of the new parent. Does not commit.
+    """
+    if parent_id is not None:
+        if parent_id == task_id or db.session.execute(
+            select(exists().where(TaskClosure.ancestor_id == task_id, TaskClosure.descendant_id == parent_id))
+        ).scalar():
+            raise HierarchyError('A task cannot be moved under its own subtask')
+
+    members = select(_subtree(task_id).c.id)
+    db.session.execute(
+        delete(TaskClosure)
+        .where(TaskClosure.descendant_id.in_(members), TaskClosure.ancestor_id.not_in(members))
+        .execution_options(synchronize_session=False)
+    )
+
+    if parent_id is not None:
+        above, below = _ancestry(parent_id), _subtree(task_id)
+        db.session.execute(insert(TaskClosure).from_select(
+            ['ancestor_id', 'descendant_id', 'depth', 'user_id'],
+            select(above.c.id, below.c.id, above.c.depth + below.c.depth + 1, literal(user_id))
+            .select_from(above.join(below, true()))
+        ))
+
+
+def add_subtask(user_id, parent_id, task_id):
+    """Link a new task (without subtasks of its own) under ``parent_id``; one statement, no commit"""
+    above = _ancestry(parent_id)
+    db.session.execute(insert(TaskClosure).from_select(
+        ['ancestor_id', 'descendant_id', 'depth', 'user_id'],
+        select(above.c.id, literal(task_id), above.c.depth + 1, literal(user_id))
+    ))
+
+
+def prune_hierarchy(task_ids):
+    """Drop every closure row that passes through the given (deleted) tasks
+
+    Their subtasks become top-level tasks, keeping their own subtrees.
+    One statement; does not commit.
+    """
+    if not task_ids:
+        return
+    up, down = aliased(TaskClosure), aliased(TaskClosure)
+    through_deleted = (
+        select(literal(1))
+        .select_from(up)
+        .join(down, down.ancestor_id == up.descendant_id)
+        .where(
+            up.ancestor_id == TaskClosure.ancestor_id,
+            down.descendant_id == TaskClosure.descendant_id,
+            up.descendant_id.in_(task_ids),
+        )
+        .exists()
+    )
+    db.session.execute(
+        delete(TaskClosure)
+        .where(or_(TaskClosure.ancestor_id.in_(task_ids), TaskClosure.descendant_id.in_(task_ids), through_deleted))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def subtree(user_id, task):
+    """A task and all of its subtasks as nested dicts, with roll-up progress
+
+    Every descendant is read with one query, whatever the depth.
+    """
+    link, parent_link = aliased(TaskClosure), aliased(TaskClosure)
+    rows = db.session.execute(
+        select(Task, parent_link.ancestor_id)
+        .join(link, link.descendant_id == Task.id)
+        .join(parent_link, and_(parent_link.descendant_id == Task.id, parent_link.depth == 1))
+        .where(link.ancestor_id == task.id, link.user_id == user_id)
+        .order_by(link.depth, Task.created_at)
+    ).all()
+
+    nodes = {task.id: dict(task.to_dict(), children=[])}
+    for descendant, parent_id in rows:
+        nodes[descendant.id] = dict(descendant.to_dict(), children=[])
+    for descendant, parent_id in rows:
+        if parent_id in nodes:
+            nodes[parent_id]['children'].append(nodes[descendant.id])
+
+    def roll_up(node):
+        completed = total = 0
+        for child in node['children']:
+            child_completed, child_total = roll_up(child)
+            completed += child_completed + (child['status'] == 'completed')
+            total += child_total + 1
+        node['progress'] = {'completed': completed, 'total': total}
+        return completed, total
+
+    roll_up(nodes[task.id])
+    return nodes[task.id]
+
+
+def ancestors(user_id, task_id):
+    """Ancestors of a task as dicts, from the top-level task down to the direct parent"""
+    tasks = db.session.execute(
+        select(Task)
+        .join(TaskClosure, TaskClosure.ancestor_id == Task.id)
+        .where(TaskClosure.descendant_id == task_id, TaskClosure.user_id == user_id)
+        .order_by(TaskClosure.depth.desc())
+    ).scalars().all()
+    return [task.to_dict() for task in tasks]
+
+
+def progress(user_id, task_id):
+    """Completed and total number of descendants of a task, counted in SQL"""
+    total, completed = db.session.execute(
+        select(func.count(), func.coalesce(func.sum(case((Task.status == 'completed', 1), else_=0)), 0))
+        .select_from(TaskClosure)
+        .join(Task, Task.id == TaskClosure.descendant_id)
+        .where(TaskClosure.ancestor_id == task_id, TaskClosure.user_id == user_id)
+    ).one()
+    return {'completed': completed, 'total': total}
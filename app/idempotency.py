@@ -0,0 +1,129 @@
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from flask import current_app, jsonify, make_response, request
+from flask_login import current_user
+from sqlalchemy import delete, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.models import IdempotencyKey
+from app.timeutils import utcnow
+
+MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint(method, path, body):
+    """SHA-256 of a request; ``body`` is the parsed JSON, so key order and spacing do not matter"""
+    canonical = json.dumps([method, path, body], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).digest()
+
+
+def _expired_before():
+    return utcnow() - timedelta(hours=current_app.config['IDEMPOTENCY_KEY_TTL_HOURS'])
+
+
+def _abandoned(stored):
+    """True for a key whose request committed it but never stored a response (e.g. the process died)"""
+    grace = timedelta(seconds=current_app.config['IDEMPOTENCY_PENDING_GRACE_SECONDS'])
+    return stored.status_code is None and stored.created_at < utcnow() - grace
+
+
+def _replay(stored, fingerprint):
+    if stored.fingerprint != fingerprint:
+        return jsonify({'error': 'Idempotency-Key was already used for a different request'}), 422
+    if stored.status_code is None:
+        response = jsonify({'error': 'A request with this Idempotency-Key is still in progress'})
+        response.status_code = 409
+        response.headers['Retry-After'] = '1'
+        return response
+    response = current_app.response_class(stored.response_body, status=stored.status_code,
+                                          mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """Honour the Idempotency-Key header on a POST view (place it under login_required)
+
+    The key is inserted in the same transaction as the view's own writes,
+    so it only persists if they do. A retry with the same key fails that
+    insert on the primary key and gets the stored response back instead
+    of running the view again; concurrent retries wait for the first
+    transaction and then do the same. Server errors are not stored.
+
+    Views commit before the response is stored, so a process that dies in
+    between leaves the key without one; after IDEMPOTENCY_PENDING_GRACE_SECONDS
+    such a key no longer answers 409 and the retry runs the view again.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if key is None:
+            return view(*args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters'}), 400
+
+        user_id = current_user.id
+        fingerprint = request_fingerprint(request.method, request.path, request.get_json(silent=True))
+        try:
+            db.session.add(IdempotencyKey(user_id=user_id, key=key, fingerprint=fingerprint, created_at=utcnow()))
+            db.session.flush()
+        except IntegrityError:
+            db.session.rollback()
+            stored = db.session.get(IdempotencyKey, (user_id, key))
+            if stored is not None and stored.created_at >= _expired_before() and not _abandoned(stored):
+                return _replay(stored, fingerprint)
+            # The old key has expired but was not purged yet, or its request died
+            # before storing a response: start over with it
+            db.session.execute(
+                delete(IdempotencyKey).where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+            )
+            db.session.add(IdempotencyKey(user_id=user_id, key=key, fingerprint=fingerprint, created_at=utcnow()))
+            db.session.flush()
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code >= 500:
+            db.session.rollback()
+            return response
+        # Updates nothing if the view rolled back, e.g. after a failed commit
+        db.session.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+            .values(status_code=response.status_code, response_body=response.get_data(as_text=True))
+        )
+        db.session.commit()
+        return response
+    return wrapper
+
+
+def purge_expired_keys(batch_size=1000):
+    """Delete idempotency keys older than the TTL from the current shard
+
+    Deletes ``batch_size`` keys per transaction, oldest first, so the
+    write lock is only held briefly. Returns the number of deleted keys.
+    """
+    cutoff = _expired_before()
+    purged = 0
+
+    while True:
+        batch = db.session.execute(
+            select(IdempotencyKey.user_id, IdempotencyKey.key)
+            .where(IdempotencyKey.created_at < cutoff)
+            .order_by(IdempotencyKey.created_at)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            break
+
+        db.session.execute(
+            delete(IdempotencyKey)
+            .where(tuple_(IdempotencyKey.user_id, IdempotencyKey.key).in_([tuple(row) for row in batch]))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        purged += len(batch)
+
+    return purged
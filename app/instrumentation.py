@@ -0,0 +1,38 @@
+from sqlalchemy import event
+
+from app.extensions import db
+
+
+class QueryCounter:
+    """Count the SQL statements executed on every configured engine
+
+    Use as a context manager inside an application context:
+
+        with QueryCounter() as counter:
+            client.get('/api/tasks')
+        print(counter.count)
+    """
+
+    def __init__(self, engines=None):
+        self.engines = list(engines) if engines is not None else list(db.engines.values())
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def reset(self):
+        self.statements = []
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        for engine in self.engines:
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for engine in self.engines:
+            event.remove(engine, 'before_cursor_execute', self._before_cursor_execute)
+        return False
@@ -0,0 +1,237 @@
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import time
+import uuid
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import delete, exists, func, select, update
+from sqlalchemy.orm import aliased
+
+from app.deletion import detach_deleted_tasks
+from app.extensions import db
+from app.models import Job, Task
+from app.sharding import UserMoving, shard_for_user, use_shard
+from app.timeutils import utcnow
+
+# kind -> handler(user_id, **payload) returning a JSON-serialisable result
+JOB_HANDLERS = {}
+
+
+def job_handler(kind):
+    """Register a function as the handler of one kind of job
+
+    Handlers run with routing pinned to the user's shard and may commit
+    as often as they like; the runner commits once more at the end. They
+    must be safe to run again after a failure, since failed jobs are retried.
+    """
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(user_id, kind, max_attempts=None, **payload):
+    """Add a job to the queue without committing; returns the Job"""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f'Unknown job kind: {kind}')
+    job = Job(
+        user_id=user_id,
+        kind=kind,
+        payload=json.dumps(payload),
+        max_attempts=max_attempts or current_app.config['JOB_MAX_ATTEMPTS'],
+        run_after=utcnow(),
+    )
+    db.session.add(job)
+    return job
+
+
+def claim_job(worker_id):
+    """Mark the next runnable job as running for this worker and return it, or None
+
+    A job is runnable once its run_after has passed, if its user has no
+    job running and no older job still queued: each user's jobs run one
+    at a time, in the order they were queued. The claim is a single
+    UPDATE, so two workers can never take the same job.
+    """
+    now = utcnow()
+    token = f'{worker_id}:{uuid.uuid4().hex[:8]}'
+    # Aliases keep the subquery from being correlated with the UPDATE's own table
+    candidate, other = aliased(Job), aliased(Job)
+    next_job = (
+        select(candidate.id)
+        .where(
+            candidate.status == 'queued',
+            candidate.run_after <= now,
+            ~exists().where(other.user_id == candidate.user_id, other.status == 'running'),
+            ~exists().where(other.user_id == candidate.user_id, other.status == 'queued', other.id < candidate.id),
+        )
+        .order_by(candidate.run_after, candidate.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    claimed = db.session.execute(
+        update(Job)
+        .where(Job.id == next_job, Job.status == 'queued')
+        .values(status='running', claimed_by=token, started_at=now, attempts=Job.attempts + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        return None
+    return Job.query.filter_by(claimed_by=token, status='running').one()
+
+
+def _finish(job_id, **values):
+    db.session.execute(
+        update(Job).where(Job.id == job_id).values(finished_at=utcnow(), **values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def run_job(job):
+    """Run one claimed job and record its result; failures are retried with exponential backoff"""
+    job_id, user_id, kind, attempts, max_attempts = job.id, job.user_id, job.kind, job.attempts, job.max_attempts
+    try:
+        handler = JOB_HANDLERS[kind]
+        with use_shard(shard_for_user(user_id, for_write=True)):
+            result = handler(user_id, **json.loads(job.payload))
+            db.session.commit()
+    except UserMoving:
+        db.session.rollback()
+        # Not the job's fault: run it after the move, without using up an attempt
+        _finish(job_id, status='queued', claimed_by=None, attempts=attempts - 1,
+                run_after=utcnow() + timedelta(seconds=current_app.config['JOB_RETRY_DELAY']))
+        return False
+    except Exception as exc:
+        db.session.rollback()
+        current_app.logger.exception('Job %s (%s) failed on attempt %s of %s', job_id, kind, attempts, max_attempts)
+        error = f'{type(exc).__name__}: {exc}'
+        if attempts < max_attempts:
+            delay = current_app.config['JOB_RETRY_DELAY'] * 2 ** (attempts - 1)
+            _finish(job_id, status='queued', error=error, claimed_by=None,
+                    run_after=utcnow() + timedelta(seconds=delay))
+        else:
+            _finish(job_id, status='failed', error=error)
+        return False
+    _finish(job_id, status='succeeded', result=json.dumps(result), error=None)
+    return True
+
+
+def requeue_stale_jobs():
+    """Put jobs back in the queue whose worker died (running longer than JOB_TIMEOUT)
+
+    Jobs that have used all their attempts are marked failed instead.
+    """
+    cutoff = utcnow() - timedelta(seconds=current_app.config['JOB_TIMEOUT'])
+    stale = [Job.status == 'running', Job.started_at < cutoff]
+    db.session.execute(
+        update(Job).where(*stale, Job.attempts >= Job.max_attempts)
+        .values(status='failed', error='Worker stopped responding', finished_at=utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    requeued = db.session.execute(
+        update(Job).where(*stale).values(status='queued', claimed_by=None, run_after=utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return requeued
+
+
+def work(once=False):
+    """Claim and run jobs until stopped (SIGTERM/SIGINT), or until the queue is empty with ``once``"""
+    worker_id = f'{socket.gethostname()}:{os.getpid()}'
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    processed = 0
+    while not stopping:
+        job = claim_job(worker_id)
+        if job is None:
+            if once:
+                break
+            requeue_stale_jobs()
+            time.sleep(current_app.config['JOB_POLL_INTERVAL'])
+            continue
+        run_job(job)
+        db.session.expunge_all()
+        processed += 1
+    return processed
+
+
+def _worker_process(once):
+    # Spawned workers build their own app from the environment, like run.py
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        work(once=once)
+
+
+def run_workers(processes, once=False):
+    """Run jobs in ``processes`` spawned worker processes (in this process for 1) until they stop"""
+    if processes <= 1:
+        return work(once=once)
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_worker_process, args=(once,), name=f'job-worker-{n}') for n in range(processes)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        # Workers got the same SIGINT and stop after their current job
+        for worker in workers:
+            worker.join()
+
+
+# ---------------- HANDLERS ----------------
+
+def completed_task_count(user_id):
+    return db.session.execute(
+        select(func.count()).select_from(Task).where(Task.user_id == user_id, Task.status == 'completed')
+    ).scalar()
+
+
+@job_handler('clear_completed')
+def clear_completed_tasks(user_id, batch_size=500):
+    """Delete the user's completed tasks, one batch per transaction"""
+    deleted = 0
+    while True:
+        ids = db.session.execute(
+            select(Task.id).where(Task.user_id == user_id, Task.status == 'completed').limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        detach_deleted_tasks(ids)  # Their subtasks become top-level tasks
+        db.session.execute(delete(Task).where(Task.id.in_(ids)).execution_options(synchronize_session=False))
+        db.session.commit()
+        deleted += len(ids)
+        if len(ids) < batch_size:
+            break
+    return {'deleted': deleted}
+
+
+def clear_completed_now_or_later(user_id):
+    """Delete the user's completed tasks, inline up to JOB_INLINE_LIMIT, otherwise in a queued job
+
+    Returns (count, job): the number of completed tasks and the queued
+    Job, or None if they were deleted inline. Commits.
+    """
+    count = completed_task_count(user_id)
+    if count > current_app.config['JOB_INLINE_LIMIT']:
+        # Too slow for a request: a background worker deletes them in batches
+        job = enqueue(user_id, 'clear_completed')
+        db.session.commit()
+        return count, job
+    return clear_completed_tasks(user_id)['deleted'], None
+
@@ -1,7 +1,78 @@
-from datetime import datetime, timezone
+import json
 from werkzeug.security import generate_password_hash, check_password_hash
+from flask import current_app, has_app_context
 from flask_login import UserMixin
+from sqlalchemy.sql import operators
 from app.extensions import db, login_manager
+from app.timeutils import utcnow
+
+
+def legacy_enum_values():
+    """True while some status/priority values may still be stored as strings (see app.enum_migration)"""
+    return has_app_context() and current_app.extensions.get('legacy_enum_values', False)
+
+
+class IntegerChoice(db.TypeDecorator):
+    """Store one of a fixed list of strings as its position in the list
+
+    Python code keeps seeing the strings, and rows still holding the
+    legacy string value are read correctly. While `flask migrate-enum-columns`
+    has not converted every row, equality, IN and ORDER BY match both
+    encodings (through the text form of the column), so the app keeps
+    serving during the conversion; afterwards they compare the codes
+    and can use the indexes.
+    """
+    impl = db.SmallInteger
+    cache_ok = True
+    
+    class comparator_factory(db.SmallInteger.Comparator):
+        def operate(self, op, *other, **kwargs):
+            if legacy_enum_values():
+                if op in (operators.eq, operators.ne, operators.in_op, operators.not_in_op):
+                    values = other[0] if op in (operators.in_op, operators.not_in_op) else [other[0]]
+                    if isinstance(values, (list, tuple)) and all(isinstance(v, (str, int)) for v in values):
+                        either = self._both_encodings(values)
+                        if op in (operators.eq, operators.in_op):
+                            return db.cast(self.expr, db.String).in_(either)
+                        return db.cast(self.expr, db.String).not_in(either)
+                elif op in (operators.asc_op, operators.desc_op):
+                    return op(self._code())
+            return super().operate(op, *other, **kwargs)
+        
+        def _both_encodings(self, values):
+            choices = self.type.choices
+            either = []
+            for value in values:
+                index = value if isinstance(value, int) else choices.index(value)
+                either += [str(index), choices[index]]
+            return either
+        
+        def _code(self):
+            choices = self.type.choices
+            whens = {name: index for index, name in enumerate(choices)}
+            whens.update({str(index): index for index in range(len(choices))})
+            return db.case(whens, value=db.cast(self.expr, db.String))
+    
+    def __init__(self, choices):
+        super().__init__()
+        self.choices = tuple(choices)
+    
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, int):
+            return value
+        try:
+            return self.choices.index(value)
+        except ValueError:
+            raise ValueError(f'{value!r} is not one of {self.choices}') from None
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            if not value.isdigit():
+                return value  # Legacy row, not migrated yet
+            value = int(value)
+        return self.choices[value]
 
 
 @login_manager.user_loader
@@ -16,7 +87,7 @@ class User(UserMixin, db.Model):
     first_name = db.Column(db.String(50))
     last_name = db.Column(db.String(50))
     is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime, default=utcnow)
     last_login = db.Column(db.DateTime)
 
     # Relationships
@@ -31,52 +102,355 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+# Orderings accepted by ?sort= on task listings, as (column, direction) pairs
+TASK_SORTS = {
+    'created_at': (('created_at', 'desc'),),
+    'priority': (('priority', 'desc'), ('created_at', 'desc')),
+    'due_date': (('due_date', 'asc'),),
+}
+
+def task_order_by(sort, columns):
+    """ORDER BY clauses for a TASK_SORTS key, built from a name -> column mapping"""
+    clauses = []
+    for name, direction in TASK_SORTS[sort]:
+        clause = columns[name].desc() if direction == 'desc' else columns[name].asc()
+        # Tasks without a due date go last (PostgreSQL's default for an ascending index)
+        clauses.append(clause.nulls_last() if name == 'due_date' else clause)
+    return clauses
+
+def serialize_task(task, archived=False):
+    """JSON representation shared by Task, TaskArchive and raw task rows"""
+    data = {
+        'id': task.id,
+        'title': task.title,
+        'description': task.description,
+        'status': task.status,
+        'priority': task.priority,
+        'due_date': task.due_date.isoformat() if task.due_date else None,
+        'created_at': task.created_at.isoformat(),
+        'updated_at': task.updated_at.isoformat(),
+        'completed_at': task.completed_at.isoformat() if task.completed_at else None,
+        'user_id': task.user_id
+    }
+    if archived:
+        data['archived'] = True
+    return data
+
 class Task(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
-    status = db.Column(db.String(20), default='pending', nullable=False)
-    priority = db.Column(db.String(20), default='medium', nullable=False)
+    # Task status choices (stored as their index, so order matters)
+    STATUS_CHOICES = ['pending', 'in_progress', 'completed', 'cancelled']
+    PRIORITY_CHOICES = ['low', 'medium', 'high', 'urgent']
+    
+    status = db.Column(IntegerChoice(STATUS_CHOICES), default='pending', nullable=False)
+    priority = db.Column(IntegerChoice(PRIORITY_CHOICES), default='medium', nullable=False)
     due_date = db.Column(db.DateTime)
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
-    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime, default=utcnow)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
     completed_at = db.Column(db.DateTime)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('task_category.id'), nullable=True)
     
-    # Task status choices
-    STATUS_CHOICES = ['pending', 'in_progress', 'completed', 'cancelled']
-    PRIORITY_CHOICES = ['low', 'medium', 'high', 'urgent']
+    __table_args__ = (
+        # Used by the archive job to find old completed tasks
+        db.Index('ix_task_status_completed_at', 'status', 'completed_at'),
+        # Covers per-category counts and bulk category updates
+        db.Index('ix_task_user_category_status', 'user_id', 'category_id', 'status'),
+        # Serve ?sort=priority and ?sort=due_date straight from the index
+        db.Index('ix_task_user_priority_created', 'user_id', 'priority', 'created_at'),
+        db.Index('ix_task_user_due_date', 'user_id', 'due_date'),
+        # Per-band scans of /api/tasks/next
+        db.Index('ix_task_user_status_priority_due', 'user_id', 'status', 'priority', 'due_date'),
+        db.Index('ix_task_user_status_priority_created', 'user_id', 'status', 'priority', 'created_at'),
+        # Never hand out the id of a deleted or archived task again
+        {'info': {'sharded': True}, 'sqlite_autoincrement': True},
+    )
     
     def __repr__(self):
         return f'<Task {self.title}>'
     
     def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'status': self.status,
-            'priority': self.priority,
-            'due_date': self.due_date.isoformat() if self.due_date else None,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
-            'user_id': self.user_id
-        }
+        return serialize_task(self)
 
 class TaskCategory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), nullable=False)
     color = db.Column(db.String(7), default='#007bff')  # Hex color
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=utcnow)
+    
+    __table_args__ = {'info': {'sharded': True}}
     
     # Relationships
     tasks = db.relationship('Task', backref='category', lazy=True)
     
     def __repr__(self):
         return f'<TaskCategory {self.name}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'color': self.color,
+            'created_at': self.created_at.isoformat()
+        }
+
+class UserShard(db.Model):
+    """Directory mapping each user to the shard holding their tasks"""
+    __tablename__ = 'user_shard'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    shard = db.Column(db.String(32), nullable=False, index=True)
+    assigned_at = db.Column(db.DateTime, default=utcnow)
+    moving = db.Column(db.Boolean, default=False, server_default=db.false(), nullable=False)  # Writes are fenced
+    
+    def __repr__(self):
+        return f'<UserShard {self.user_id} -> {self.shard}>'
+
+class IdAllocator(db.Model):
+    """Next free id of each per-user table, shared by every shard so that ids never collide between them"""
+    __tablename__ = 'id_allocator'
+    
+    table_name = db.Column(db.String(64), primary_key=True)
+    next_id = db.Column(db.BigInteger, nullable=False)
+    
+    def __repr__(self):
+        return f'<IdAllocator {self.table_name}: {self.next_id}>'
 
+class TaskArchive(db.Model):
+    """Completed tasks moved out of the hot task table by the archive job"""
+    __tablename__ = 'task_archive'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # Id of the task, used by the API and restore
+    original_id = db.Column(db.Integer, nullable=False, info={'id_of': 'task'})
+    title = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text)
+    status = db.Column(IntegerChoice(Task.STATUS_CHOICES), nullable=False)
+    priority = db.Column(IntegerChoice(Task.PRIORITY_CHOICES), nullable=False)
+    due_date = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('task_category.id'), nullable=True)
+    archived_at = db.Column(db.DateTime, default=utcnow)
+    # Restored by restore_task: the direct parent at archive time and a JSON list of tag names
+    parent_id = db.Column(db.Integer)
+    tag_names = db.Column(db.Text)
+    
+    __table_args__ = (
+        db.Index('ix_task_archive_user_created', 'user_id', 'created_at'),
+        db.Index('ix_task_archive_user_original', 'user_id', 'original_id'),
+        # Nothing refers to the archive's own ids, so they are numbered per shard and renumbered on moves
+        {'info': {'sharded': True, 'local_ids': True}},
+    )
+    
+    # Columns copied between task and task_archive
+    TASK_COLUMNS = ['id', 'title', 'description', 'status', 'priority', 'due_date', 'created_at',
+                    'updated_at', 'completed_at', 'user_id', 'category_id']
+    
+    @classmethod
+    def task_column(cls, name):
+        """The archive column holding the task column ``name``"""
+        return cls.original_id if name == 'id' else getattr(cls, name)
+    
+    def __repr__(self):
+        return f'<TaskArchive {self.title}>'
+    
+    def to_dict(self):
+        return dict(serialize_task(self, archived=True), id=self.original_id)
 
-  
+class TaskRecurrence(db.Model):
+    """Repeat rule attached to a template task; later occurrences are computed, not stored"""
+    __tablename__ = 'task_recurrence'
+    
+    FREQUENCY_CHOICES = ['daily', 'weekly', 'monthly']
+    
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, db.ForeignKey('task.id', ondelete='CASCADE'), nullable=False, unique=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    frequency = db.Column(IntegerChoice(FREQUENCY_CHOICES), nullable=False)
+    interval = db.Column(db.Integer, default=1, nullable=False)  # Every N days, weeks or months
+    starts_at = db.Column(db.DateTime, nullable=False)  # The template task is the occurrence at starts_at
+    until = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=utcnow)
+    
+    __table_args__ = {'info': {'sharded': True}}
+    
+    def __repr__(self):
+        return f'<TaskRecurrence {self.frequency} x{self.interval} of task {self.task_id}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'task_id': self.task_id,
+            'frequency': self.frequency,
+            'interval': self.interval,
+            'starts_at': self.starts_at.isoformat(),
+            'until': self.until.isoformat() if self.until else None
+        }
+
+class TaskOccurrence(db.Model):
+    """An occurrence of a recurrence that the user completed, edited or skipped
+
+    ``task_id`` points at the task created for it, or is NULL when the
+    occurrence was skipped (or its task deleted).
+    """
+    __tablename__ = 'task_occurrence'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    recurrence_id = db.Column(db.Integer, db.ForeignKey('task_recurrence.id', ondelete='CASCADE'), nullable=False)
+    occurs_at = db.Column(db.DateTime, nullable=False)
+    task_id = db.Column(db.Integer, db.ForeignKey('task.id', ondelete='SET NULL'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    
+    task = db.relationship('Task')
+    
+    __table_args__ = (
+        db.UniqueConstraint('recurrence_id', 'occurs_at', name='uq_task_occurrence_slot'),
+        db.Index('ix_task_occurrence_user_occurs', 'user_id', 'occurs_at'),
+        {'info': {'sharded': True}},
+    )
+    
+    def __repr__(self):
+        return f'<TaskOccurrence {self.recurrence_id} @ {self.occurs_at}>'
+
+class TaskClosure(db.Model):
+    """Closure table of the subtask hierarchy: one row per (ancestor, descendant) pair
+
+    Self pairs are not stored, so tasks outside any hierarchy have no rows.
+    """
+    __tablename__ = 'task_closure'
+    
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('task.id', ondelete='CASCADE'), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey('task.id', ondelete='CASCADE'), primary_key=True)
+    depth = db.Column(db.Integer, nullable=False)  # 1 for a direct subtask
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_task_closure_descendant_depth', 'descendant_id', 'depth'),
+        {'info': {'sharded': True}},
+    )
+    
+    def __repr__(self):
+        return f'<TaskClosure {self.ancestor_id} -> {self.descendant_id} ({self.depth})>'
+
+class Tag(db.Model):
+    """Free-form label; a task can carry any number of them"""
+    __tablename__ = 'tag'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'name', name='uq_tag_user_name'),
+        {'info': {'sharded': True}},
+    )
+    
+    def __repr__(self):
+        return f'<Tag {self.name}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'created_at': self.created_at.isoformat()
+        }
+
+class TaskTag(db.Model):
+    """Inverted index from tags to tasks; the primary key doubles as the posting list"""
+    __tablename__ = 'task_tag'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    tag_id = db.Column(db.Integer, db.ForeignKey('tag.id', ondelete='CASCADE'), primary_key=True)
+    task_id = db.Column(db.Integer, db.ForeignKey('task.id', ondelete='CASCADE'), primary_key=True)
+    
+    __table_args__ = (
+        db.Index('ix_task_tag_task', 'task_id'),
+        {'info': {'sharded': True}},
+    )
+    
+    def __repr__(self):
+        return f'<TaskTag {self.tag_id} -> {self.task_id}>'
+
+class TaskDailyStats(db.Model):
+    """Completions per user, UTC day and priority, kept up to date as tasks change status"""
+    __tablename__ = 'task_daily_stats'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    priority = db.Column(IntegerChoice(Task.PRIORITY_CHOICES), primary_key=True)
+    completed_count = db.Column(db.Integer, default=0, nullable=False)
+    completion_seconds = db.Column(db.Float, default=0, nullable=False)  # Sum of completed_at - created_at
+    
+    __table_args__ = {'info': {'sharded': True}}
+    
+    def __repr__(self):
+        return f'<TaskDailyStats {self.user_id} {self.day} {self.priority}: {self.completed_count}>'
+
+class IdempotencyKey(db.Model):
+    """Response to a POST sent with an Idempotency-Key header, replayed when the client retries"""
+    __tablename__ = 'idempotency_key'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    key = db.Column(db.String(255), primary_key=True)
+    fingerprint = db.Column(db.LargeBinary(32), nullable=False)  # SHA-256 of method, path and body
+    status_code = db.Column(db.SmallInteger)  # NULL while the first request is still running
+    response_body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=utcnow, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_idempotency_key_created_at', 'created_at'),
+        {'info': {'sharded': True}},
+    )
+    
+    def __repr__(self):
+        return f'<IdempotencyKey {self.user_id} {self.key}: {self.status_code}>'
+
+class Job(db.Model):
+    """Queued background operation for one user, run by `flask run-jobs` workers"""
+    __tablename__ = 'job'
+    
+    STATUS_CHOICES = ['queued', 'running', 'succeeded', 'failed']
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON keyword arguments of the handler
+    status = db.Column(IntegerChoice(STATUS_CHOICES), default='queued', nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=3, nullable=False)
+    run_after = db.Column(db.DateTime, default=utcnow, nullable=False)  # Pushed back between retries
+    claimed_by = db.Column(db.String(64))
+    result = db.Column(db.Text)  # JSON returned by the handler
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_job_status_run_after', 'status', 'run_after'),
+        db.Index('ix_job_user_status', 'user_id', 'status'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
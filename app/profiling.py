@@ -0,0 +1,92 @@
+import cProfile
+import os
+import sys
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+
+from flask import g, request
+from flask_login import current_user
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_QUERY_ARG = '_profile'
+
+
+class StackSampler(threading.Thread):
+    """Sample the call stack of one thread into flamegraph collapsed stacks"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def write_collapsed(self, path):
+        with open(path, 'w', encoding='utf-8') as fh:
+            for stack, count in self.stacks.most_common():
+                fh.write(f'{stack} {count}\n')
+
+
+def _profiling_requested(app):
+    """Check whether the current request asked for a profile and may have one"""
+    if request.headers.get(PROFILE_HEADER) != '1' and request.args.get(PROFILE_QUERY_ARG) != '1':
+        return False
+    if not current_user.is_authenticated:
+        return False
+    return current_user.username in app.config['PROFILING_ADMINS']
+
+
+def init_profiling(app):
+    """Register the opt-in request profiler
+
+    Nothing is registered unless PROFILING_ENABLED is set, so normal
+    deployments do not pay for the hooks at all.
+    """
+    if not app.config['PROFILING_ENABLED']:
+        return
+
+    output_dir = app.config['PROFILING_OUTPUT_DIR'] or os.path.join(app.instance_path, 'profiles')
+
+    @app.before_request
+    def start_profiler():
+        if not _profiling_requested(app):
+            return
+        sampler = StackSampler(threading.get_ident(), app.config['PROFILING_SAMPLE_INTERVAL'])
+        profiler = cProfile.Profile()
+        g._profiler = (profiler, sampler)
+        sampler.start()
+        profiler.enable()
+
+    @app.teardown_request
+    def stop_profiler(error=None):
+        active = g.pop('_profiler', None)
+        if active is None:
+            return
+        profiler, sampler = active
+        profiler.disable()
+        sampler.stop()
+
+        os.makedirs(output_dir, exist_ok=True)
+        endpoint = (request.endpoint or 'unknown').replace('.', '-')
+        timestamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+        base_path = os.path.join(output_dir, f'{endpoint}-{timestamp}')
+        profiler.dump_stats(f'{base_path}.pstats')
+        sampler.write_collapsed(f'{base_path}.collapsed')
+        app.logger.info('Request profile written to %s.pstats', base_path)
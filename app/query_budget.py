@@ -0,0 +1,100 @@
+from app.extensions import db
+from app.instrumentation import QueryCounter
+
+# Tasks owned by the budget user in each run; the counts must not change between them
+DATASET_SIZES = (10, 250)
+
+
+def query_budget(limit):
+    """Declare the maximum number of SQL statements a view may execute
+
+    Place it directly under the route decorator. The count covers the
+    whole request, including loading the logged-in user.
+    """
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def declared_budgets(app):
+    """Map every blueprint endpoint to its declared budget (None if missing)"""
+    from app.bench import BENCH_BLUEPRINTS
+
+    return {
+        endpoint: getattr(view, 'query_budget', None)
+        for endpoint, view in app.view_functions.items()
+        if endpoint.split('.')[0] in BENCH_BLUEPRINTS
+    }
+
+
+def _measure(app, username, scenarios):
+    from app.bench import BENCH_PASSWORD, BenchFixture, ScenarioRunner
+    from app.models import User
+
+    with app.app_context():
+        fixture = BenchFixture(User.query.filter_by(username=username).one(), BENCH_PASSWORD)
+        engines = list(db.engines.values())
+
+    runner = ScenarioRunner(app, fixture)
+    counts = {}
+    for scenario in scenarios:
+        issue = runner.prepare(scenario)
+        with QueryCounter(engines) as counter:
+            response = issue()
+        if response.status_code not in scenario.expected_status:
+            raise RuntimeError(f'{scenario.method} {scenario.endpoint} returned {response.status_code}')
+        key = (scenario.endpoint, scenario.method)
+        counts[key] = max(counts.get(key, 0), counter.count)
+    return counts
+
+
+def check_query_budgets(app, dataset_sizes=DATASET_SIZES, scenarios=None):
+    """Run every scenario against growing datasets and compare with the budgets
+
+    Returns one result per (endpoint, method) with the statement counts
+    per dataset size and a list of problems; an empty list means pass.
+    """
+    from app.bench import SCENARIOS, run_isolated, seed_benchmark_data
+
+    scenarios = SCENARIOS if scenarios is None else scenarios
+    measurements = []
+    # Budgets cover the synchronous write path; background flushes would also be counted
+    write_behind = app.extensions.pop('write_behind', None)
+    try:
+        for size in dataset_sizes:
+            prefix = f'budget{size}-'
+            with app.app_context():
+                db.create_all(bind_key=None)
+                seed_benchmark_data(users=1, tasks=size, categories=3, prefix=prefix, seed=size)
+            measurements.append(run_isolated(_measure, app, f'{prefix}000000', scenarios))
+    finally:
+        if write_behind is not None:
+            app.extensions['write_behind'] = write_behind
+
+    budgets = declared_budgets(app)
+    results = []
+    for key in sorted(set().union(*measurements)):
+        endpoint, method = key
+        counts = [m[key] for m in measurements]
+        budget = budgets.get(endpoint)
+        problems = []
+        if budget is None:
+            problems.append('no query budget declared')
+        elif max(counts) > budget:
+            problems.append(f'executed {max(counts)} statements, budget is {budget}')
+        if len(set(counts)) > 1:
+            problems.append('statement count grows with the number of tasks')
+        results.append({
+            'endpoint': endpoint,
+            'method': method,
+            'budget': budget,
+            'counts': dict(zip(dataset_sizes, counts)),
+            'problems': problems,
+        })
+
+    measured = {endpoint for endpoint, _ in measurements[0]}
+    for endpoint in sorted(set(budgets) - measured):
+        results.append({'endpoint': endpoint, 'method': None, 'budget': budgets[endpoint],
+                        'counts': {}, 'problems': ['no scenario exercises this endpoint']})
+    return results
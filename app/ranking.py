@@ -0,0 +1,108 @@
+from collections import Counter
+
+from sqlalchemy import literal, select, union_all
+
+from app.extensions import db
+from app.models import Task, serialize_task
+from app.timeutils import utcnow
+
+# Tasks that can still be worked on
+OPEN_STATUSES = ('pending', 'in_progress')
+
+# (priority, status, list) of every branch of candidates(), in branch number order
+BRANCHES = [
+    (priority, status, order)
+    for priority in Task.PRIORITY_CHOICES
+    for status in OPEN_STATUSES
+    for order in ('due', 'age')
+]
+
+
+def candidates(user_id, depth):
+    """Select the tasks worth scoring for a user, as one statement
+
+    For every priority band and open status this reads the ``depth``
+    soonest-due and ``depth`` oldest tasks, each row labelled with the
+    number of its branch in BRANCHES. Each branch is a range scan on an
+    index starting with (user_id, status, priority), so at most
+    16 * depth rows are read however many tasks the user has.
+    """
+    branches = []
+    for number, (priority, status, order) in enumerate(BRANCHES):
+        query = select(Task.__table__, literal(number).label('branch')).where(
+            Task.user_id == user_id, Task.status == status, Task.priority == priority
+        )
+        if order == 'due':
+            query = query.where(Task.due_date.is_not(None)).order_by(Task.due_date)
+        else:
+            query = query.order_by(Task.created_at)
+        # Wrapped in subqueries: SQLite does not allow LIMIT on UNION members
+        branches.append(select(query.limit(depth).subquery()))
+    return union_all(*branches)
+
+
+def score(priority, due_date, created_at, weights, now):
+    """Rank of a task: priority band, plus due date proximity, plus age in days
+
+    Never grows with a later due date or a later creation time.
+    """
+    value = Task.PRIORITY_CHOICES.index(priority) * weights['priority']
+    if due_date is not None:
+        days_left = max((due_date - now).total_seconds() / 86400, 0)
+        value += weights['due'] / (1 + days_left)
+    if created_at is not None:
+        value += max((now - created_at).total_seconds() / 86400, 0) * weights['age']
+    return value
+
+
+def score_task(task, weights, now):
+    return score(task.priority, task.due_date, task.created_at, weights, now)
+
+
+def _unread_bound(depth, counts, edges, weights, now):
+    """Highest score any task not read yet can have, or None if every open task was read
+
+    A band's lists were read up to edges[branch]; the tasks after that
+    are due no sooner and were created no earlier, so their score is at
+    most that of a task at both edges (Fagin's threshold). A list shorter
+    than ``depth`` is exhausted: for the oldest list that means the whole
+    band was read, for the soonest-due list that only undated tasks are left.
+    """
+    bound = None
+    for number in range(0, len(BRANCHES), 2):
+        priority = BRANCHES[number][0]
+        due, age = number, number + 1
+        if counts[age] < depth:
+            continue
+        due_edge = edges[due] if counts[due] == depth else None
+        band_bound = score(priority, due_edge, edges[age], weights, now)
+        bound = band_bound if bound is None else max(bound, band_bound)
+    return bound
+
+
+def next_tasks(user_id, limit, weights):
+    """The ``limit`` highest ranked open tasks of a user as dicts, best first
+
+    ``weights`` maps 'priority', 'due' and 'age' to their multipliers.
+    Reads ``limit`` tasks deep into every band's soonest-due and oldest
+    lists, and doubles that depth until the ``limit``-th best score
+    reaches the bound on every task not read yet, so the result is the
+    exact top ``limit``. Most users need a single round.
+    """
+    now = utcnow()
+    depth = limit
+    while True:
+        rows = db.session.execute(candidates(user_id, depth), bind_arguments={'mapper': Task}).all()
+        tasks, counts, edges = {}, Counter(), {}
+        for row in rows:
+            tasks[row.id] = row
+            counts[row.branch] += 1
+            edge = row.due_date if BRANCHES[row.branch][2] == 'due' else row.created_at
+            edges[row.branch] = max(edges.get(row.branch, edge), edge)
+
+        scored = sorted(((score_task(task, weights, now), task) for task in tasks.values()),
+                        key=lambda pair: (-pair[0], pair[1].id))
+        bound = _unread_bound(depth, counts, edges, weights, now)
+        if bound is None or (len(scored) >= limit and scored[limit - 1][0] >= bound):
+            return [dict(serialize_task(task), score=round(value, 3)) for value, task in scored[:limit]]
+        depth *= 2
@@ -0,0 +1,186 @@
+import calendar
+import itertools
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select, update
+
+from app.analytics import completion_state, record_completion_change
+from app.extensions import db
+from app.models import Task, TaskOccurrence, TaskRecurrence, serialize_task
+from app.timeutils import utcnow
+
+# Widest window /api/occurrences will expand in one request
+MAX_WINDOW_DAYS = 366
+
+# Fields of an occurrence that may be edited; everything else comes from the template
+OCCURRENCE_FIELDS = ('title', 'description', 'status', 'priority')
+
+
+def _add_months(moment, months):
+    month_index = moment.month - 1 + months
+    year, month = moment.year + month_index // 12, month_index % 12 + 1
+    # Clamp e.g. the 31st to the last day of shorter months
+    day = min(moment.day, calendar.monthrange(year, month)[1])
+    return moment.replace(year=year, month=month, day=day)
+
+
+def nth_occurrence(rule, n):
+    """Start of occurrence ``n`` of a rule; occurrence 0 is the template task itself"""
+    if rule.frequency == 'monthly':
+        return _add_months(rule.starts_at, n * rule.interval)
+    days = rule.interval * (7 if rule.frequency == 'weekly' else 1)
+    return rule.starts_at + timedelta(days=n * days)
+
+
+def occurrences(rule, start, end):
+    """Yield the start of every occurrence after the template within [start, end)
+
+    Jumps straight to the first occurrence in the window, so the cost
+    depends on the window length, not on how long ago the rule started.
+    """
+    if rule.frequency == 'monthly':
+        months = (start.year - rule.starts_at.year) * 12 + start.month - rule.starts_at.month
+        first = months // rule.interval - 1
+    else:
+        step = timedelta(days=rule.interval * (7 if rule.frequency == 'weekly' else 1))
+        first = (start - rule.starts_at) // step
+    for n in itertools.count(max(first, 1)):
+        moment = nth_occurrence(rule, n)
+        if moment >= end or (rule.until is not None and moment > rule.until):
+            return
+        if moment >= start:
+            yield moment
+
+
+def occurrence_on(rule, day):
+    """The occurrence starting on the given date, or None if the rule has none that day"""
+    start = datetime.combine(day, datetime.min.time())
+    return next(occurrences(rule, start, start + timedelta(days=1)), None)
+
+
+def set_recurrence(task, frequency, interval=1, until=None):
+    """Create or replace the repeat rule of a template task, without committing
+
+    The template's due date (or creation time) anchors the series.
+    """
+    rule = TaskRecurrence.query.filter_by(task_id=task.id).first()
+    if rule is None:
+        rule = TaskRecurrence(task_id=task.id, user_id=task.user_id)
+        db.session.add(rule)
+    rule.frequency = frequency
+    rule.interval = interval
+    rule.until = until
+    rule.starts_at = task.due_date or task.created_at
+    return rule
+
+
+def list_occurrences(user_id, start, end):
+    """Every occurrence of the user's recurring tasks within [start, end), as dicts
+
+    Untouched occurrences are generated from their template and have no
+    id. Completed or edited ones come from the task stored for them;
+    skipped ones are left out.
+    """
+    rules = db.session.execute(
+        select(TaskRecurrence, Task)
+        .join(Task, (Task.id == TaskRecurrence.task_id) & (Task.user_id == user_id))
+        .where(TaskRecurrence.user_id == user_id)
+    ).all()
+    stored = db.session.execute(
+        select(TaskOccurrence, Task)
+        .outerjoin(Task, (Task.id == TaskOccurrence.task_id) & (Task.user_id == user_id))
+        .where(TaskOccurrence.user_id == user_id, TaskOccurrence.occurs_at >= start, TaskOccurrence.occurs_at < end)
+    ).all()
+    touched = {(occurrence.recurrence_id, occurrence.occurs_at): task for occurrence, task in stored}
+
+    items = []
+    for rule, template in rules:
+        for moment in occurrences(rule, start, end):
+            key = (rule.id, moment)
+            if key not in touched:
+                data = serialize_task(template)
+                data.update(id=None, status='pending', due_date=moment.isoformat(), completed_at=None)
+            elif touched[key] is not None:
+                data = touched[key].to_dict()
+            else:
+                continue
+            data.update(recurrence_id=rule.id, template_id=template.id, occurs_at=moment.isoformat())
+            items.append(data)
+    items.sort(key=lambda item: item['occurs_at'])
+    return items
+
+
+def touch_occurrence(rule, template, moment, changes):
+    """Store an occurrence as a real task with ``changes`` applied, without committing
+
+    Returns (task, created).
+    """
+    existing = db.session.execute(
+        select(TaskOccurrence, Task)
+        .outerjoin(Task, (Task.id == TaskOccurrence.task_id) & (Task.user_id == rule.user_id))
+        .where(TaskOccurrence.recurrence_id == rule.id, TaskOccurrence.occurs_at == moment)
+    ).first()
+    if existing is not None and existing[1] is not None:
+        task, created = existing[1], False
+        before = completion_state(task)
+    else:
+        task = Task(
+            title=template.title,
+            description=template.description,
+            priority=template.priority,
+            category_id=template.category_id,
+            due_date=moment,
+            user_id=template.user_id
+        )
+        created = True
+        before = None
+
+    for name in OCCURRENCE_FIELDS:
+        if name in changes:
+            setattr(task, name, changes[name])
+    if task.status == 'completed' and not task.completed_at:
+        task.completed_at = utcnow()
+    elif task.status != 'completed':
+        task.completed_at = None
+    record_completion_change(template.user_id, before, completion_state(task))
+
+    if created:
+        occurrence = existing[0] if existing is not None else TaskOccurrence(
+            recurrence_id=rule.id, occurs_at=moment, user_id=template.user_id
+        )
+        occurrence.task = task
+        db.session.add(occurrence)
+    return task, created
+
+
+def skip_occurrence(rule, moment):
+    """Mark an occurrence as skipped, deleting the task stored for it; does not commit"""
+    occurrence = TaskOccurrence.query.filter_by(recurrence_id=rule.id, occurs_at=moment).first()
+    if occurrence is None:
+        db.session.add(TaskOccurrence(recurrence_id=rule.id, occurs_at=moment, user_id=rule.user_id))
+    elif occurrence.task_id is not None:
+        Task.query.filter_by(id=occurrence.task_id, user_id=rule.user_id).delete(synchronize_session=False)
+        occurrence.task_id = None
+
+
+def forget_tasks(task_ids):
+    """Drop what recurrences keep about tasks that are being deleted; three statements, no commit
+
+    Rules whose template is among ``task_ids`` go, with their stored
+    occurrences; occurrences stored as one of the tasks count as skipped
+    from now on. The foreign keys say as much, but SQLite does not
+    enforce them, and a new task reusing the id would inherit the rule.
+    """
+    if not task_ids:
+        return
+    rules = select(TaskRecurrence.id).where(TaskRecurrence.task_id.in_(task_ids))
+    db.session.execute(
+        delete(TaskOccurrence).where(TaskOccurrence.recurrence_id.in_(rules)).execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        delete(TaskRecurrence).where(TaskRecurrence.task_id.in_(task_ids)).execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        update(TaskOccurrence).where(TaskOccurrence.task_id.in_(task_ids)).values(task_id=None)
+        .execution_options(synchronize_session=False)
+    )
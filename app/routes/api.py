@@ -1,19 +1,57 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, abort, current_app, request, jsonify, url_for
 from flask_login import login_required, current_user
 from app.extensions import db
-from app.models import Task, TaskCategory
-from datetime import datetime
+from app.query_budget import query_budget
+from app.models import (Job, Tag, Task, TaskCategory, TaskOccurrence, TaskRecurrence, TaskTag, TASK_SORTS,
+                        task_order_by)
+from app.analytics import completion_report, completion_state, record_completion_change
+from app.archive import restore_task, tasks_with_archive
+from app.categories import reassign_tasks
+from app.deletion import detach_deleted_tasks
+from app.hierarchy import HierarchyError, add_subtask, ancestors, move_subtree, progress, subtree
+from app.idempotency import idempotent
+from app.jobs import clear_completed_now_or_later
+from app.ranking import next_tasks
+from app.tags import parse_tag_names, set_task_tags, tagged_task_ids, task_tag_names
+from app.recurrence import (MAX_WINDOW_DAYS, list_occurrences, occurrence_on, set_recurrence, skip_occurrence,
+                            touch_occurrence)
+from app.timeline import BUCKET_DAYS, MAX_RANGE_DAYS, decode_cursor, due_date_counts, tasks_due_between
+from app.timeutils import utcnow
+from datetime import datetime, time, timedelta
 import json
 
 api_bp = Blueprint('api', __name__)
 
 @api_bp.route('/tasks', methods=['GET'])
+@query_budget(2)
 @login_required
 def get_tasks():
     """Get all tasks for the current user"""
     status_filter = request.args.get('status')
     priority_filter = request.args.get('priority')
     category_filter = request.args.get('category_id')
+    include_archived = request.args.get('include_archived') in ('1', 'true')
+    sort = request.args.get('sort', 'created_at')
+    match = request.args.get('match', 'all')
+    
+    if sort not in TASK_SORTS:
+        return jsonify({'error': f"Invalid sort, use one of: {', '.join(TASK_SORTS)}"}), 400
+    if match not in ('all', 'any'):
+        return jsonify({'error': 'match must be all or any'}), 400
+    try:
+        tag_names = parse_tag_names(request.args.get('tags', '').split(','))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Unknown values cannot be encoded for the integer columns and match nothing
+    if (status_filter and status_filter not in Task.STATUS_CHOICES) or \
+            (priority_filter and priority_filter not in Task.PRIORITY_CHOICES):
+        return jsonify([])
+    
+    # Archived tasks carry no tags, so a tag filter only ever matches live tasks
+    if include_archived and not tag_names:
+        filters = {'status': status_filter, 'priority': priority_filter, 'category_id': category_filter}
+        return jsonify(tasks_with_archive(current_user.id, sort=sort, **{k: v for k, v in filters.items() if v}))
     
     query = Task.query.filter_by(user_id=current_user.id)
     
@@ -23,11 +61,32 @@ def get_tasks():
         query = query.filter_by(priority=priority_filter)
     if category_filter:
         query = query.filter_by(category_id=category_filter)
+    if tag_names:
+        tagged = tagged_task_ids(current_user.id, tag_names, match)
+        query = query.join(tagged, tagged.c.task_id == Task.id)
     
-    tasks = query.order_by(Task.created_at.desc()).all()
+    tasks = query.order_by(*task_order_by(sort, Task.__table__.c)).all()
     return jsonify([task.to_dict() for task in tasks])
 
+@api_bp.route('/tasks/next', methods=['GET'])
+@query_budget(2)
+@login_required
+def get_next_tasks():
+    """Get the top open tasks ranked by priority, due date and age"""
+    max_limit = current_app.config['NEXT_TASKS_MAX_LIMIT']
+    limit = request.args.get('limit', 10, type=int)
+    if limit is None or not 1 <= limit <= max_limit:
+        return jsonify({'error': f'limit must be between 1 and {max_limit}'}), 400
+    
+    weights = {
+        'priority': current_app.config['NEXT_TASKS_PRIORITY_WEIGHT'],
+        'due': current_app.config['NEXT_TASKS_DUE_WEIGHT'],
+        'age': current_app.config['NEXT_TASKS_AGE_WEIGHT'],
+    }
+    return jsonify(next_tasks(current_user.id, limit, weights))
+
 @api_bp.route('/tasks/<int:task_id>', methods=['GET'])
+@query_budget(2)
 @login_required
 def get_task(task_id):
     """Get a specific task"""
@@ -35,7 +94,9 @@ def get_task(task_id):
     return jsonify(task.to_dict())
 
 @api_bp.route('/tasks', methods=['POST'])
+@query_budget(7)
 @login_required
+@idempotent
 def create_task():
     """Create a new task"""
     data = request.get_json()
@@ -43,6 +104,9 @@ def create_task():
     if not data or 'title' not in data:
         return jsonify({'error': 'Title is required'}), 400
     
+    if data.get('priority', 'medium') not in Task.PRIORITY_CHOICES:
+        return jsonify({'error': 'Invalid priority'}), 400
+    
     # Parse due date
     due_date = None
     if data.get('due_date'):
@@ -65,8 +129,16 @@ def create_task():
         if category:
             new_task.category = category
     
+    # Optional parent, making the new task a subtask
+    parent_id = data.get('parent_id')
+    if parent_id and not Task.query.filter_by(id=parent_id, user_id=current_user.id).first():
+        return jsonify({'error': 'Parent task not found'}), 400
+    
     try:
         db.session.add(new_task)
+        if parent_id:
+            db.session.flush()
+            add_subtask(current_user.id, parent_id, new_task.id)
         db.session.commit()
         return jsonify(new_task.to_dict()), 201
     except Exception as e:
@@ -74,6 +146,7 @@ def create_task():
         return jsonify({'error': 'Failed to create task'}), 500
 
 @api_bp.route('/tasks/<int:task_id>', methods=['PUT'])
+@query_budget(5)
 @login_required
 def update_task(task_id):
     """Update a task"""
@@ -83,6 +156,8 @@ def update_task(task_id):
     if not data:
         return jsonify({'error': 'No data provided'}), 400
     
+    before = completion_state(task)
+    
     # Update fields
     if 'title' in data:
         task.title = data['title']
@@ -93,7 +168,7 @@ def update_task(task_id):
     if 'status' in data and data['status'] in Task.STATUS_CHOICES:
         task.status = data['status']
         if data['status'] == 'completed' and not task.completed_at:
-            task.completed_at = datetime.utcnow()
+            task.completed_at = utcnow()
         elif data['status'] != 'completed':
             task.completed_at = None
     
@@ -117,6 +192,7 @@ def update_task(task_id):
             task.category = None
     
     try:
+        record_completion_change(current_user.id, before, completion_state(task))
         db.session.commit()
         return jsonify(task.to_dict())
     except Exception as e:
@@ -124,12 +200,14 @@ def update_task(task_id):
         return jsonify({'error': 'Failed to update task'}), 500
 
 @api_bp.route('/tasks/<int:task_id>', methods=['DELETE'])
+@query_budget(8)
 @login_required
 def delete_task(task_id):
     """Delete a task"""
     task = Task.query.filter_by(id=task_id, user_id=current_user.id).first_or_404()
     
     try:
+        detach_deleted_tasks([task.id])  # Its subtasks become top-level tasks
         db.session.delete(task)
         db.session.commit()
         return jsonify({'message': 'Task deleted successfully'})
@@ -137,43 +215,356 @@ def delete_task(task_id):
         db.session.rollback()
         return jsonify({'error': 'Failed to delete task'}), 500
 
+@api_bp.route('/tasks/clear-completed', methods=['POST'])
+@query_budget(9)
+@login_required
+def clear_completed_tasks():
+    """Delete all completed tasks, inline (200) up to JOB_INLINE_LIMIT, otherwise in a background job (202)"""
+    try:
+        count, job = clear_completed_now_or_later(current_user.id)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to clear completed tasks'}), 500
+    if job is None:
+        return jsonify({'deleted': count})
+    return jsonify(job.to_dict()), 202, {'Location': url_for('api.get_job', job_id=job.id)}
+
+@api_bp.route('/tasks/<int:task_id>/restore', methods=['POST'])
+@query_budget(11)
+@login_required
+def restore_archived_task(task_id):
+    """Move an archived task back to the active task list"""
+    try:
+        task = restore_task(current_user.id, task_id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to restore task'}), 500
+    
+    if task is None:
+        return jsonify({'error': 'Archived task not found'}), 404
+    return jsonify(task.to_dict())
+
 @api_bp.route('/tasks/<int:task_id>/toggle', methods=['POST'])
+@query_budget(5)
 @login_required
 def toggle_task_status(task_id):
     """Toggle task status"""
     task = Task.query.filter_by(id=task_id, user_id=current_user.id).first_or_404()
+    before = completion_state(task)
     
     # Cycle through statuses
     if task.status == 'pending':
         task.status = 'in_progress'
     elif task.status == 'in_progress':
         task.status = 'completed'
-        task.completed_at = datetime.utcnow()
+        task.completed_at = utcnow()
     else:
         task.status = 'pending'
         task.completed_at = None
     
     try:
+        record_completion_change(current_user.id, before, completion_state(task))
         db.session.commit()
         return jsonify(task.to_dict())
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to update task'}), 500
 
+@api_bp.route('/tasks/<int:task_id>/subtree', methods=['GET'])
+@query_budget(3)
+@login_required
+def get_task_subtree(task_id):
+    """Get a task with all of its nested subtasks and their progress"""
+    task = Task.query.filter_by(id=task_id, user_id=current_user.id).first_or_404()
+    return jsonify(subtree(current_user.id, task))
+
+@api_bp.route('/tasks/<int:task_id>/ancestors', methods=['GET'])
+@query_budget(3)
+@login_required
+def get_task_ancestors(task_id):
+    """Get the parent chain of a task, top-level task first"""
+    Task.query.filter_by(id=task_id, user_id=current_user.id).first_or_404()
+    return jsonify(ancestors(current_user.id, task_id))
+
+@api_bp.route('/tasks/<int:task_id>/progress', methods=['GET'])
+@query_budget(3)
+@login_required
+def get_task_progress(task_id):
+    """Get how many of a task's subtasks (at any depth) are completed"""
+    Task.query.filter_by(id=task_id, user_id=current_user.id).first_or_404()
+    return jsonify(progress(current_user.id, task_id))
+
+@api_bp.route('/tasks/<int:task_id>/parent', methods=['PUT'])
+@query_budget(6)
+@login_required
+def move_task(task_id):
+    """Move a task, with its subtasks, under another task (or to the top level with null)"""
+    Task.query.filter_by(id=task_id, user_id=current_user.id).first_or_404()
+    data = request.get_json()
+    
+    if not data or 'parent_id' not in data:
+        return jsonify({'error': 'parent_id is required'}), 400
+    parent_id = data['parent_id']
+    if parent_id is not None and not Task.query.filter_by(id=parent_id, user_id=current_user.id).first():
+        return jsonify({'error': 'Parent task not found'}), 400
+    
+    try:
+        move_subtree(current_user.id, task_id, parent_id)
+        db.session.commit()
+        return jsonify({'message': 'Task moved', 'parent_id': parent_id})
+    except HierarchyError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to move task'}), 500
+
+@api_bp.route('/tasks/<int:task_id>/tags', methods=['GET'])
+@query_budget(3)
+@login_required
+def get_task_tags(task_id):
+    """Get the tag names of a task"""
+    Task.query.filter_by(id=task_id, user_id=current_user.id).first_or_404()
+    return jsonify({'id': task_id, 'tags': task_tag_names(current_user.id, task_id)})
+
+@api_bp.route('/tasks/<int:task_id>/tags', methods=['PUT'])
+@query_budget(6)
+@login_required
+def set_tags(task_id):
+    """Replace the tags of a task (`{"tags": ["home", "urgent"]}`), creating new tags as needed"""
+    Task.query.filter_by(id=task_id, user_id=current_user.id).first_or_404()
+    data = request.get_json()
+    
+    if not data or not isinstance(data.get('tags'), list):
+        return jsonify({'error': 'tags must be a list of names'}), 400
+    try:
+        names = parse_tag_names(data['tags'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        set_task_tags(current_user.id, task_id, names)
+        db.session.commit()
+        return jsonify({'id': task_id, 'tags': sorted(names)})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to update tags'}), 500
+
+@api_bp.route('/tasks/<int:task_id>/recurrence', methods=['PUT'])
+@query_budget(5)
+@login_required
+def set_task_recurrence(task_id):
+    """Make a task repeat daily, weekly or monthly (every `interval` periods)"""
+    task = Task.query.filter_by(id=task_id, user_id=current_user.id).first_or_404()
+    data = request.get_json()
+    
+    if not data or data.get('frequency') not in TaskRecurrence.FREQUENCY_CHOICES:
+        return jsonify({'error': f"frequency must be one of: {', '.join(TaskRecurrence.FREQUENCY_CHOICES)}"}), 400
+    interval = data.get('interval', 1)
+    if not isinstance(interval, int) or interval < 1:
+        return jsonify({'error': 'interval must be a positive integer'}), 400
+    
+    until = None
+    if data.get('until'):
+        try:
+            until = datetime.strptime(data['until'], '%Y-%m-%d').replace(hour=23, minute=59, second=59)
+        except ValueError:
+            return jsonify({'error': 'Invalid until date format'}), 400
+    
+    try:
+        rule = set_recurrence(task, data['frequency'], interval, until)
+        db.session.commit()
+        return jsonify(rule.to_dict())
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to save recurrence'}), 500
+
+@api_bp.route('/tasks/<int:task_id>/recurrence', methods=['DELETE'])
+@query_budget(4)
+@login_required
+def delete_task_recurrence(task_id):
+    """Stop a task from repeating; occurrences already stored stay as normal tasks"""
+    rule = TaskRecurrence.query.filter_by(task_id=task_id, user_id=current_user.id).first_or_404()
+    
+    try:
+        TaskOccurrence.query.filter_by(recurrence_id=rule.id).delete(synchronize_session=False)
+        TaskRecurrence.query.filter_by(id=rule.id).delete(synchronize_session=False)
+        db.session.commit()
+        return jsonify({'message': 'Recurrence removed'})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to remove recurrence'}), 500
+
+@api_bp.route('/occurrences', methods=['GET'])
+@query_budget(3)
+@login_required
+def get_occurrences():
+    """Get occurrences of recurring tasks between ?from= and ?to= (YYYY-MM-DD, to exclusive)"""
+    try:
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d')
+        end = datetime.strptime(request.args['to'], '%Y-%m-%d')
+    except (KeyError, ValueError):
+        return jsonify({'error': 'from and to are required as YYYY-MM-DD'}), 400
+    if not start < end <= start + timedelta(days=MAX_WINDOW_DAYS):
+        return jsonify({'error': f'The window must cover 1 to {MAX_WINDOW_DAYS} days'}), 400
+    
+    return jsonify(list_occurrences(current_user.id, start, end))
+
+@api_bp.route('/recurrences/<int:recurrence_id>/occurrences/<day>', methods=['PUT'])
+@query_budget(7)
+@login_required
+def update_occurrence(recurrence_id, day):
+    """Complete or edit one occurrence, storing it as a task"""
+    rule, template = _recurrence_or_404(recurrence_id)
+    moment = _occurrence_or_404(rule, day)
+    data = request.get_json() or {}
+    
+    if 'priority' in data and data['priority'] not in Task.PRIORITY_CHOICES:
+        return jsonify({'error': 'Invalid priority'}), 400
+    if 'status' in data and data['status'] not in Task.STATUS_CHOICES:
+        return jsonify({'error': 'Invalid status'}), 400
+    
+    try:
+        task, created = touch_occurrence(rule, template, moment, data)
+        db.session.commit()
+        return jsonify(task.to_dict()), 201 if created else 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to update occurrence'}), 500
+
+@api_bp.route('/recurrences/<int:recurrence_id>/occurrences/<day>', methods=['DELETE'])
+@query_budget(5)
+@login_required
+def delete_occurrence(recurrence_id, day):
+    """Skip one occurrence of a recurring task"""
+    rule, template = _recurrence_or_404(recurrence_id)
+    moment = _occurrence_or_404(rule, day)
+    
+    try:
+        skip_occurrence(rule, moment)
+        db.session.commit()
+        return jsonify({'message': 'Occurrence skipped'})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to skip occurrence'}), 500
+
+def _recurrence_or_404(recurrence_id):
+    row = db.session.execute(
+        db.select(TaskRecurrence, Task)
+        .join(Task, (Task.id == TaskRecurrence.task_id) & (Task.user_id == current_user.id))
+        .where(TaskRecurrence.id == recurrence_id, TaskRecurrence.user_id == current_user.id)
+    ).first()
+    if row is None:
+        abort(404)
+    return row
+
+def _occurrence_or_404(rule, day):
+    try:
+        moment = occurrence_on(rule, datetime.strptime(day, '%Y-%m-%d').date())
+    except ValueError:
+        moment = None
+    if moment is None:
+        abort(404)
+    return moment
+
+@api_bp.route('/tags', methods=['GET'])
+@query_budget(2)
+@login_required
+def get_tags():
+    """Get all tags for the current user"""
+    tags = Tag.query.filter_by(user_id=current_user.id).order_by(Tag.name).all()
+    return jsonify([tag.to_dict() for tag in tags])
+
+@api_bp.route('/tags/<int:tag_id>', methods=['DELETE'])
+@query_budget(4)
+@login_required
+def delete_tag(tag_id):
+    """Delete a tag and remove it from every task"""
+    tag = Tag.query.filter_by(id=tag_id, user_id=current_user.id).first_or_404()
+    
+    try:
+        TaskTag.query.filter_by(user_id=current_user.id, tag_id=tag.id).delete(synchronize_session=False)
+        Tag.query.filter_by(id=tag.id).delete(synchronize_session=False)
+        db.session.commit()
+        return jsonify({'message': 'Tag deleted successfully'})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to delete tag'}), 500
+
+def _date_range():
+    """Parse ?from= and ?to= (dates, to exclusive); raises ValueError with a message"""
+    try:
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d').date()
+        end = datetime.strptime(request.args['to'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        raise ValueError('from and to are required as YYYY-MM-DD')
+    if not start < end <= start + timedelta(days=MAX_RANGE_DAYS):
+        raise ValueError(f'The range must cover 1 to {MAX_RANGE_DAYS} days')
+    return start, end
+
+@api_bp.route('/calendar', methods=['GET'])
+@query_budget(2)
+@login_required
+def get_calendar():
+    """Get the number of tasks due per day or week in a date range"""
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in BUCKET_DAYS:
+        return jsonify({'error': 'bucket must be day or week'}), 400
+    try:
+        start, end = _date_range()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'bucket': bucket,
+        'buckets': due_date_counts(current_user.id, start, end, bucket)
+    })
+
+@api_bp.route('/calendar/tasks', methods=['GET'])
+@query_budget(2)
+@login_required
+def get_calendar_tasks():
+    """Get the tasks due in a date range, one page at a time (pass back next_cursor as ?cursor=)"""
+    limit = request.args.get('limit', 50, type=int)
+    if limit is None or not 1 <= limit <= 200:
+        return jsonify({'error': 'limit must be between 1 and 200'}), 400
+    try:
+        start, end = _date_range()
+        after = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    tasks, next_cursor = tasks_due_between(
+        current_user.id, datetime.combine(start, time.min), datetime.combine(end, time.min), limit, after
+    )
+    return jsonify({'tasks': [task.to_dict() for task in tasks], 'next_cursor': next_cursor})
+
 @api_bp.route('/categories', methods=['GET'])
+@query_budget(2)
 @login_required
 def get_categories():
     """Get all categories for the current user"""
-    categories = TaskCategory.query.filter_by(user_id=current_user.id).all()
+    if request.args.get('with_counts') not in ('1', 'true'):
+        categories = TaskCategory.query.filter_by(user_id=current_user.id).all()
+        return jsonify([cat.to_dict() for cat in categories])
+    
+    # Open/completed counts for every category from one grouped query
+    open_count = db.func.sum(db.case((Task.status.in_(['pending', 'in_progress']), 1), else_=0))
+    completed_count = db.func.sum(db.case((Task.status == 'completed', 1), else_=0))
+    rows = db.session.query(TaskCategory, db.func.count(Task.id), open_count, completed_count).outerjoin(
+        Task, db.and_(Task.category_id == TaskCategory.id, Task.user_id == current_user.id)
+    ).filter(TaskCategory.user_id == current_user.id).group_by(TaskCategory.id).all()
+    
     return jsonify([{
-        'id': cat.id,
-        'name': cat.name,
-        'color': cat.color,
-        'created_at': cat.created_at.isoformat()
-    } for cat in categories])
+        **cat.to_dict(),
+        'task_counts': {'total': total, 'open': open_ or 0, 'completed': completed or 0}
+    } for cat, total, open_, completed in rows])
 
 @api_bp.route('/categories', methods=['POST'])
+@query_budget(6)
 @login_required
+@idempotent
 def create_category():
     """Create a new category"""
     data = request.get_json()
@@ -195,17 +586,71 @@ def create_category():
     try:
         db.session.add(new_category)
         db.session.commit()
-        return jsonify({
-            'id': new_category.id,
-            'name': new_category.name,
-            'color': new_category.color,
-            'created_at': new_category.created_at.isoformat()
-        }), 201
+        return jsonify(new_category.to_dict()), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to create category'}), 500
 
+@api_bp.route('/categories/<int:category_id>/merge', methods=['POST'])
+@query_budget(6)
+@login_required
+def merge_category(category_id):
+    """Move every task of a category into another one and delete it"""
+    source = TaskCategory.query.filter_by(id=category_id, user_id=current_user.id).first_or_404()
+    data = request.get_json()
+    
+    if not data or not data.get('into'):
+        return jsonify({'error': 'Target category (into) is required'}), 400
+    
+    target = TaskCategory.query.filter_by(id=data['into'], user_id=current_user.id).first()
+    if not target:
+        return jsonify({'error': 'Target category not found'}), 404
+    if target.id == source.id:
+        return jsonify({'error': 'Cannot merge a category into itself'}), 400
+    
+    try:
+        moved = reassign_tasks(current_user.id, target.id, from_category_id=source.id)
+        result = {**target.to_dict(), 'moved_tasks': moved}
+        # Bulk delete: the tasks were already moved, so skip loading source.tasks
+        TaskCategory.query.filter_by(id=source.id, user_id=current_user.id).delete(synchronize_session=False)
+        db.session.commit()
+        return jsonify(result)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to merge categories'}), 500
+
+@api_bp.route('/categories/reassign', methods=['POST'])
+@query_budget(4)
+@login_required
+def reassign_category():
+    """Move a set of tasks, or all tasks of one category, to another category"""
+    data = request.get_json()
+    
+    if not data or 'category_id' not in data:
+        return jsonify({'error': 'category_id is required (null to uncategorize)'}), 400
+    if 'task_ids' not in data and 'from_category_id' not in data:
+        return jsonify({'error': 'task_ids or from_category_id is required'}), 400
+    
+    target_id = data['category_id']
+    if target_id and not TaskCategory.query.filter_by(id=target_id, user_id=current_user.id).first():
+        return jsonify({'error': 'Category not found'}), 404
+    
+    task_ids = data.get('task_ids')
+    if task_ids is not None and not (isinstance(task_ids, list) and all(isinstance(i, int) for i in task_ids)):
+        return jsonify({'error': 'task_ids must be a list of task ids'}), 400
+    
+    try:
+        updated = reassign_tasks(current_user.id, target_id or None, task_ids=task_ids,
+                                 from_category_id=data.get('from_category_id'),
+                                 from_uncategorized='from_category_id' in data and data['from_category_id'] is None)
+        db.session.commit()
+        return jsonify({'updated': updated})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to reassign tasks'}), 500
+
 @api_bp.route('/stats', methods=['GET'])
+@query_budget(2)
 @login_required
 def get_stats():
     """Get task statistics for the current user"""
@@ -217,7 +662,7 @@ def get_stats():
     completed_tasks = len([t for t in tasks if t.status == 'completed'])
     
     # Overdue tasks
-    overdue_tasks = len([t for t in tasks if t.due_date and t.due_date < datetime.utcnow() and t.status != 'completed'])
+    overdue_tasks = len([t for t in tasks if t.due_date and t.due_date < utcnow() and t.status != 'completed'])
     
     # Priority distribution
     priority_stats = {}
@@ -232,3 +677,39 @@ def get_stats():
         'overdue_tasks': overdue_tasks,
         'priority_distribution': priority_stats
     })
+
+@api_bp.route('/analytics', methods=['GET'])
+@query_budget(2)
+@login_required
+def get_analytics():
+    """Get completions per day or week, average completion time and throughput by priority"""
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in BUCKET_DAYS:
+        return jsonify({'error': 'bucket must be day or week'}), 400
+    try:
+        start, end = _date_range()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'bucket': bucket,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        **completion_report(current_user.id, start, end, BUCKET_DAYS[bucket])
+    })
+
+@api_bp.route('/jobs', methods=['GET'])
+@query_budget(2)
+@login_required
+def get_jobs():
+    """Get the current user's most recent background jobs"""
+    jobs = Job.query.filter_by(user_id=current_user.id).order_by(Job.id.desc()).limit(20).all()
+    return jsonify([job.to_dict() for job in jobs])
+
+@api_bp.route('/jobs/<int:job_id>', methods=['GET'])
+@query_budget(2)
+@login_required
+def get_job(job_id):
+    """Get the status and result of a background job"""
+    job = Job.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    return jsonify(job.to_dict())
@@ -2,13 +2,16 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash
 from app.extensions import db
+from app.query_budget import query_budget
 from app.models import User
-from datetime import datetime
+from app.timeutils import utcnow
+from app.write_behind import buffer_changes, write_behind
 import re
 
 auth_bp = Blueprint('auth', __name__)
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
+@query_budget(3)
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('tasks.dashboard'))
@@ -30,8 +33,11 @@ def login():
                 return render_template('auth/login.html')
             
             login_user(user, remember=remember)
-            user.last_login = datetime.utcnow()
-            db.session.commit()
+            if write_behind() is not None:
+                buffer_changes(user, last_login=utcnow())
+            else:
+                user.last_login = utcnow()
+                db.session.commit()
             
             next_page = request.args.get('next')
             if not next_page or not next_page.startswith('/'):
@@ -45,6 +51,7 @@ def login():
     return render_template('auth/login.html')
 
 @auth_bp.route('/register', methods=['GET', 'POST'])
+@query_budget(3)
 def register():
     if current_user.is_authenticated:
         return redirect(url_for('tasks.dashboard'))
@@ -106,6 +113,7 @@ def register():
     return render_template('auth/register.html')
 
 @auth_bp.route('/logout')
+@query_budget(1)
 @login_required
 def logout():
     logout_user()
@@ -113,11 +121,13 @@ def logout():
     return redirect(url_for('auth.login'))
 
 @auth_bp.route('/profile')
+@query_budget(2)
 @login_required
 def profile():
     return render_template('auth/profile.html')
 
 @auth_bp.route('/change-password', methods=['GET', 'POST'])
+@query_budget(2)
 @login_required
 def change_password():
     if request.method == 'POST':
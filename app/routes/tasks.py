@@ -1,7 +1,13 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from app.extensions import db
+from app.query_budget import query_budget
 from app.models import Task, TaskCategory
+from app.analytics import completion_state, record_completion_change
+from app.categories import reassign_tasks
+from app.deletion import detach_deleted_tasks
+from app.jobs import clear_completed_now_or_later
+from app.timeutils import utcnow
 from datetime import datetime
 
 tasks_bp = Blueprint('tasks', __name__)
@@ -9,6 +15,7 @@ tasks_bp = Blueprint('tasks', __name__)
 # ---------------- DASHBOARD ----------------
 @tasks_bp.route('/')
 @tasks_bp.route('/dashboard')
+@query_budget(3)
 @login_required
 def dashboard():
     tasks = Task.query.filter_by(user_id=current_user.id).order_by(Task.created_at.desc()).all()
@@ -22,7 +29,7 @@ def dashboard():
     # Overdue tasks (naive UTC)
     overdue_tasks = [
         t for t in tasks
-        if t.due_date and t.due_date < datetime.utcnow() and t.status != 'completed'
+        if t.due_date and t.due_date < utcnow() and t.status != 'completed'
     ]
 
     categories = TaskCategory.query.filter_by(user_id=current_user.id).all()
@@ -36,11 +43,12 @@ def dashboard():
         in_progress_tasks=in_progress_tasks,
         completed_tasks=completed_tasks,
         overdue_tasks=overdue_tasks,
-        now=datetime.utcnow()
+        now=utcnow()
     )
 
 # ---------------- ADD TASK ----------------
 @tasks_bp.route('/add', methods=['POST'])
+@query_budget(3)
 @login_required
 def add_task():
     title = request.form.get('title')
@@ -92,12 +100,14 @@ def add_task():
 
 # ---------------- EDIT TASK ----------------
 @tasks_bp.route('/edit/<int:task_id>', methods=['GET', 'POST'])
+@query_budget(5)
 @login_required
 def edit_task(task_id):
     task = Task.query.filter_by(id=task_id, user_id=current_user.id).first_or_404()
     categories = TaskCategory.query.filter_by(user_id=current_user.id).all()
 
     if request.method == 'POST':
+        before = completion_state(task)
         title = request.form.get('title')
         description = request.form.get('description')
         priority = request.form.get('priority')
@@ -120,6 +130,8 @@ def edit_task(task_id):
             task.due_date = None
 
         try:
+            # A completed task changing priority moves between rollup rows
+            record_completion_change(current_user.id, before, completion_state(task))
             db.session.commit()
             flash('Task updated successfully', 'success')
             return redirect(url_for('tasks.dashboard'))
@@ -132,16 +144,18 @@ def edit_task(task_id):
     task=task,
     categories=categories,
     due_date_str=task.due_date.strftime('%Y-%m-%dT%H:%M') if task.due_date else '',
-    now=datetime.utcnow()  # pass 'now' for template comparisons
+    now=utcnow()  # pass 'now' for template comparisons
 )
 
 # ---------------- DELETE TASK ----------------
 @tasks_bp.route('/delete/<int:task_id>', methods=['POST'])
+@query_budget(8)
 @login_required
 def delete_task(task_id):
     task = Task.query.filter_by(id=task_id, user_id=current_user.id).first_or_404()
 
     try:
+        detach_deleted_tasks([task.id])  # Its subtasks become top-level tasks
         db.session.delete(task)
         db.session.commit()
         flash('Task deleted successfully', 'success')
@@ -153,20 +167,23 @@ def delete_task(task_id):
 
 # ---------------- TOGGLE TASK STATUS ----------------
 @tasks_bp.route('/toggle/<int:task_id>', methods=['POST'])
+@query_budget(5)
 @login_required
 def toggle_task(task_id):
     task = Task.query.filter_by(id=task_id, user_id=current_user.id).first_or_404()
+    before = completion_state(task)
 
     if task.status == 'pending':
         task.status = 'in_progress'
     elif task.status == 'in_progress':
         task.status = 'completed'
-        task.completed_at = datetime.utcnow()
+        task.completed_at = utcnow()
     else:
         task.status = 'pending'
         task.completed_at = None
 
     try:
+        record_completion_change(current_user.id, before, completion_state(task))
         db.session.commit()
         flash(f'Task status changed to {task.status}', 'success')
     except Exception:
@@ -177,15 +194,15 @@ def toggle_task(task_id):
 
 # ---------------- CLEAR COMPLETED TASKS ----------------
 @tasks_bp.route('/clear-completed', methods=['POST'])
+@query_budget(9)
 @login_required
 def clear_completed():
-    completed_tasks = Task.query.filter_by(user_id=current_user.id, status='completed').all()
-
     try:
-        for task in completed_tasks:
-            db.session.delete(task)
-        db.session.commit()
-        flash(f'{len(completed_tasks)} completed tasks cleared', 'success')
+        count, job = clear_completed_now_or_later(current_user.id)
+        if job is not None:
+            flash(f'Clearing {count} completed tasks in the background', 'info')
+        else:
+            flash(f'{count} completed tasks cleared', 'success')
     except Exception:
         db.session.rollback()
         flash('An error occurred while clearing tasks', 'danger')
@@ -194,6 +211,7 @@ def clear_completed():
 
 # ---------------- ADD CATEGORY ----------------
 @tasks_bp.route('/category/add', methods=['POST'])
+@query_budget(3)
 @login_required
 def add_category():
     name = request.form.get('name')
@@ -222,15 +240,13 @@ def add_category():
 
 # ---------------- DELETE CATEGORY ----------------
 @tasks_bp.route('/category/delete/<int:category_id>', methods=['POST'])
+@query_budget(6)
 @login_required
 def delete_category(category_id):
     category = TaskCategory.query.filter_by(id=category_id, user_id=current_user.id).first_or_404()
 
-    tasks_with_category = Task.query.filter_by(category_id=category_id).all()
-    for task in tasks_with_category:
-        task.category = None
-
     try:
+        reassign_tasks(current_user.id, None, from_category_id=category_id)
         db.session.delete(category)
         db.session.commit()
         flash('Category deleted successfully', 'success')
@@ -0,0 +1,391 @@
+import bisect
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import sqlalchemy as sa
+from flask import current_app, g, has_request_context, jsonify, request
+from flask_login import current_user
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.util import find_tables
+from werkzeug.exceptions import ServiceUnavailable
+
+# Users whose data lives in the default database (e.g. accounts created before sharding)
+DEFAULT_SHARD = 'default'
+
+# Seconds move_user waits after fencing a user, for writes already past the check to finish
+MOVE_SETTLE_SECONDS = 5
+# Retry-After sent with writes rejected during a move
+MOVE_RETRY_AFTER = 30
+# Blueprints whose writes touch per-user tables
+FENCED_BLUEPRINTS = ('api', 'tasks')
+
+_shard_override = ContextVar('shard_override', default=None)
+# Guards each app's cached blocks of reserved ids
+_id_lock = threading.Lock()
+
+
+class UserMoving(Exception):
+    """Raised on writes for a user whose data is being moved to another shard"""
+
+
+class ShardRing:
+    """Consistent-hash ring mapping keys onto shard names
+
+    Each shard is placed on the ring ``replicas`` times so that adding a
+    shard only takes over a proportional slice of new assignments.
+    """
+
+    def __init__(self, shards, replicas=64):
+        self._points = sorted(
+            (self._hash(f'{shard}#{n}'), shard) for shard in shards for n in range(replicas)
+        )
+        self._hashes = [point for point, _ in self._points]
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+    def shard_for(self, key):
+        if not self._points:
+            return DEFAULT_SHARD
+        index = bisect.bisect(self._hashes, self._hash(str(key))) % len(self._points)
+        return self._points[index][1]
+
+
+def is_sharded_table(table):
+    return isinstance(table, sa.Table) and table.info.get('sharded', False)
+
+
+def _is_sharded(mapper, clause):
+    if mapper is not None:
+        return is_sharded_table(sa.inspect(mapper).local_table)
+    if clause is not None:
+        return any(is_sharded_table(table) for table in find_tables(clause, include_crud=True))
+    return False
+
+
+class RoutingSession(Session):
+    """Session that sends statements on per-user tables to the current user's shard
+
+    Tables are per-user when created with ``info={'sharded': True}``.
+    Everything else, and everything when no shards are configured, goes
+    through the normal Flask-SQLAlchemy bind selection.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and current_app.config.get('SHARD_KEYS') and _is_sharded(mapper, clause):
+            shard = current_shard()
+            if shard is not None:
+                return engine_for(shard)
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def sharded_tables():
+    from app.extensions import db
+
+    return [table for table in db.metadata.sorted_tables if is_sharded_table(table)]
+
+
+def is_centrally_numbered(table):
+    """True for per-user tables whose ids are referred to, so they must stay unique across shards"""
+    if not is_sharded_table(table) or table.info.get('local_ids') or len(table.primary_key.columns) != 1:
+        return False
+    key = table.primary_key.columns[0]
+    return key.autoincrement in ('auto', True) and isinstance(key.type, sa.Integer)
+
+
+def _highest_id(table_name):
+    """Highest id of a table on any shard, including copies of it kept in other tables"""
+    columns = []
+    for table in sharded_tables():
+        if table.name == table_name:
+            columns.append(table.primary_key.columns[0])
+        columns.extend(column for column in table.columns if column.info.get('id_of') == table_name)
+    highest = 0
+    for shard in all_shards():
+        with engine_for(shard).connect() as conn:
+            for column in columns:
+                highest = max(highest, conn.execute(sa.select(sa.func.max(column))).scalar() or 0)
+    return highest
+
+
+def reserve_ids(table_name, count):
+    """Reserve ``count`` consecutive ids of a per-user table for this process; returns the first
+
+    The range is taken from id_allocator in the default database, in a
+    transaction of its own, so no other shard or process ever gets the
+    same ids. The first reservation of a table starts past every id
+    already stored on any shard.
+    """
+    from app.models import IdAllocator
+
+    engine = engine_for(DEFAULT_SHARD)
+    entry = IdAllocator.table_name == table_name
+    while True:
+        with engine.begin() as conn:
+            if conn.execute(sa.update(IdAllocator).where(entry).values(next_id=IdAllocator.next_id + count)).rowcount:
+                return conn.execute(sa.select(IdAllocator.next_id).where(entry)).scalar() - count
+        try:
+            with engine.begin() as conn:
+                conn.execute(sa.insert(IdAllocator).values(table_name=table_name, next_id=_highest_id(table_name) + 1))
+        except sa.exc.IntegrityError:
+            pass  # Another process started the range first
+
+
+def next_id(table_name):
+    """A new id of a per-user table, unique across shards, from a block reserved by this process"""
+    with _id_lock:
+        blocks = current_app.extensions.setdefault('shard_id_blocks', {})
+        start, end = blocks.get(table_name, (0, 0))
+        if start >= end:
+            size = current_app.config['SHARD_ID_BLOCK_SIZE']
+            start = reserve_ids(table_name, size)
+            end = start + size
+        blocks[table_name] = (start + 1, end)
+        return start
+
+
+def _assign_id(mapper, connection, target):
+    if not current_app.config.get('SHARD_KEYS') or not is_centrally_numbered(mapper.local_table):
+        return
+    key = mapper.get_property_by_column(mapper.local_table.primary_key.columns[0]).key
+    if getattr(target, key) is None:
+        setattr(target, key, next_id(mapper.local_table.name))
+
+
+def shard_metadata():
+    """Copy of the per-user tables without foreign keys to tables that only exist in the default database"""
+    metadata = sa.MetaData()
+    tables = sharded_tables()
+    names = {table.name for table in tables}
+    for table in tables:
+        copy = table.to_metadata(metadata)
+        for constraint in list(copy.foreign_key_constraints):
+            if constraint.elements[0].target_fullname.split('.')[0] in names:
+                continue
+            copy.constraints.discard(constraint)
+            for fk in constraint.elements:
+                fk.parent.foreign_keys.discard(fk)
+                copy.foreign_keys.discard(fk)
+    return metadata
+
+
+def all_shards():
+    return [DEFAULT_SHARD] + list(current_app.config['SHARD_KEYS'])
+
+
+def engine_for(shard):
+    from app.extensions import db
+
+    return db.engines[None if shard == DEFAULT_SHARD else shard]
+
+
+def _ring():
+    ring = current_app.extensions.get('shard_ring')
+    if ring is None:
+        ring = ShardRing(current_app.config['SHARD_KEYS'], current_app.config['SHARD_VIRTUAL_NODES'])
+        current_app.extensions['shard_ring'] = ring
+    return ring
+
+
+@contextmanager
+def use_shard(shard):
+    """Route per-user tables to ``shard`` inside the block (CLI jobs, scripts)"""
+    token = _shard_override.set(shard)
+    try:
+        yield
+    finally:
+        _shard_override.reset(token)
+
+
+def current_shard():
+    """Shard for the statement being executed, or None to use the default bind"""
+    override = _shard_override.get()
+    if override is not None:
+        return override
+    if not has_request_context():
+        return None
+    if 'shard' not in g:
+        g.shard, g.shard_moving = _directory_entry(current_user.id) if current_user.is_authenticated else (None, False)
+    return g.shard
+
+
+def _directory_entry(user_id):
+    """(shard, moving) of a user, assigning a shard on first use
+
+    Reads and writes go through their own connection so that they never
+    join (or wait on) the transaction of the session that triggered them.
+    """
+    from app.models import UserShard
+
+    if not current_app.config.get('SHARD_KEYS'):
+        return DEFAULT_SHARD, False
+
+    engine = engine_for(DEFAULT_SHARD)
+    lookup = sa.select(UserShard.shard, UserShard.moving).where(UserShard.user_id == user_id)
+    with engine.connect() as conn:
+        entry = conn.execute(lookup).first()
+    if entry is not None:
+        return tuple(entry)
+
+    shard = _ring().shard_for(user_id)
+    try:
+        with engine.begin() as conn:
+            conn.execute(sa.insert(UserShard).values(user_id=user_id, shard=shard))
+    except sa.exc.IntegrityError:
+        # Another request assigned the user first
+        with engine.connect() as conn:
+            return tuple(conn.execute(lookup).first())
+    return shard, False
+
+
+def shard_for_user(user_id, for_write=False):
+    """Look up the user's shard in the directory, assigning one on first use
+
+    With ``for_write``, raises UserMoving while the user's data is being
+    moved to another shard.
+    """
+    shard, moving = _directory_entry(user_id)
+    if moving and for_write:
+        raise UserMoving(user_id)
+    return shard
+
+
+def init_sharding(app):
+    """Number new per-user rows from the shared id range, and reject writes (503)
+    from users whose data is being moved to another shard
+
+    The write fence costs no extra query: the directory lookup is the one
+    routing needs anyway.
+    """
+    from app.extensions import db
+
+    if not app.config['SHARD_KEYS']:
+        return
+    if not sa.event.contains(db.Model, 'before_insert', _assign_id):
+        sa.event.listen(db.Model, 'before_insert', _assign_id, propagate=True)
+
+    @app.before_request
+    def fence_moving_users():
+        if request.method in ('GET', 'HEAD', 'OPTIONS') or request.blueprint not in FENCED_BLUEPRINTS:
+            return None
+        if not current_user.is_authenticated:
+            return None
+        current_shard()
+        if not g.shard_moving:
+            return None
+        message = 'Your data is being moved, please try again shortly'
+        if request.blueprint == 'api':
+            return jsonify({'error': message}), 503, {'Retry-After': str(MOVE_RETRY_AFTER)}
+        raise ServiceUnavailable(message, retry_after=MOVE_RETRY_AFTER)
+
+
+def each_shard():
+    """Yield every shard name with routing pinned to it, for cross-user jobs"""
+    from app.extensions import db
+
+    for shard in all_shards():
+        with use_shard(shard):
+            yield shard
+            db.session.commit()
+            db.session.expunge_all()
+
+
+def create_shard_tables():
+    """Create per-user tables (and missing indexes) on every configured shard"""
+    metadata = shard_metadata()
+    for shard in current_app.config['SHARD_KEYS']:
+        engine = engine_for(shard)
+        metadata.create_all(bind=engine)
+        for table in metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+
+
+def pin_existing_users(shard=DEFAULT_SHARD):
+    """Record every user without a directory entry as living on ``shard``"""
+    from app.models import User, UserShard
+
+    engine = engine_for(DEFAULT_SHARD)
+    with engine.begin() as conn:
+        unassigned = sa.select(User.id, sa.literal(shard)).where(
+            ~sa.exists().where(UserShard.user_id == User.id)
+        )
+        result = conn.execute(sa.insert(UserShard).from_select(['user_id', 'shard'], unassigned))
+    return result.rowcount
+
+
+def _set_moving(user_id, moving):
+    from app.models import UserShard
+
+    with engine_for(DEFAULT_SHARD).begin() as conn:
+        conn.execute(sa.update(UserShard).where(UserShard.user_id == user_id).values(moving=moving))
+
+
+def _copy_user(user_id, source, target):
+    """Copy every per-user row of a user from ``source`` to ``target``
+
+    Rows keep their primary keys, which are unique across shards (see
+    reserve_ids), except in tables with shard-local ids: the target
+    numbers those rows afresh.
+    """
+    tables = sharded_tables()
+    copied = 0
+    with engine_for(source).connect() as src, engine_for(target).begin() as dst:
+        for table in reversed(tables):
+            dst.execute(table.delete().where(table.c.user_id == user_id))
+
+        for table in tables:
+            rows = src.execute(table.select().where(table.c.user_id == user_id)).mappings().all()
+            if not rows:
+                continue
+            local_key = table.primary_key.columns[0].name if table.info.get('local_ids') else None
+            try:
+                dst.execute(table.insert(), [
+                    {name: value for name, value in row.items() if name != local_key} for row in rows
+                ])
+            except sa.exc.IntegrityError:
+                raise ValueError(f'Some {table.name} ids of this user are already used on {target}') from None
+            copied += len(rows)
+    return copied
+
+
+def move_user(user_id, target, settle=MOVE_SETTLE_SECONDS):
+    """Copy a user's rows to ``target``, repoint the directory, then delete the originals
+
+    Rows keep their primary keys, so ids stored by clients stay valid;
+    ids come from one range shared by all shards, so they are free on
+    the target. While
+    the directory marks the user as moving, their writes are rejected
+    (see init_sharding); the copy starts ``settle`` seconds after that
+    flag is raised, so writes already under way can finish. Rows the
+    user may already have on the target (from an interrupted move) are
+    cleared first, so the command can safely be re-run.
+    """
+    from app.models import UserShard
+
+    source = shard_for_user(user_id)
+    if source == target:
+        return 0
+    if target not in all_shards():
+        raise ValueError(f'Unknown shard: {target}')
+
+    _set_moving(user_id, True)
+    try:
+        time.sleep(settle)
+        moved = _copy_user(user_id, source, target)
+        with engine_for(DEFAULT_SHARD).begin() as conn:
+            conn.execute(
+                sa.update(UserShard).where(UserShard.user_id == user_id).values(shard=target, moving=False)
+            )
+    except BaseException:
+        _set_moving(user_id, False)
+        raise
+
+    with engine_for(source).begin() as src:
+        for table in reversed(sharded_tables()):
+            src.execute(table.delete().where(table.c.user_id == user_id))
+    return moved
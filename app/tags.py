@@ -0,0 +1,80 @@
+from sqlalchemy import delete, insert, intersect, select, union
+
+from app.extensions import db
+from app.models import Tag, TaskTag
+
+MAX_TAG_LENGTH = 50
+
+
+def parse_tag_names(values):
+    """Normalize tag names: trimmed, lower-case, without blanks or duplicates
+
+    Raises ValueError for values that are not strings and for names
+    longer than MAX_TAG_LENGTH.
+    """
+    names = []
+    for value in values:
+        if not isinstance(value, str):
+            raise ValueError('Tag names must be strings')
+        name = value.strip().lower()
+        if len(name) > MAX_TAG_LENGTH:
+            raise ValueError(f'Tag names are limited to {MAX_TAG_LENGTH} characters')
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def _postings(user_id, name):
+    # Resolves the tag inline, so the posting scan is a range on (user_id, tag_id)
+    tag_id = select(Tag.id).where(Tag.user_id == user_id, Tag.name == name).scalar_subquery()
+    return select(TaskTag.task_id).where(TaskTag.user_id == user_id, TaskTag.tag_id == tag_id)
+
+
+def tagged_task_ids(user_id, names, match='all'):
+    """Subquery of the ids of tasks carrying all (INTERSECT) or any (UNION) of the tags
+
+    Join it to Task rather than using IN: the planner then starts from
+    the (short) posting lists and looks tasks up by primary key, instead
+    of walking every task of the user.
+    """
+    postings = [_postings(user_id, name) for name in names]
+    if len(postings) == 1:
+        return postings[0].subquery()
+    return (intersect(*postings) if match == 'all' else union(*postings)).subquery()
+
+
+def task_tag_names(user_id, task_id):
+    return db.session.execute(
+        select(Tag.name)
+        .join(TaskTag, TaskTag.tag_id == Tag.id)
+        .where(TaskTag.user_id == user_id, TaskTag.task_id == task_id)
+        .order_by(Tag.name)
+    ).scalars().all()
+
+
+def set_task_tags(user_id, task_id, names):
+    """Replace the tags of a task, creating tags that do not exist yet; does not commit"""
+    tags = {tag.name: tag for tag in Tag.query.filter(Tag.user_id == user_id, Tag.name.in_(names))} if names else {}
+    missing = [Tag(user_id=user_id, name=name) for name in names if name not in tags]
+    if missing:
+        db.session.add_all(missing)
+        db.session.flush()
+        tags.update((tag.name, tag) for tag in missing)
+
+    db.session.execute(
+        delete(TaskTag)
+        .where(TaskTag.user_id == user_id, TaskTag.task_id == task_id)
+        .execution_options(synchronize_session=False)
+    )
+    if names:
+        db.session.execute(insert(TaskTag), [
+            {'user_id': user_id, 'tag_id': tags[name].id, 'task_id': task_id} for name in names
+        ])
+
+
+def untag_tasks(task_ids):
+    """Remove the postings of deleted or archived tasks; one statement, no commit"""
+    if task_ids:
+        db.session.execute(
+            delete(TaskTag).where(TaskTag.task_id.in_(task_ids)).execution_options(synchronize_session=False)
+        )
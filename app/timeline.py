@@ -0,0 +1,78 @@
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import case, func, select, tuple_
+
+from app.extensions import db
+from app.models import Task
+
+# Longest range /api/calendar accepts, in days
+MAX_RANGE_DAYS = 366
+
+BUCKET_DAYS = {'day': 1, 'week': 7}
+
+
+def bucket_starts(start_day, end_day, bucket):
+    """Local start date of every bucket in [start_day, end_day); weeks start on start_day"""
+    step = timedelta(days=BUCKET_DAYS[bucket])
+    days = []
+    day = start_day
+    while day < end_day:
+        days.append(day)
+        day += step
+    return days
+
+
+def due_date_counts(user_id, start_day, end_day, bucket):
+    """Number of tasks (and completed tasks) due in each bucket, from one grouped query
+
+    Due dates are stored as the wall-clock date (and time) the user
+    entered, so a task belongs to the day written in its due_date and
+    bucket edges are plain midnights, not converted to any zone. The
+    query itself is a range scan on (user_id, due_date).
+    """
+    days = bucket_starts(start_day, end_day, bucket)
+    edges = [datetime.combine(day, time.min) for day in days + [end_day]]
+
+    # The WHERE clause bounds due_date, so the first edge it is below names its bucket
+    index = case(*[(Task.due_date < edge, n) for n, edge in enumerate(edges[1:])]).label('bucket')
+    rows = db.session.execute(
+        select(index, func.count(), func.sum(case((Task.status == 'completed', 1), else_=0)))
+        .where(Task.user_id == user_id, Task.due_date >= edges[0], Task.due_date < edges[-1])
+        .group_by(index)
+    ).all()
+    counts = {n: (total, completed) for n, total, completed in rows}
+
+    return [
+        {'start': day.isoformat(), 'count': counts.get(n, (0, 0))[0], 'completed': counts.get(n, (0, 0))[1] or 0}
+        for n, day in enumerate(days)
+    ]
+
+
+def encode_cursor(task):
+    return f'{task.due_date.isoformat()}_{task.id}'
+
+
+def decode_cursor(cursor):
+    """(due_date, id) of the last task on the previous page; raises ValueError if malformed"""
+    due_date, _, task_id = cursor.rpartition('_')
+    try:
+        return datetime.fromisoformat(due_date), int(task_id)
+    except ValueError:
+        raise ValueError('Invalid cursor') from None
+
+
+def tasks_due_between(user_id, start, end, limit, after=None):
+    """One page of tasks due in [start, end) (naive wall-clock datetimes), ordered by due date
+
+    Keyset pagination: ``after`` is the decoded cursor of the previous
+    page and the page continues past that (due_date, id), so deep pages
+    cost the same as the first. Returns (tasks, next_cursor).
+    """
+    query = Task.query.filter(Task.user_id == user_id, Task.due_date >= start, Task.due_date < end)
+    if after is not None:
+        query = query.filter(tuple_(Task.due_date, Task.id) > tuple_(*after))
+    tasks = query.order_by(Task.due_date, Task.id).limit(limit + 1).all()
+
+    if len(tasks) > limit:
+        return tasks[:limit], encode_cursor(tasks[limit - 1])
+    return tasks, None
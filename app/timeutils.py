@@ -0,0 +1,12 @@
+from datetime import datetime, timezone
+
+
+def utcnow():
+    """Current UTC time as a naive datetime
+
+    Every timestamp column stores naive UTC, so this is the only form of
+    "now" that can be compared with loaded values or written to the database.
+    (due_date is the exception: it holds the user's wall-clock input.)
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
@@ -0,0 +1,127 @@
+import atexit
+import threading
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.extensions import db
+from app.sharding import current_shard, use_shard
+
+
+class WriteBehindBuffer:
+    """Coalesce small, frequent writes in memory and apply them in batched transactions
+
+    ``set`` records new column values for one row; later values for the
+    same row and column replace earlier ones. A background thread flushes
+    every ``interval`` seconds, or as soon as ``max_pending`` rows are
+    waiting, and once more at interpreter exit. Pending writes are lost if
+    the process is killed, and other processes never see them before the
+    flush, so only buffer columns nothing else reads or writes in the
+    meantime (last_login).
+    """
+
+    def __init__(self, app, interval, max_pending):
+        self.app = app
+        self.interval = interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._updates = {}  # (model, shard, pk) -> {column: value}
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    def set(self, model, pk, **values):
+        with self._lock:
+            self._updates.setdefault((model, _shard_for(model), pk), {}).update(values)
+            if self._thread is None:
+                # Started on the first write rather than with the app
+                self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._thread.start()
+            full = len(self._updates) >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Write everything buffered so far, one transaction per shard"""
+        with self._lock:
+            updates, self._updates = self._updates, {}
+
+        by_shard = defaultdict(dict)
+        for entry, values in updates.items():
+            by_shard[entry[1]][entry] = values
+
+        with self.app.app_context():
+            for shard, shard_updates in by_shard.items():
+                with use_shard(shard):
+                    try:
+                        _apply(db.session, shard_updates)
+                        db.session.commit()
+                    except Exception:
+                        db.session.rollback()
+                        self.app.logger.exception('Write-behind flush to shard %s failed, retrying later', shard)
+                        self._requeue(shard_updates)
+
+    def _requeue(self, updates):
+        with self._lock:
+            for entry, values in updates.items():
+                # Anything set since the failed flush is newer and wins
+                self._updates[entry] = {**values, **self._updates.get(entry, {})}
+
+    def close(self):
+        self._stopping = True
+        self._wake.set()  # Let the thread exit instead of waiting out its interval
+        self.flush()
+
+
+def _shard_for(model):
+    return current_shard() if model.__table__.info.get('sharded') else None
+
+
+def _apply(session, updates):
+    # One executemany UPDATE per model and set of changed columns
+    batches = defaultdict(list)
+    for (model, _, pk), values in updates.items():
+        batches[(model, tuple(sorted(values)))].append({'_pk': pk, **values})
+    for (model, columns), rows in batches.items():
+        table = model.__table__
+        pk_column = table.primary_key.columns[0]
+        statement = update(table).where(pk_column == bindparam('_pk', type_=pk_column.type)).values(
+            {table.c[name]: bindparam(name, type_=table.c[name].type) for name in columns}
+        )
+        session.execute(statement, rows, bind_arguments={'mapper': model})
+
+
+def write_behind():
+    """The app's write-behind buffer, or None when WRITE_BEHIND_ENABLED is off"""
+    return current_app.extensions.get('write_behind')
+
+
+def buffer_changes(instance, **values):
+    """Show new values on a loaded instance and leave writing them to the buffer"""
+    for name, value in values.items():
+        set_committed_value(instance, name, value)
+    write_behind().set(type(instance), instance.id, **values)
+
+
+def init_write_behind(app):
+    """Create the write-behind buffer when WRITE_BEHIND_ENABLED is set
+
+    The buffer lives in one process, so it is refused when the server is
+    configured to run several (WEB_CONCURRENCY).
+    """
+    if not app.config['WRITE_BEHIND_ENABLED']:
+        return
+    if app.config['WEB_CONCURRENCY'] > 1:
+        raise RuntimeError('WRITE_BEHIND_ENABLED requires a single server process (WEB_CONCURRENCY=1)')
+    buffer = WriteBehindBuffer(app, app.config['WRITE_BEHIND_INTERVAL'], app.config['WRITE_BEHIND_MAX_PENDING'])
+    app.extensions['write_behind'] = buffer
+    # Clean flush at shutdown (normal exit, SIGTERM handled by the server, Ctrl+C)
+    atexit.register(buffer.close)
@@ -11,6 +11,16 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///todo.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Sharding Configuration: per-user tables are spread over the comma-separated SHARD_DATABASE_URLS
+    SQLALCHEMY_BINDS = {
+        f'shard{n}': url.strip()
+        for n, url in enumerate(u for u in os.environ.get('SHARD_DATABASE_URLS', '').split(',') if u.strip())
+    }
+    SHARD_KEYS = list(SQLALCHEMY_BINDS)
+    SHARD_VIRTUAL_NODES = int(os.environ.get('SHARD_VIRTUAL_NODES', 64))
+    # Ids of per-user rows come from one range shared by all shards, reserved this many at a time
+    SHARD_ID_BLOCK_SIZE = int(os.environ.get('SHARD_ID_BLOCK_SIZE', 100))
+    
     # Security Configuration
     SESSION_COOKIE_SECURE = os.environ.get('FLASK_ENV') == 'production'
     SESSION_COOKIE_HTTPONLY = True
@@ -31,6 +41,51 @@ class Config:
     # API Configuration
     API_RATE_LIMIT = int(os.environ.get('API_RATE_LIMIT', 100))
     API_RATE_LIMIT_WINDOW = int(os.environ.get('API_RATE_LIMIT_WINDOW', 3600))
+    
+    # Profiling Configuration
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+    # Nobody may profile until usernames are listed explicitly
+    PROFILING_ADMINS = [name.strip() for name in os.environ.get('PROFILING_ADMINS', '').split(',') if name.strip()]
+    PROFILING_SAMPLE_INTERVAL = float(os.environ.get('PROFILING_SAMPLE_INTERVAL', 0.001))
+    PROFILING_OUTPUT_DIR = os.environ.get('PROFILING_OUTPUT_DIR')  # default: instance/profiles
+    
+    # Archive Configuration
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 90))
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500))
+    
+    # Idempotency-Key support on POST /api/tasks and /api/categories
+    IDEMPOTENCY_KEY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+    IDEMPOTENCY_PURGE_BATCH_SIZE = int(os.environ.get('IDEMPOTENCY_PURGE_BATCH_SIZE', 1000))
+    # A key still without a response after this many seconds was left by a crashed request and may be reused
+    IDEMPOTENCY_PENDING_GRACE_SECONDS = int(os.environ.get('IDEMPOTENCY_PENDING_GRACE_SECONDS', 60))
+    
+    # Write-behind buffer: coalesce last_login writes, flushed every INTERVAL seconds.
+    # Single-process only: refused when WEB_CONCURRENCY (the server's worker count) is above 1
+    WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+    WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', '').lower() in ('1', 'true', 'yes')
+    WRITE_BEHIND_INTERVAL = float(os.environ.get('WRITE_BEHIND_INTERVAL', 1.0))
+    WRITE_BEHIND_MAX_PENDING = int(os.environ.get('WRITE_BEHIND_MAX_PENDING', 1000))
+    
+    # Response compression (brotli needs the optional brotli package) and built static assets
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4))
+    ASSETS_MAX_AGE = int(os.environ.get('ASSETS_MAX_AGE', 365 * 24 * 3600))
+    
+    # Background jobs (`flask run-jobs`): retries back off as RETRY_DELAY * 2^(attempt - 1) seconds
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+    JOB_RETRY_DELAY = int(os.environ.get('JOB_RETRY_DELAY', 30))
+    JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT', 3600))
+    JOB_INLINE_LIMIT = int(os.environ.get('JOB_INLINE_LIMIT', 500))
+    
+    # Ranking of /api/tasks/next: score = priority band * PRIORITY + DUE / (1 + days until due) + AGE * age in days
+    NEXT_TASKS_PRIORITY_WEIGHT = float(os.environ.get('NEXT_TASKS_PRIORITY_WEIGHT', 10))
+    NEXT_TASKS_DUE_WEIGHT = float(os.environ.get('NEXT_TASKS_DUE_WEIGHT', 8))
+    NEXT_TASKS_AGE_WEIGHT = float(os.environ.get('NEXT_TASKS_AGE_WEIGHT', 0.02))
+    NEXT_TASKS_MAX_LIMIT = int(os.environ.get('NEXT_TASKS_MAX_LIMIT', 50))
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -49,13 +104,15 @@ class ProductionConfig(Config):
     
     # Use environment variables for sensitive data
     SECRET_KEY = os.environ.get('SECRET_KEY')
-    if not SECRET_KEY:
+    if not SECRET_KEY and os.environ.get('FLASK_ENV') == 'production':
         raise ValueError("SECRET_KEY environment variable is required in production")
 
 class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_BINDS = {}
+    SHARD_KEYS = []
     WTF_CSRF_ENABLED = False
 
 # Configuration dictionary
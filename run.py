@@ -3,6 +3,7 @@ from dotenv import load_dotenv
 from app import create_app
 from app.extensions import db
 from app.models import User, Task, TaskCategory
+from app.sharding import create_shard_tables
 
 
 
@@ -19,6 +20,14 @@ def create_tables():
         # Only create tables if they don't exist
         db.create_all()
 
+        # create_all() skips new indexes on tables that already exist
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=db.engine, checkfirst=True)
+
+        # Per-user tables on every configured shard
+        create_shard_tables()
+
         # Create default admin user if no users exist
         if not User.query.first():
             admin_user = User(
@@ -66,8 +75,8 @@ with app.app_context():
 @app.context_processor
 def inject_now():
     """Inject current datetime into templates"""
-    from datetime import datetime
-    return {'now': datetime.utcnow()}
+    from app.timeutils import utcnow
+    return {'now': utcnow()}
 
 if __name__ == "__main__":
     # Development server
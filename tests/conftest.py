@@ -0,0 +1,44 @@
+import pytest
+
+from app import create_app
+from app.extensions import db
+from app.models import User
+from config import TestingConfig
+
+PASSWORD = 'password'
+
+
+@pytest.fixture
+def app():
+    """A fresh app on an in-memory database; no application context stays pushed"""
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all(bind_key=None)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all(bind_key=None)
+
+
+@pytest.fixture
+def make_user(app):
+    """Create a user and return its id"""
+    def make_user(username):
+        with app.app_context():
+            user = User(username=username, email=f'{username}@example.com')
+            user.set_password(PASSWORD)
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make_user
+
+
+@pytest.fixture
+def login(app):
+    """Return a test client logged in as ``username``"""
+    def login(username):
+        client = app.test_client()
+        response = client.post('/auth/login', data={'username': username, 'password': PASSWORD})
+        assert response.status_code == 302 and '/auth/login' not in response.headers['Location']
+        return client
+    return login
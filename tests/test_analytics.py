@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from app.analytics import rebuild_rollups
+from app.extensions import db
+from app.models import TaskDailyStats
+from app.timeutils import utcnow
+
+
+def _completed_today(client):
+    today = utcnow().date()
+    url = f'/api/analytics?from={today.isoformat()}&to={(today + timedelta(days=1)).isoformat()}'
+    return client.get(url).get_json()['total_completed']
+
+
+def test_rebuild_keeps_completions_of_deleted_tasks(app, make_user, login):
+    user_id = make_user('alice')
+    client = login('alice')
+    ids = [client.post('/api/tasks', json={'title': f'task {n}'}).get_json()['id'] for n in range(3)]
+    for task_id in ids:
+        client.put(f'/api/tasks/{task_id}', json={'status': 'completed'})
+    client.delete(f'/api/tasks/{ids[0]}')
+    assert _completed_today(client) == 3
+
+    with app.app_context():
+        rebuild_rollups(user_id=user_id)
+        db.session.commit()
+    assert _completed_today(client) == 3
+
+    # Missing completions are added back
+    with app.app_context():
+        db.session.query(TaskDailyStats).delete()
+        db.session.commit()
+        rebuild_rollups(user_id=user_id)
+        db.session.commit()
+    assert _completed_today(client) == 2
+
+
+def test_rebuild_is_not_an_api_endpoint(app, make_user, login):
+    make_user('alice')
+    assert login('alice').post('/api/analytics/rebuild').status_code in (404, 405)
@@ -0,0 +1,62 @@
+from app.archive import archive_tasks
+from app.extensions import db
+from app.hierarchy import add_subtask, ancestors
+from app.models import Task, TaskArchive
+from app.tags import set_task_tags, task_tag_names
+
+
+def test_restore_brings_back_tags_and_parent(app, make_user, login):
+    user_id = make_user('alice')
+    with app.app_context():
+        parent = Task(title='parent', user_id=user_id)
+        child = Task(title='child', user_id=user_id, status='completed')
+        db.session.add_all([parent, child])
+        db.session.commit()
+        parent_id, child_id = parent.id, child.id
+        add_subtask(user_id, parent_id, child_id)
+        set_task_tags(user_id, child_id, ['errand', 'home'])
+        archive_tasks([child_id])
+        db.session.commit()
+
+    response = login('alice').post(f'/api/tasks/{child_id}/restore')
+    assert response.status_code == 200
+
+    with app.app_context():
+        assert task_tag_names(user_id, child_id) == ['errand', 'home']
+        assert [task['id'] for task in ancestors(user_id, child_id)] == [parent_id]
+
+
+def _archive_completed_task(user_id, **fields):
+    task = Task(title='done', user_id=user_id, status='completed', **fields)
+    db.session.add(task)
+    db.session.commit()
+    task_id = task.id
+    archive_tasks([task_id])
+    db.session.commit()
+    return task_id
+
+
+def test_archived_ids_are_not_handed_out_again(app, make_user):
+    user_id = make_user('alice')
+    with app.app_context():
+        archived_id = _archive_completed_task(user_id)
+        task = Task(title='new', user_id=user_id)
+        db.session.add(task)
+        db.session.commit()
+        assert task.id != archived_id
+
+
+def test_an_id_can_be_archived_twice(app, make_user, login):
+    # Databases whose task table predates AUTOINCREMENT can reuse the id of an archived task
+    user_id = make_user('alice')
+    with app.app_context():
+        first = _archive_completed_task(user_id)
+        assert _archive_completed_task(user_id, id=first) == first
+        assert TaskArchive.query.filter_by(original_id=first).count() == 2
+
+    client = login('alice')
+    listed = client.get('/api/tasks?include_archived=1').get_json()
+    assert [task['id'] for task in listed] == [first, first]
+    assert client.post(f'/api/tasks/{first}/restore').get_json()['id'] == first
+    with app.app_context():
+        assert TaskArchive.query.filter_by(original_id=first).count() == 1
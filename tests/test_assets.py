@@ -0,0 +1,113 @@
+import gzip
+import hashlib
+import json
+
+import pytest
+from flask import url_for
+
+from app import create_app
+from app.assets import init_assets
+from config import TestingConfig
+
+STYLE = b'body { margin: 0; padding: 0; }\n' * 100
+SCRIPT = b'go()'  # Too short for gzip to make it smaller
+
+
+def _fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    (tmp_path / 'css').mkdir()
+    (tmp_path / 'css' / 'style.css').write_bytes(STYLE)
+    (tmp_path / 'js').mkdir()
+    (tmp_path / 'js' / 'app.js').write_bytes(SCRIPT)
+    return tmp_path
+
+
+def _app(static_dir):
+    app = create_app(TestingConfig)
+    app.static_folder = str(static_dir)
+    return app
+
+
+@pytest.fixture
+def built_app(static_dir):
+    """An app serving a build of ``static_dir``, as after `flask build-assets` and a restart"""
+    result = _app(static_dir).test_cli_runner().invoke(args=['build-assets'])
+    assert result.exit_code == 0, result.output
+    app = _app(static_dir)
+    init_assets(app)
+    return app
+
+
+def test_build_assets_writes_hashed_copies_and_a_manifest(built_app, static_dir):
+    style = f'dist/css/style.{_fingerprint(STYLE)}.css'
+    script = f'dist/js/app.{_fingerprint(SCRIPT)}.js'
+    manifest = json.loads((static_dir / 'dist' / 'manifest.json').read_text())
+    assert manifest == {'css/style.css': style, 'js/app.js': script}
+
+    assert (static_dir / style).read_bytes() == STYLE
+    assert gzip.decompress((static_dir / f'{style}.gz').read_bytes()) == STYLE
+    assert (static_dir / script).read_bytes() == SCRIPT
+    assert not (static_dir / f'{script}.gz').exists()
+
+
+def test_rebuild_drops_stale_copies(built_app, static_dir):
+    old = static_dir / 'dist' / 'css' / f'style.{_fingerprint(STYLE)}.css'
+    (static_dir / 'css' / 'style.css').write_bytes(STYLE + b'p { color: red; }\n')
+    assert _app(static_dir).test_cli_runner().invoke(args=['build-assets']).exit_code == 0
+    assert not old.exists()
+    assert 'dist/dist' not in (static_dir / 'dist' / 'manifest.json').read_text()
+
+
+def test_url_for_points_at_the_fingerprinted_copy(built_app, static_dir):
+    with built_app.test_request_context():
+        assert url_for('static', filename='css/style.css') == f'/static/dist/css/style.{_fingerprint(STYLE)}.css'
+        # Files outside the build keep their own name
+        assert url_for('static', filename='img/new.png') == '/static/img/new.png'
+
+    # Without a build the source files are linked
+    with _app(static_dir).test_request_context():
+        assert url_for('static', filename='css/style.css') == '/static/css/style.css'
+
+
+def test_fingerprinted_files_are_immutable(built_app):
+    client = built_app.test_client()
+    with built_app.test_request_context():
+        url = url_for('static', filename='js/app.js')
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.data == SCRIPT
+    assert response.cache_control.immutable and response.cache_control.public
+    assert response.cache_control.max_age == built_app.config['ASSETS_MAX_AGE']
+    # Only one variant on disk, so nothing to vary on
+    assert 'Content-Encoding' not in response.headers
+    assert 'Vary' not in response.headers
+
+    # The source files are served as before
+    response = client.get('/static/js/app.js')
+    assert response.data == SCRIPT
+    assert not response.cache_control.immutable
+    response.close()
+
+
+def test_precompressed_copy_is_served_to_clients_that_accept_it(built_app):
+    client = built_app.test_client()
+    with built_app.test_request_context():
+        url = url_for('static', filename='css/style.css')
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert response.mimetype == 'text/css'
+    assert gzip.decompress(response.data) == STYLE
+    response.close()
+
+    response = client.get(url, headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert response.data == STYLE
+    assert response.cache_control.immutable
+    response.close()
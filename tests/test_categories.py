@@ -0,0 +1,86 @@
+from app.archive import archive_tasks
+from app.extensions import db
+from app.models import Task, TaskArchive
+
+
+def _category(client, name):
+    return client.post('/api/categories', json={'name': name}).get_json()['id']
+
+
+def _task(client, title, category_id=None, status=None):
+    task = client.post('/api/tasks', json={'title': title, 'category_id': category_id}).get_json()
+    if status is not None:
+        client.put(f"/api/tasks/{task['id']}", json={'status': status})
+    return task['id']
+
+
+def test_merge_moves_live_and_archived_tasks_and_deletes_the_category(app, make_user, login):
+    make_user('alice')
+    client = login('alice')
+    work, chores = _category(client, 'work'), _category(client, 'chores')
+    live = _task(client, 'live', work)
+    archived = _task(client, 'archived', work, status='completed')
+    with app.app_context():
+        archive_tasks([archived])
+        db.session.commit()
+
+    response = client.post(f'/api/categories/{work}/merge', json={'into': chores})
+    assert response.status_code == 200
+    assert response.get_json()['moved_tasks'] == 1
+    assert [category['id'] for category in client.get('/api/categories').get_json()] == [chores]
+    with app.app_context():
+        assert db.session.get(Task, live).category_id == chores
+        assert TaskArchive.query.filter_by(original_id=archived).one().category_id == chores
+
+    assert client.post(f'/api/categories/{chores}/merge', json={'into': chores}).status_code == 400
+
+
+def test_with_counts(app, make_user, login):
+    make_user('alice')
+    client = login('alice')
+    work, empty = _category(client, 'work'), _category(client, 'empty')
+    _task(client, 'open', work)
+    _task(client, 'started', work, status='in_progress')
+    _task(client, 'done', work, status='completed')
+    _task(client, 'uncategorized')
+
+    counts = {category['id']: category['task_counts']
+              for category in client.get('/api/categories?with_counts=1').get_json()}
+    assert counts == {
+        work: {'total': 3, 'open': 2, 'completed': 1},
+        empty: {'total': 0, 'open': 0, 'completed': 0},
+    }
+
+
+def test_reassign_only_touches_the_current_users_tasks(app, make_user, login):
+    make_user('alice')
+    make_user('bob')
+    alice, bob = login('alice'), login('bob')
+    alice_category = _category(alice, 'mine')
+    bob_category = _category(bob, 'theirs')
+    alice_task = _task(alice, 'alice task')
+    bob_task = _task(bob, 'bob task', bob_category)
+
+    response = alice.post('/api/categories/reassign',
+                          json={'category_id': alice_category, 'task_ids': [alice_task, bob_task]})
+    assert response.get_json() == {'updated': 1}
+    response = alice.post('/api/categories/reassign', json={'category_id': None, 'from_category_id': bob_category})
+    assert response.get_json() == {'updated': 0}
+    assert alice.post('/api/categories/reassign',
+                      json={'category_id': bob_category, 'task_ids': [alice_task]}).status_code == 404
+
+    with app.app_context():
+        assert db.session.get(Task, alice_task).category_id == alice_category
+        assert db.session.get(Task, bob_task).category_id == bob_category
+
+
+def test_reassign_uncategorizes_a_whole_category(app, make_user, login):
+    make_user('alice')
+    client = login('alice')
+    work = _category(client, 'work')
+    ids = [_task(client, f'task {n}', work) for n in range(2)]
+
+    response = client.post('/api/categories/reassign', json={'category_id': None, 'from_category_id': work})
+    assert response.get_json() == {'updated': 2}
+    with app.app_context():
+        assert [db.session.get(Task, task_id).category_id for task_id in ids] == [None, None]
@@ -0,0 +1,69 @@
+import gzip
+
+import pytest
+from flask import Response
+
+from app.compression import choose_encoding
+
+BODY = 'all work and no play ' * 100
+
+
+@pytest.fixture
+def client(app):
+    @app.route('/text/<int:size>')
+    def text(size):
+        return Response(BODY[:size], mimetype='text/plain')
+
+    @app.route('/binary')
+    def binary():
+        return Response(b'\0' * 4096, mimetype='application/octet-stream')
+
+    return app.test_client()
+
+
+def test_gzips_responses_above_the_minimum_size(client):
+    response = client.get('/text/2000', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(response.data).decode() == BODY[:2000]
+    assert int(response.headers['Content-Length']) == len(response.data) < 2000
+
+
+def test_small_responses_are_sent_as_they_are(app, client):
+    response = client.get('/text/1023', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert 'Vary' not in response.headers
+    assert response.data.decode() == BODY[:1023]
+
+    app.config['COMPRESSION_MIN_SIZE'] = 100
+    assert client.get('/text/200', headers={'Accept-Encoding': 'gzip'}).headers['Content-Encoding'] == 'gzip'
+
+
+def test_identity_for_clients_that_do_not_accept_gzip(client):
+    for accept in (None, 'identity', 'gzip;q=0', 'br'):
+        headers = {'Accept-Encoding': accept} if accept else {}
+        response = client.get('/text/2000', headers=headers)
+        assert 'Content-Encoding' not in response.headers
+        # Caches still have to keep the variants apart
+        assert response.headers['Vary'] == 'Accept-Encoding'
+        assert response.data.decode() == BODY[:2000]
+
+
+def test_other_mimetypes_are_not_compressed(client):
+    response = client.get('/binary', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert len(response.data) == 4096
+
+
+@pytest.mark.parametrize('accept, expected', [
+    ('gzip, br', 'br'),
+    ('br;q=0.5, gzip', 'gzip'),
+    ('gzip;q=0.8, br;q=0.9', 'br'),
+    ('br;q=0, gzip;q=0.1', 'gzip'),
+    ('*', 'br'),
+    ('deflate', None),
+    ('', None),
+])
+def test_choose_encoding_follows_the_q_values(app, accept, expected):
+    with app.test_request_context(headers={'Accept-Encoding': accept}):
+        assert choose_encoding(('br', 'gzip')) == expected
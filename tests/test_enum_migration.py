@@ -0,0 +1,74 @@
+from datetime import datetime
+
+import pytest
+import sqlalchemy as sa
+
+from app import create_app
+from app.enum_migration import migrate_enum_columns
+from app.extensions import db
+from app.models import Task, User
+from config import TestingConfig
+
+
+def _create_legacy_task_table(engine, user_id):
+    # The task table as the string-valued schema created it
+    metadata = sa.MetaData()
+    columns = [
+        sa.Column(column.name, sa.String(20) if column.name in ('status', 'priority') else column.type,
+                  primary_key=column.primary_key)
+        for column in Task.__table__.columns
+    ]
+    legacy = sa.Table('task', metadata, *columns)
+    with engine.begin() as conn:
+        conn.execute(sa.text('DROP TABLE task'))
+        metadata.create_all(conn)
+        created = datetime(2026, 1, 1)
+        conn.execute(legacy.insert(), [
+            {'title': 'old urgent', 'status': 'completed', 'priority': 'urgent', 'user_id': user_id,
+             'created_at': created, 'updated_at': created},
+            {'title': 'old low', 'status': 'pending', 'priority': 'low', 'user_id': user_id,
+             'created_at': created, 'updated_at': created},
+        ])
+
+
+@pytest.fixture
+def legacy_app(tmp_path):
+    class FileConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path}/todo.db'
+
+    setup = create_app(FileConfig)
+    with setup.app_context():
+        db.create_all()
+        user = User(username='alice', email='alice@example.com')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        _create_legacy_task_table(db.engine, user.id)
+    return create_app(FileConfig)
+
+
+def _titles(client, query):
+    return [task['title'] for task in client.get(f'/api/tasks?{query}').get_json()]
+
+
+def test_requests_are_served_during_the_enum_migration(legacy_app):
+    assert legacy_app.extensions['legacy_enum_values']
+    client = legacy_app.test_client()
+    client.post('/auth/login', data={'username': 'alice', 'password': 'password'})
+    client.post('/api/tasks', json={'title': 'new high', 'priority': 'high'})
+
+    assert _titles(client, 'status=completed') == ['old urgent']
+    assert _titles(client, 'status=pending&priority=high') == ['new high']
+    assert _titles(client, 'sort=priority') == ['old urgent', 'new high', 'old low']
+
+    with legacy_app.app_context():
+        assert migrate_enum_columns() == {'default': 2}
+    assert _titles(client, 'sort=priority') == ['old urgent', 'new high', 'old low']
+    with legacy_app.app_context():
+        assert Task.query.filter_by(status='completed', priority='urgent').count() == 1
+
+
+def test_migrated_databases_compare_codes_directly(app):
+    assert not app.extensions['legacy_enum_values']
+    with app.app_context():
+        assert 'CAST' not in str(Task.query.filter_by(status='completed').statement)
@@ -0,0 +1,94 @@
+from app.models import TaskClosure
+
+
+def _add(client, title, parent_id=None, status=None):
+    task = client.post('/api/tasks', json={'title': title, 'parent_id': parent_id}).get_json()
+    if status:
+        client.put(f"/api/tasks/{task['id']}", json={'status': status})
+    return task['id']
+
+
+def _closure(app):
+    with app.app_context():
+        return {(row.ancestor_id, row.descendant_id): row.depth for row in TaskClosure.query}
+
+
+def _titles(tasks):
+    return [task['title'] for task in tasks]
+
+
+def test_moving_a_subtree_rebuilds_its_ancestor_rows(app, make_user, login):
+    make_user('alice')
+    client = login('alice')
+    home = _add(client, 'home')
+    kitchen = _add(client, 'kitchen', home)
+    dishes = _add(client, 'dishes', kitchen)
+    work = _add(client, 'work')
+    office = _add(client, 'office', work)
+
+    assert client.put(f'/api/tasks/{kitchen}/parent', json={'parent_id': office}).status_code == 200
+    assert _closure(app) == {
+        (work, office): 1, (work, kitchen): 2, (work, dishes): 3,
+        (office, kitchen): 1, (office, dishes): 2,
+        (kitchen, dishes): 1,
+    }
+    assert _titles(client.get(f'/api/tasks/{dishes}/ancestors').get_json()) == ['work', 'office', 'kitchen']
+
+    # Back to the top level: only the links inside the subtree remain
+    assert client.put(f'/api/tasks/{kitchen}/parent', json={'parent_id': None}).status_code == 200
+    assert _closure(app) == {(work, office): 1, (kitchen, dishes): 1}
+    assert client.get(f'/api/tasks/{kitchen}/ancestors').get_json() == []
+
+
+def test_a_task_cannot_move_under_itself_or_its_subtasks(app, make_user, login):
+    make_user('alice')
+    client = login('alice')
+    home = _add(client, 'home')
+    kitchen = _add(client, 'kitchen', home)
+    dishes = _add(client, 'dishes', kitchen)
+    before = _closure(app)
+
+    for parent_id in (home, kitchen, dishes):
+        response = client.put(f'/api/tasks/{home}/parent', json={'parent_id': parent_id})
+        assert response.status_code == 400
+    assert _closure(app) == before
+
+
+def test_deleting_a_task_makes_its_subtasks_top_level(app, make_user, login):
+    make_user('alice')
+    client = login('alice')
+    home = _add(client, 'home')
+    kitchen = _add(client, 'kitchen', home)
+    dishes = _add(client, 'dishes', kitchen)
+    garden = _add(client, 'garden', home)
+
+    assert client.delete(f'/api/tasks/{home}').status_code == 200
+    assert _closure(app) == {(kitchen, dishes): 1}
+    assert client.get(f'/api/tasks/{kitchen}/ancestors').get_json() == []
+    assert client.get(f'/api/tasks/{garden}/subtree').get_json()['children'] == []
+    assert _titles(client.get(f'/api/tasks/{kitchen}/subtree').get_json()['children']) == ['dishes']
+
+    # The HTML route cleans up the same way
+    assert client.post(f'/tasks/delete/{kitchen}').status_code == 302
+    assert _closure(app) == {}
+    assert client.get(f'/api/tasks/{dishes}').status_code == 200
+
+
+def test_progress_rolls_up_every_level(app, make_user, login):
+    make_user('alice')
+    client = login('alice')
+    home = _add(client, 'home')
+    kitchen = _add(client, 'kitchen', home, status='completed')
+    _add(client, 'dishes', kitchen, status='completed')
+    _add(client, 'floor', kitchen)
+    _add(client, 'garden', home)
+
+    assert client.get(f'/api/tasks/{home}/progress').get_json() == {'completed': 2, 'total': 4}
+    assert client.get(f'/api/tasks/{kitchen}/progress').get_json() == {'completed': 1, 'total': 2}
+
+    tree = client.get(f'/api/tasks/{home}/subtree').get_json()
+    assert tree['progress'] == {'completed': 2, 'total': 4}
+    by_title = {child['title']: child for child in tree['children']}
+    assert by_title['kitchen']['progress'] == {'completed': 1, 'total': 2}
+    assert _titles(by_title['kitchen']['children']) == ['dishes', 'floor']
+    assert by_title['garden']['progress'] == {'completed': 0, 'total': 0}
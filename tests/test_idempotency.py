@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from app.extensions import db
+from app.idempotency import request_fingerprint
+from app.models import IdempotencyKey, Task
+from app.timeutils import utcnow
+
+BODY = {'title': 'buy milk'}
+
+
+def _leave_pending_key(app, user_id, age):
+    """Store a key the way a request that died before storing its response leaves it"""
+    with app.app_context():
+        db.session.add(IdempotencyKey(
+            user_id=user_id, key='retry-me', fingerprint=request_fingerprint('POST', '/api/tasks', BODY),
+            created_at=utcnow() - age,
+        ))
+        db.session.commit()
+
+
+def test_key_of_a_running_request_is_refused(app, make_user, login):
+    user_id = make_user('alice')
+    _leave_pending_key(app, user_id, timedelta(seconds=1))
+    response = login('alice').post('/api/tasks', json=BODY, headers={'Idempotency-Key': 'retry-me'})
+    assert response.status_code == 409
+
+
+def test_key_abandoned_by_a_crashed_request_can_be_retried(app, make_user, login):
+    user_id = make_user('alice')
+    _leave_pending_key(app, user_id, timedelta(seconds=app.config['IDEMPOTENCY_PENDING_GRACE_SECONDS'] + 1))
+    client = login('alice')
+
+    response = client.post('/api/tasks', json=BODY, headers={'Idempotency-Key': 'retry-me'})
+    assert response.status_code == 201
+    replay = client.post('/api/tasks', json=BODY, headers={'Idempotency-Key': 'retry-me'})
+    assert replay.headers['Idempotent-Replayed'] == 'true'
+    assert replay.get_json()['id'] == response.get_json()['id']
+    with app.app_context():
+        assert Task.query.filter_by(user_id=user_id).count() == 1
@@ -0,0 +1,163 @@
+import json
+import signal
+from datetime import timedelta
+
+import pytest
+
+from app.extensions import db
+from app.jobs import JOB_HANDLERS, claim_job, enqueue, requeue_stale_jobs, run_job, work
+from app.models import Job, Task
+from app.timeutils import utcnow
+
+
+def _complete_tasks(client, count):
+    for n in range(count):
+        task = client.post('/api/tasks', json={'title': f'task {n}'}).get_json()
+        client.put(f"/api/tasks/{task['id']}", json={'status': 'completed'})
+
+
+def test_api_clears_inline_up_to_the_limit(app, make_user, login):
+    user_id = make_user('alice')
+    client = login('alice')
+    _complete_tasks(client, 2)
+
+    response = client.post('/api/tasks/clear-completed')
+    assert response.status_code == 200
+    assert response.get_json() == {'deleted': 2}
+    with app.app_context():
+        assert Task.query.filter_by(user_id=user_id).count() == 0
+        assert Job.query.count() == 0
+
+
+def test_api_queues_a_job_beyond_the_limit(app, make_user, login):
+    app.config['JOB_INLINE_LIMIT'] = 1
+    user_id = make_user('alice')
+    client = login('alice')
+    _complete_tasks(client, 2)
+
+    response = client.post('/api/tasks/clear-completed')
+    assert response.status_code == 202
+    assert response.headers['Location'].endswith(f"/api/jobs/{response.get_json()['id']}")
+    with app.app_context():
+        assert Task.query.filter_by(user_id=user_id).count() == 2
+        assert db.session.get(Job, response.get_json()['id']).kind == 'clear_completed'
+
+
+@pytest.fixture
+def flaky_handler(monkeypatch):
+    """A 'flaky' job kind whose handler fails on its first call only"""
+    calls = []
+
+    def flaky(user_id, **payload):
+        calls.append(payload)
+        if len(calls) == 1:
+            raise RuntimeError('first call fails')
+        return {'calls': len(calls)}
+
+    monkeypatch.setitem(JOB_HANDLERS, 'flaky', flaky)
+    return calls
+
+
+@pytest.fixture
+def signal_handlers():
+    """Put back the SIGTERM/SIGINT handlers that work() replaces"""
+    saved = {signum: signal.getsignal(signum) for signum in (signal.SIGTERM, signal.SIGINT)}
+    yield
+    for signum, handler in saved.items():
+        signal.signal(signum, handler)
+
+
+def _queue(app, user_id, kind='flaky', **payload):
+    with app.app_context():
+        job = enqueue(user_id, kind, **payload)
+        db.session.commit()
+        return job.id
+
+
+def test_claim_job_runs_each_users_jobs_one_at_a_time(app, make_user, flaky_handler):
+    alice_id, bob_id = make_user('alice'), make_user('bob')
+    first = _queue(app, alice_id)
+    second = _queue(app, alice_id)
+    bobs = _queue(app, bob_id)
+
+    with app.app_context():
+        job = claim_job('test')
+        assert (job.id, job.status, job.attempts) == (first, 'running', 1)
+        # alice's second job waits for her first, bob's does not
+        assert claim_job('test').id == bobs
+        assert claim_job('test') is None
+
+        db.session.execute(db.update(Job).where(Job.id == first).values(status='succeeded'))
+        db.session.commit()
+        assert claim_job('test').id == second
+
+
+def test_failed_job_is_retried_with_backoff(app, make_user, flaky_handler):
+    app.config['JOB_RETRY_DELAY'] = 10
+    job_id = _queue(app, make_user('alice'), size=3)
+
+    with app.app_context():
+        assert run_job(claim_job('test')) is False
+        job = db.session.get(Job, job_id)
+        assert (job.status, job.attempts, job.claimed_by) == ('queued', 1, None)
+        assert job.error == 'RuntimeError: first call fails'
+        assert timedelta(seconds=9) < job.run_after - utcnow() <= timedelta(seconds=10)
+
+        # Not runnable until the backoff has passed
+        assert claim_job('test') is None
+        job.run_after = utcnow()
+        db.session.commit()
+
+        assert run_job(claim_job('test')) is True
+        db.session.expire_all()
+        job = db.session.get(Job, job_id)
+        assert (job.status, job.attempts, job.error) == ('succeeded', 2, None)
+        assert json.loads(job.result) == {'calls': 2}
+    assert flaky_handler == [{'size': 3}, {'size': 3}]
+
+
+def test_job_fails_after_its_last_attempt(app, make_user, flaky_handler):
+    user_id = make_user('alice')
+    with app.app_context():
+        job = enqueue(user_id, 'flaky', max_attempts=1)
+        db.session.commit()
+        job_id = job.id
+
+        assert run_job(claim_job('test')) is False
+        job = db.session.get(Job, job_id)
+        assert (job.status, job.attempts) == ('failed', 1)
+        assert job.finished_at is not None
+
+
+def test_requeue_stale_jobs(app, make_user, flaky_handler):
+    app.config['JOB_TIMEOUT'] = 60
+    user_id = make_user('alice')
+    with app.app_context():
+        retried = enqueue(user_id, 'flaky', max_attempts=2)
+        exhausted = enqueue(user_id, 'flaky', max_attempts=1)
+        recent = enqueue(make_user('bob'), 'flaky')
+        long_ago = utcnow() - timedelta(minutes=5)
+        for job, started_at in ((retried, long_ago), (exhausted, long_ago), (recent, utcnow())):
+            job.status, job.attempts, job.started_at, job.claimed_by = 'running', 1, started_at, 'dead-worker'
+        db.session.commit()
+        ids = retried.id, exhausted.id, recent.id
+
+        assert requeue_stale_jobs() == 1
+        db.session.expire_all()
+        statuses = [(db.session.get(Job, job_id).status, db.session.get(Job, job_id).claimed_by) for job_id in ids]
+        assert statuses == [('queued', None), ('failed', 'dead-worker'), ('running', 'dead-worker')]
+
+
+def test_work_once_drains_the_queue(app, make_user, login, signal_handlers):
+    app.config['JOB_INLINE_LIMIT'] = 1
+    user_id = make_user('alice')
+    client = login('alice')
+    _complete_tasks(client, 3)
+    job_id = client.post('/api/tasks/clear-completed').get_json()['id']
+
+    with app.app_context():
+        assert work(once=True) == 1
+        job = db.session.get(Job, job_id)
+        assert job.status == 'succeeded'
+        assert json.loads(job.result) == {'deleted': 3}
+        assert Task.query.filter_by(user_id=user_id).count() == 0
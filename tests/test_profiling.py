@@ -0,0 +1,46 @@
+import pytest
+
+from app import create_app
+from app.extensions import db
+from app.models import User
+from config import TestingConfig
+
+
+@pytest.fixture
+def profiled_app(tmp_path):
+    class Config(TestingConfig):
+        PROFILING_ENABLED = True
+        PROFILING_ADMINS = ['alice']
+        PROFILING_OUTPUT_DIR = str(tmp_path)
+
+    app = create_app(Config)
+    with app.app_context():
+        db.create_all(bind_key=None)
+        for username in ('alice', 'bob'):
+            user = User(username=username, email=f'{username}@example.com')
+            user.set_password('password')
+            db.session.add(user)
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all(bind_key=None)
+
+
+def _profile_stats(app, tmp_path, username):
+    client = app.test_client()
+    client.post('/auth/login', data={'username': username, 'password': 'password'})
+    assert client.get('/api/tasks', headers={'X-Profile': '1'}).status_code == 200
+    return sorted(path.suffix for path in tmp_path.iterdir())
+
+
+def test_admin_requests_are_profiled(profiled_app, tmp_path):
+    assert _profile_stats(profiled_app, tmp_path, 'alice') == ['.collapsed', '.pstats']
+
+
+def test_other_users_are_not_profiled(profiled_app, tmp_path):
+    assert _profile_stats(profiled_app, tmp_path, 'bob') == []
+
+
+def test_nobody_is_an_admin_by_default():
+    assert create_app(TestingConfig).config['PROFILING_ADMINS'] == []
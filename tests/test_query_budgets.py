@@ -0,0 +1,9 @@
+from app import create_app
+from app.query_budget import check_query_budgets
+from config import TestingConfig
+
+
+def test_every_endpoint_within_its_query_budget():
+    results = check_query_budgets(create_app(TestingConfig))
+    failures = [f"{r['method']} {r['endpoint']}: {'; '.join(r['problems'])}" for r in results if r['problems']]
+    assert not failures, '\n'.join(failures)
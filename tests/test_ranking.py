@@ -0,0 +1,52 @@
+import random
+from datetime import timedelta
+
+from app.extensions import db
+from app.models import Task
+from app.ranking import next_tasks, score_task
+from app.timeutils import utcnow
+
+WEIGHTS = {'priority': 10, 'due': 8, 'age': 0.02}
+
+
+def _add_task(user_id, now, priority='urgent', due_in_days=None, age_days=0, status='pending'):
+    task = Task(
+        title='task', user_id=user_id, priority=priority, status=status,
+        due_date=now + timedelta(days=due_in_days) if due_in_days is not None else None,
+        created_at=now - timedelta(days=age_days),
+    )
+    db.session.add(task)
+    db.session.commit()
+    return task.id
+
+
+def test_best_task_is_neither_the_soonest_due_nor_the_oldest(app, make_user, login):
+    user_id = make_user('alice')
+    with app.app_context():
+        now = utcnow()
+        _add_task(user_id, now, age_days=100)                     # oldest: 32.0
+        _add_task(user_id, now, due_in_days=0.5)                  # soonest due: ~35.33
+        best = _add_task(user_id, now, due_in_days=1, age_days=99)  # ~35.98
+
+    tasks = login('alice').get('/api/tasks/next?limit=1').get_json()
+    assert [task['id'] for task in tasks] == [best]
+
+
+def test_matches_scoring_every_task(app, make_user):
+    user_id = make_user('alice')
+    rng = random.Random(7)
+    with app.app_context():
+        now = utcnow()
+        for _ in range(200):
+            _add_task(
+                user_id, now,
+                priority=rng.choice(Task.PRIORITY_CHOICES),
+                status=rng.choice(['pending', 'in_progress', 'completed']),
+                due_in_days=rng.choice([None, rng.uniform(-5, 60)]),
+                age_days=rng.uniform(0, 400),
+            )
+        every_task = Task.query.filter(Task.status.in_(['pending', 'in_progress'])).all()
+        expected = sorted(every_task, key=lambda task: (-score_task(task, WEIGHTS, now), task.id))
+
+        for limit in (1, 3, 10):
+            assert [task['id'] for task in next_tasks(user_id, limit, WEIGHTS)] == [t.id for t in expected[:limit]]
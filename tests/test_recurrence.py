@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from app.extensions import db
+from app.models import Task, TaskOccurrence, TaskRecurrence
+from app.timeutils import utcnow
+
+
+def _window():
+    today = utcnow().date()
+    return today.isoformat(), (today + timedelta(days=7)).isoformat()
+
+
+def test_deleted_template_does_not_leak_into_another_users_task(app, make_user, login):
+    make_user('alice')
+    bob_id = make_user('bob')
+    alice, bob = login('alice'), login('bob')
+    start, end = _window()
+
+    template = alice.post('/api/tasks', json={'title': 'water plants', 'due_date': start}).get_json()
+    rule = alice.put(f"/api/tasks/{template['id']}/recurrence", json={'frequency': 'daily'}).get_json()
+    tomorrow = (utcnow().date() + timedelta(days=1)).isoformat()
+    assert alice.delete(f"/api/recurrences/{rule['id']}/occurrences/{tomorrow}").status_code == 200  # skipped
+    assert alice.delete(f"/api/tasks/{template['id']}").status_code == 200
+
+    with app.app_context():
+        assert TaskRecurrence.query.count() == 0
+        assert TaskOccurrence.query.count() == 0
+
+    # A database whose task table predates AUTOINCREMENT hands the freed id to the next task
+    with app.app_context():
+        db.session.add(Task(id=template['id'], title='private', user_id=bob_id))
+        db.session.commit()
+
+    assert alice.get(f'/api/occurrences?from={start}&to={end}').get_json() == []
+    assert alice.put(f"/api/recurrences/{rule['id']}/occurrences/{tomorrow}",
+                     json={'status': 'completed'}).status_code == 404
+    assert [task['title'] for task in bob.get('/api/tasks').get_json()] == ['private']
+
+
+def test_rule_pointing_at_another_users_task_is_ignored(app, make_user, login):
+    alice_id = make_user('alice')
+    make_user('bob')
+    alice, bob = login('alice'), login('bob')
+    start, end = _window()
+
+    private = bob.post('/api/tasks', json={'title': 'private', 'due_date': start}).get_json()
+    with app.app_context():
+        # A stale rule of alice's whose template id now belongs to bob
+        rule = TaskRecurrence(task_id=private['id'], user_id=alice_id, frequency='daily',
+                              starts_at=utcnow().replace(hour=0, minute=0, second=0, microsecond=0))
+        db.session.add(rule)
+        db.session.commit()
+        rule_id = rule.id
+
+    tomorrow = (utcnow().date() + timedelta(days=1)).isoformat()
+    assert alice.get(f'/api/occurrences?from={start}&to={end}').get_json() == []
+    assert alice.put(f'/api/recurrences/{rule_id}/occurrences/{tomorrow}',
+                     json={'status': 'completed'}).status_code == 404
+    assert alice.delete(f'/api/recurrences/{rule_id}/occurrences/{tomorrow}').status_code == 404
+    assert len(bob.get('/api/tasks').get_json()) == 1
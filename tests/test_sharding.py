@@ -0,0 +1,107 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from app import create_app
+from app.archive import archive_tasks
+from app.extensions import db
+from app.models import User, UserShard
+from app.sharding import create_shard_tables, move_user, shard_for_user, shard_metadata, use_shard
+from config import TestingConfig
+
+
+@pytest.fixture
+def sharded_app(tmp_path):
+    class ShardedConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path}/main.db'
+        SQLALCHEMY_BINDS = {'shard0': f'sqlite:///{tmp_path}/shard0.db', 'shard1': f'sqlite:///{tmp_path}/shard1.db'}
+        SHARD_KEYS = ['shard0', 'shard1']
+
+    app = create_app(ShardedConfig)
+    with app.app_context():
+        db.create_all(bind_key=None)
+        create_shard_tables()
+        user = User(username='alice', email='alice@example.com')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def _login(app):
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'alice', 'password': 'password'})
+    return client
+
+
+def test_shard_tables_have_no_foreign_keys_to_the_default_database(app):
+    with app.app_context():
+        ddl = ''.join(str(CreateTable(table).compile(dialect=postgresql.dialect()))
+                      for table in shard_metadata().sorted_tables)
+    assert 'REFERENCES "user"' not in ddl
+    assert 'REFERENCES task ' in ddl
+
+
+def test_move_keeps_ids_and_fences_writes(sharded_app):
+    client = _login(sharded_app)
+    ids = [client.post('/api/tasks', json={'title': f'task {n}'}).get_json()['id'] for n in range(3)]
+
+    with sharded_app.app_context():
+        user_id = User.query.filter_by(username='alice').one().id
+        source = shard_for_user(user_id)
+        target = 'shard1' if source == 'shard0' else 'shard0'
+        db.session.execute(db.text('UPDATE user_shard SET moving = 1 WHERE user_id = :id'), {'id': user_id})
+        db.session.commit()
+
+    response = client.post('/api/tasks', json={'title': 'during the move'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+
+    with sharded_app.app_context():
+        assert move_user(user_id, target, settle=0) == 3
+        assert shard_for_user(user_id) == target
+
+    assert sorted(client.get(f'/api/tasks/{task_id}').get_json()['id'] for task_id in ids) == ids
+    assert client.post('/api/tasks', json={'title': 'after the move'}).status_code == 201
+
+
+def test_move_onto_a_shard_holding_other_users_tasks(sharded_app):
+    with sharded_app.app_context():
+        bob = User(username='bob', email='bob@example.com')
+        bob.set_password('password')
+        db.session.add(bob)
+        db.session.commit()
+        alice_id = User.query.filter_by(username='alice').one().id
+        db.session.add_all([UserShard(user_id=alice_id, shard='shard0'), UserShard(user_id=bob.id, shard='shard1')])
+        db.session.commit()
+
+    clients = {}
+    for username in ('alice', 'bob'):
+        clients[username] = sharded_app.test_client()
+        clients[username].post('/auth/login', data={'username': username, 'password': 'password'})
+    ids = {
+        username: [client.post('/api/tasks', json={'title': f'{username} {n}'}).get_json()['id'] for n in range(3)]
+        for username, client in clients.items()
+    }
+    assert not set(ids['alice']) & set(ids['bob'])
+
+    # Both shards number their archived rows from 1
+    with sharded_app.app_context():
+        for shard, username in (('shard0', 'alice'), ('shard1', 'bob')):
+            with use_shard(shard):
+                archive_tasks([ids[username][0]])
+                db.session.commit()
+        assert move_user(alice_id, 'shard1', settle=0) == 3
+
+    listed = clients['alice'].get('/api/tasks?include_archived=1').get_json()
+    assert sorted(task['id'] for task in listed) == ids['alice']
+    for username in clients:
+        ids[username] = ids[username][1:]
+
+    for username, client in clients.items():
+        assert sorted(task['id'] for task in client.get('/api/tasks').get_json()) == ids[username]
+    assert clients['alice'].post('/api/tasks', json={'title': 'after the move'}).status_code == 201
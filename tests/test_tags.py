@@ -0,0 +1,74 @@
+from app.extensions import db
+from app.models import Tag, TaskTag
+
+
+def _tagged_task(client, title, tags):
+    task = client.post('/api/tasks', json={'title': title}).get_json()
+    assert client.put(f"/api/tasks/{task['id']}/tags", json={'tags': tags}).status_code == 200
+    return task['id']
+
+
+def _titles(client, query):
+    return sorted(task['title'] for task in client.get(f'/api/tasks?{query}').get_json())
+
+
+def test_filter_by_all_or_any_of_the_tags(app, make_user, login):
+    make_user('alice')
+    client = login('alice')
+    _tagged_task(client, 'both', ['home', 'Urgent '])
+    _tagged_task(client, 'home only', ['home'])
+    _tagged_task(client, 'urgent only', ['urgent'])
+    _tagged_task(client, 'untagged', [])
+
+    assert _titles(client, 'tags=home,urgent') == ['both']
+    assert _titles(client, 'tags=home,urgent&match=all') == ['both']
+    assert _titles(client, 'tags=home,urgent&match=any') == ['both', 'home only', 'urgent only']
+    assert _titles(client, 'tags=home') == ['both', 'home only']
+    assert _titles(client, 'tags=unknown') == []
+
+
+def test_tags_are_scoped_to_their_user(app, make_user, login):
+    make_user('alice')
+    make_user('bob')
+    _tagged_task(login('alice'), 'alice task', ['home'])
+    bob = login('bob')
+    _tagged_task(bob, 'bob task', ['work'])
+
+    assert _titles(bob, 'tags=home') == []
+    assert _titles(bob, 'tags=home,work&match=any') == ['bob task']
+
+
+def test_untagging(app, make_user, login):
+    make_user('alice')
+    client = login('alice')
+    task_id = _tagged_task(client, 'chores', ['home', 'weekly'])
+    other_id = _tagged_task(client, 'laundry', ['home', 'weekly'])
+
+    # Replacing the tags drops the postings of the old ones
+    assert client.put(f'/api/tasks/{task_id}/tags', json={'tags': ['weekly']}).get_json()['tags'] == ['weekly']
+    assert _titles(client, 'tags=home') == ['laundry']
+    assert client.put(f'/api/tasks/{task_id}/tags', json={'tags': []}).get_json()['tags'] == []
+    assert client.get(f'/api/tasks/{task_id}/tags').get_json()['tags'] == []
+
+    # Deleting a tag removes it from every task
+    with app.app_context():
+        weekly_id = Tag.query.filter_by(name='weekly').one().id
+    assert client.delete(f'/api/tags/{weekly_id}').status_code == 200
+    assert client.get(f'/api/tasks/{other_id}/tags').get_json()['tags'] == ['home']
+
+    # Deleting a task removes its postings
+    assert client.delete(f'/api/tasks/{other_id}').status_code == 200
+    with app.app_context():
+        assert db.session.query(TaskTag).count() == 0
+    assert [tag['name'] for tag in client.get('/api/tags').get_json()] == ['home']
+
+
+def test_tag_names_must_be_strings(app, make_user, login):
+    make_user('alice')
+    client = login('alice')
+    task = client.post('/api/tasks', json={'title': 'chores'}).get_json()
+
+    for tags in ([1], [None], [['home']], [{'name': 'home'}], ['x' * 51]):
+        response = client.put(f"/api/tasks/{task['id']}/tags", json={'tags': tags})
+        assert response.status_code == 400
+    assert client.get(f"/api/tasks/{task['id']}/tags").get_json()['tags'] == []
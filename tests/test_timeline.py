@@ -0,0 +1,11 @@
+def test_task_is_counted_on_the_day_it_is_due(app, make_user, login):
+    make_user('alice')
+    client = login('alice')
+    client.post('/api/tasks', json={'title': 'dentist', 'due_date': '2026-10-20'})
+
+    calendar = client.get('/api/calendar?from=2026-10-19&to=2026-10-22').get_json()
+    assert [bucket['count'] for bucket in calendar['buckets']] == [0, 1, 0]
+
+    listed = client.get('/api/calendar/tasks?from=2026-10-20&to=2026-10-21').get_json()
+    assert [task['title'] for task in listed['tasks']] == ['dentist']
+    assert client.get('/api/calendar/tasks?from=2026-10-19&to=2026-10-20').get_json()['tasks'] == []
@@ -0,0 +1,90 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from app import create_app
+from app.extensions import db
+from app.models import User
+from app.write_behind import WriteBehindBuffer
+from config import TestingConfig
+
+
+class WriteBehindConfig(TestingConfig):
+    WRITE_BEHIND_ENABLED = True
+    WRITE_BEHIND_INTERVAL = 3600
+
+
+def test_refuses_to_start_with_several_server_processes():
+    class Config(WriteBehindConfig):
+        WEB_CONCURRENCY = 4
+
+    with pytest.raises(RuntimeError, match='WEB_CONCURRENCY'):
+        create_app(Config)
+
+
+def test_toggle_is_not_buffered():
+    app = create_app(WriteBehindConfig)
+    with app.app_context():
+        db.create_all(bind_key=None)
+    client = app.test_client()
+    client.post('/auth/register', data={'username': 'alice', 'email': 'alice@example.com',
+                                        'password': 'password', 'confirm_password': 'password'})
+    client.post('/auth/login', data={'username': 'alice', 'password': 'password'})
+
+    task = client.post('/api/tasks', json={'title': 'write report'}).get_json()
+    client.post(f"/api/tasks/{task['id']}/toggle")
+    assert client.get(f"/api/tasks/{task['id']}").get_json()['status'] == 'in_progress'
+    app.extensions['write_behind'].close()
+
+
+def _last_logins(app, *user_ids):
+    with app.app_context():
+        return [db.session.get(User, user_id).last_login for user_id in user_ids]
+
+
+def _wait_for(check, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not check():
+        assert time.monotonic() < deadline, 'buffer was not flushed in time'
+        time.sleep(0.01)
+
+
+def test_repeated_writes_are_merged_until_close(app, make_user):
+    user_id = make_user('alice')
+    buffer = WriteBehindBuffer(app, interval=3600, max_pending=10)
+    first, last = datetime(2024, 5, 1, 9), datetime(2024, 5, 1, 10)
+
+    buffer.set(User, user_id, last_login=first)
+    buffer.set(User, user_id, last_login=last)
+    assert len(buffer._updates) == 1
+    assert _last_logins(app, user_id) == [None]
+
+    buffer.close()
+    assert _last_logins(app, user_id) == [last]
+    assert buffer._updates == {}
+
+
+def test_flushes_once_max_pending_rows_are_waiting(app, make_user):
+    alice_id, bob_id = make_user('alice'), make_user('bob')
+    buffer = WriteBehindBuffer(app, interval=3600, max_pending=2)
+    login_at = datetime(2024, 5, 1, 9)
+
+    buffer.set(User, alice_id, last_login=login_at)
+    buffer.set(User, alice_id, last_login=login_at)  # Still one row
+    time.sleep(0.05)
+    assert _last_logins(app, alice_id) == [None]
+
+    buffer.set(User, bob_id, last_login=login_at)
+    _wait_for(lambda: _last_logins(app, alice_id, bob_id) == [login_at, login_at])
+    buffer.close()
+
+
+def test_flushes_every_interval(app, make_user):
+    user_id = make_user('alice')
+    buffer = WriteBehindBuffer(app, interval=0.05, max_pending=10)
+    login_at = datetime(2024, 5, 1, 9)
+
+    buffer.set(User, user_id, last_login=login_at)
+    _wait_for(lambda: _last_logins(app, user_id) == [login_at])
+    buffer.close()